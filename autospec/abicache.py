@@ -0,0 +1,132 @@
+#!/bin/true
+#
+# abicache.py - part of autospec
+# Copyright (C) 2016 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Persistent cache of ELF inspection results for the ABI report, keyed by
+# file content so unchanged libraries are not inspected again on rebuilds.
+#
+
+import json
+import os
+from collections import OrderedDict
+
+import elfreader
+
+# Cache file, kept in the package's download_path
+CACHE_FILE = ".abi_cache.json"
+# Bump when what elfreader extracts changes, older caches are then dropped
+CACHE_VERSION = 1
+# Approximate size the cache is trimmed to, least recently used first
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _weight(entry):
+    """Approximate the serialized size of entry."""
+    return 64 + sum(len(s) + 4 for s in entry["symbols"]) + sum(len(n) + 4 for n in entry["needed"])
+
+
+class AbiCache(object):
+    """Size bounded LRU cache of elfreader.ElfFile results on disk."""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        """Load the cache stored at path, if any."""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (weight, entry), oldest first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.load()
+
+    def load(self):
+        """Read the cache file, starting empty if it is missing or stale."""
+        try:
+            with open(self.path, "r") as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return
+        for key, entry in data.get("entries", []):
+            self._store(key, entry)
+        self._evict()
+        # loading is not eviction the user needs to hear about
+        self.evicted = 0
+
+    def save(self):
+        """Write the cache file atomically."""
+        data = {
+            "version": CACHE_VERSION,
+            "entries": [[key, entry] for key, (_, entry) in self.entries.items()],
+        }
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as cache_file:
+                json.dump(data, cache_file, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def _store(self, key, entry):
+        """Insert entry as the most recently used."""
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[0]
+        weight = _weight(entry)
+        self.entries[key] = (weight, entry)
+        self.size += weight
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits."""
+        while self.size > self.max_bytes and self.entries:
+            _, (weight, _) = self.entries.popitem(last=False)
+            self.size -= weight
+            self.evicted += 1
+
+    def get(self, key):
+        """Return the cached ElfFile for key, or None."""
+        item = self.entries.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        entry = item[1]
+        elf = elfreader.ElfFile(entry["bits"], entry["elf_type"])
+        elf.soname = entry["soname"]
+        elf.needed = list(entry["needed"])
+        elf.flags_1 = entry["flags_1"]
+        elf.symbols = set(entry["symbols"])
+        return elf
+
+    def put(self, key, elf):
+        """Cache elf under key."""
+        self._store(key, {
+            "bits": elf.bits,
+            "elf_type": elf.elf_type,
+            "soname": elf.soname,
+            "needed": elf.needed,
+            "flags_1": elf.flags_1,
+            "symbols": sorted(elf.symbols),
+        })
+        self._evict()
+
+    def summary(self):
+        """Return the hit/miss summary line."""
+        return "ABI cache: {} hits, {} misses, {} evicted, {} entries".format(self.hits, self.misses, self.evicted, len(self.entries))
@@ -26,7 +26,10 @@ import re
 import shutil
 import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
+import abicache
+import elfreader
 import util
 
 valid_dirs = ["/usr/lib", "/usr/lib64"]
@@ -42,6 +45,9 @@ shared_lib = re.compile(r".*Shared library: \[(.*)\].*")
 
 wanted_symbol_types = ["A", "T"]
 
+# Files handed to a worker at a time when scanning in parallel
+scan_chunksize = 32
+
 ignored_symbols = [
     "__bss_start",
     "_edata",
@@ -89,30 +95,69 @@ def get_shared_dependencies(path):
     return ret
 
 
-def get_all_dependencies(path):
-    """Determine all dependencies in the given path."""
-    deps = set()
-
-    sonames = set()
-    examine = set()
+def scan_elf_files(path, pool=None, cache=None):
+    """Read every regular file under path, return a path to ElfFile dict.
 
+    Files that are not ELF map to None. Files are read by the workers of
+    pool when one is given; the dict keeps the os.walk order either way.
+    With an abicache.AbiCache only files whose content is not in the cache
+    are inspected.
+    """
+    paths = []
     for root, dirs, files in os.walk(path):
         for file in files:
             fpath = os.path.join(root, file)
-            if not is_dynamic_binary(fpath):
-                continue
-            # Encountered a valid dynamic linked object
-            if is_file_valid(fpath):
-                # We must account for *all* internal symbols due to rpaths and
-                # overriding of LD_LIBRARY_PATH
-                soname = get_soname(fpath)
-                if soname is not None:
-                    sonames.add(soname)
-            if is_dynamic_binary(fpath):
-                examine.add(fpath)
-
-    for path in examine:
-        current_deps = get_shared_dependencies(path)
+            if os.path.isfile(fpath):
+                paths.append(fpath)
+
+    def run(func, items):
+        if pool is None:
+            return map(func, items)
+        return pool.map(func, items, chunksize=scan_chunksize)
+
+    if cache is None:
+        return dict(zip(paths, run(elfreader.read_elf, paths)))
+
+    elves = dict()
+    missed = []
+    for fpath, key in zip(paths, run(elfreader.elf_key, paths)):
+        elves[fpath] = None if key is None else cache.get(key)
+        if key is not None and elves[fpath] is None:
+            missed.append((fpath, key))
+
+    for (fpath, key), elf in zip(missed, run(elfreader.read_elf, [fpath for fpath, _ in missed])):
+        elves[fpath] = elf
+        if elf is not None:
+            cache.put(key, elf)
+
+    return elves
+
+
+def get_all_dependencies(path, elves=None):
+    """Determine all dependencies in the given path.
+
+    elves is the scan_elf_files result for path, read here when not given.
+    """
+    deps = set()
+
+    sonames = set()
+    examine = dict()
+
+    if elves is None:
+        elves = scan_elf_files(path)
+
+    for fpath, elf in elves.items():
+        if elf is None or not elf.is_dynamic_binary:
+            continue
+        # Encountered a valid dynamic linked object
+        if elf.is_shared_object and not os.path.islink(fpath):
+            # We must account for *all* internal symbols due to rpaths and
+            # overriding of LD_LIBRARY_PATH
+            if elf.soname is not None:
+                sonames.add(elf.soname)
+        examine[fpath] = elf.needed
+
+    for current_deps in examine.values():
         # Ensure we don't add a dependency on an internally provided symbol
         deps.update(set(filter(lambda s: s not in sonames, current_deps)))
 
@@ -201,8 +246,18 @@ def truncate_file(path):
         trunc.truncate()
 
 
-def examine_abi(download_path, name):
-    """Proxy the ABI reporting to the right function."""
+def extract_rpm(rpm, extract_dir):
+    """Extract rpm into extract_dir."""
+    cmd = 'rpm2cpio "{}" | cpio -imd 2>/dev/null'.format(rpm)
+    subprocess.check_call(cmd, shell=True, cwd=extract_dir)
+
+
+def examine_abi(download_path, name, jobs=None):
+    """Proxy the ABI reporting to the right function.
+
+    jobs is the number of worker processes for the fallback scanning,
+    os.cpu_count() when None.
+    """
     download_path = os.path.abspath(download_path)
     results_dir = os.path.abspath(os.path.join(download_path, "results"))
 
@@ -214,7 +269,7 @@ def examine_abi(download_path, name):
         examine_abi_host(download_path, results_dir, name)
     else:
         util.print_warning("abireport is not installed. Using slow scanning")
-        examine_abi_fallback(download_path, results_dir, name)
+        examine_abi_fallback(download_path, results_dir, name, jobs)
 
 
 def examine_abi_host(download_path, results_dir, name):
@@ -237,10 +292,8 @@ def examine_abi_host(download_path, results_dir, name):
         util.print_fatal("Error invoking abireport: {}".format(e))
 
 
-def examine_abi_fallback(download_path, results_dir, name):
+def examine_abi_fallback(download_path, results_dir, name, jobs=None):
     """Missing abireport so fallback to internal scanning."""
-    old_dir = os.getcwd()
-
     rpms = set()
     for item in os.listdir(results_dir):
         namelen = len(name)
@@ -262,18 +315,19 @@ def examine_abi_fallback(download_path, results_dir, name):
         util.print_fatal("Cannot create extraction tree: {}".format(e))
         sys.exit(1)
 
-    os.chdir(extract_dir)
+    cache = abicache.AbiCache(os.path.join(download_path, abicache.CACHE_FILE))
 
-    # Extract all those rpms to our current directory
-    try:
-        for rpm in rpms:
-            cmd = 'rpm2cpio "{}" | cpio -imd 2>/dev/null'.format(os.path.join(results_dir, rpm))
-            subprocess.check_call(cmd, shell=True)
-    except Exception as e:
-        util.print_fatal("Error extracting RPMS: {}".format(e))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # Extract all those rpms to our extraction tree
+        try:
+            rpm_paths = [os.path.join(results_dir, rpm) for rpm in sorted(rpms)]
+            list(pool.map(extract_rpm, rpm_paths, [extract_dir] * len(rpm_paths)))
+        except Exception as e:
+            util.print_fatal("Error extracting RPMS: {}".format(e))
+
+        elves = scan_elf_files(extract_dir, pool, cache)
 
-    os.chdir(download_path)
-    collected_files = set()
+    collected_files = dict()
 
     # Places we expect to find shared libraries
     for check_path in valid_dirs:
@@ -288,20 +342,28 @@ def examine_abi_fallback(download_path, results_dir, name):
             f = os.path.basename(file)
 
             clean_path = os.path.abspath(os.path.join(dirn, f))
-            if not is_file_valid(clean_path):
+            if os.path.islink(clean_path):
                 continue
-            collected_files.add(clean_path)
+            if clean_path in elves:
+                elf = elves[clean_path]
+            else:
+                # only reachable through a symlinked directory
+                elf = elfreader.read_elf(clean_path)
+            if elf is None or not elf.is_shared_object:
+                continue
+            collected_files[clean_path] = elf
 
     abi_report = dict()
 
     # Now examine these libraries
     for library in sorted(collected_files):
-        soname = get_soname(library)
+        elf = collected_files[library]
+        soname = elf.soname
         if not soname:
             warn = "Failed to determine soname of: {}".format(library)
             util.print_warning(warn)
             soname = os.path.basename(library)
-        symbols = dump_symbols(library)
+        symbols = elf.symbols.difference(ignored_symbols)
         if symbols and len(symbols) > 0:
             if soname not in abi_report:
                 abi_report[soname] = set()
@@ -321,7 +383,7 @@ def examine_abi_fallback(download_path, results_dir, name):
         truncate_file(report_file)
 
     # Write the library report
-    lib_deps = get_all_dependencies(extract_dir)
+    lib_deps = get_all_dependencies(extract_dir, elves)
     report_file = os.path.join(download_path, "used_libs")
     if len(lib_deps) > 0:
         report = util.open_auto(report_file, "w")
@@ -331,5 +393,10 @@ def examine_abi_fallback(download_path, results_dir, name):
     else:
         truncate_file(report_file)
 
-    os.chdir(old_dir)
+    try:
+        cache.save()
+    except OSError as e:
+        util.print_warning("Cannot save ABI cache: {}".format(e))
+    util.print_info(cache.summary())
+
     purge_tree(extract_dir)
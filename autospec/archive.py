@@ -0,0 +1,161 @@
+#!/bin/true
+#
+# archive.py - part of autospec
+# Copyright (C) 2018 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Reproducible source archives of a directory tree: the same tree gives
+# the same bytes however and whenever it was checked out.
+#
+
+import gzip
+import os
+import shutil
+import subprocess
+import tarfile
+
+# codec -> (file extension, default level)
+CODECS = {
+    "gzip": (".tar.gz", 9),
+    "zstd": (".tar.zst", 19),
+}
+# What a git directory holds about one clone rather than the repository:
+# stat data of the checkout, reflogs with times and paths, last fetch
+GIT_VOLATILE = {"index", "logs", "FETCH_HEAD", "ORIG_HEAD"}
+
+
+def source_date(tree):
+    """Return the timestamp archived files are clamped to.
+
+    That is SOURCE_DATE_EPOCH if set, else the time of the last commit of
+    the git checkout at tree, else None.
+    """
+    if os.environ.get("SOURCE_DATE_EPOCH"):
+        return int(os.environ["SOURCE_DATE_EPOCH"])
+    process = subprocess.run(["git", "log", "-1", "--format=%ct"], cwd=tree, stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL, universal_newlines=True)
+    if process.returncode == 0 and process.stdout.strip().isdigit():
+        return int(process.stdout.strip())
+    return None
+
+
+def compress_command(codec, level=None, threads=None):
+    """Return the command compressing stdin to stdout, or None to use gzip.
+
+    Compressed output does not depend on the number of threads.
+    """
+    level = level or CODECS[codec][1]
+    threads = threads or os.cpu_count() or 1
+    if codec == "zstd":
+        return ["zstd", "-q", "-{}".format(level), "-T{}".format(threads)] + (["--ultra"] if level > 19 else [])
+    if shutil.which("pigz"):
+        # -n leaves the name and time out of the header
+        return ["pigz", "-n", "-{}".format(level), "-p", str(threads)]
+    return None
+
+
+def git_volatile(name):
+    """Tell whether the archive member name is clone specific git state.
+
+    That is one of GIT_VOLATILE in .git, or in the git directory of a
+    submodule under .git/modules.
+    """
+    parts = name.split("/")
+    parent = parts[:-1]
+    if parts[-1] not in GIT_VOLATILE or not parent:
+        return False
+    return parent[-1] == ".git" or (len(parent) >= 2 and parent[-2] == "modules" and ".git" in parent[:-2])
+
+
+def normalize(tarinfo, mtime):
+    """Strip what depends on who checked the tree out and when."""
+    tarinfo.uid = tarinfo.gid = 0
+    tarinfo.uname = tarinfo.gname = ""
+    if mtime is not None:
+        tarinfo.mtime = min(tarinfo.mtime, mtime)
+    if tarinfo.isdir():
+        tarinfo.mode = 0o755
+    elif tarinfo.issym():
+        tarinfo.mode = 0o777
+    else:
+        tarinfo.mode = 0o755 if tarinfo.mode & 0o111 else 0o644
+    return tarinfo
+
+
+def write_tar(tree, arcname, fileobj, mtime=None):
+    """Write tree as arcname/ in an uncompressed tar stream to fileobj.
+
+    Entries are sorted by name and normalized, files are clamped to mtime.
+    What git keeps about the clone itself is left out, so two clones of the
+    same commit give the same tar.
+    """
+    with tarfile.open(fileobj=fileobj, mode="w|", format=tarfile.GNU_FORMAT) as tar:
+        stack = [(tree, arcname)]
+        while stack:
+            path, name = stack.pop()
+            if git_volatile(name):
+                continue
+            tarinfo = tar.gettarinfo(path, name)
+            if tarinfo is None:
+                # sockets and the like cannot be archived, tar.add skips them too
+                continue
+            tarinfo = normalize(tarinfo, mtime)
+            if tarinfo.isreg():
+                with open(path, "rb") as content:
+                    tar.addfile(tarinfo, content)
+            else:
+                tar.addfile(tarinfo)
+            if tarinfo.isdir():
+                for entry in sorted(os.listdir(path), reverse=True):
+                    stack.append((os.path.join(path, entry), name + "/" + entry))
+
+
+def write_archive(tree, dest, arcname=None, codec="gzip", level=None, threads=None, use_git=False):
+    """Write a reproducible compressed tarball of tree to dest.
+
+    With use_git, `git archive` writes the tar of the checked out commit,
+    without the .git directory. Raises CalledProcessError if an external
+    command fails, dest is only created on success.
+    """
+    arcname = arcname or os.path.basename(os.path.normpath(tree))
+    if codec not in CODECS:
+        raise ValueError("Unknown archive codec {}".format(codec))
+    command = compress_command(codec, level, threads)
+    tmp = dest + ".tmp"
+    try:
+        with open(tmp, "wb") as out:
+            if command:
+                compressor = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=out)
+                sink = compressor.stdin
+            else:
+                compressor = None
+                sink = gzip.GzipFile(filename="", mode="wb", compresslevel=level or CODECS[codec][1], fileobj=out, mtime=0)
+            try:
+                if use_git:
+                    git_command = ["git", "archive", "--format=tar", "--prefix={}/".format(arcname), "HEAD"]
+                    with subprocess.Popen(git_command, cwd=tree, stdout=subprocess.PIPE) as git:
+                        shutil.copyfileobj(git.stdout, sink, 1024 * 1024)
+                    if git.returncode:
+                        raise subprocess.CalledProcessError(git.returncode, git_command)
+                else:
+                    write_tar(tree, arcname, sink, source_date(tree))
+            finally:
+                sink.close()
+                if compressor and compressor.wait():
+                    raise subprocess.CalledProcessError(compressor.returncode, command)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
@@ -24,17 +24,24 @@ import sys
 import tempfile
 
 from abireport import examine_abi
+import archive
 import build
 import buildreq
 import check
 import commitmessage
 import config
+import count
+import extractcache
 import files
 import git
 import license
-from logcheck import logcheck
+import licenseserver
+from logcheck import logcheck, LogCheck
+import logreader
 import pkg_integrity
 import pkg_scan
+import preflight
+import sourcecache
 import specdescription
 import specfiles
 import tarball
@@ -118,23 +125,6 @@ def read_old_metadata():
     )
 
 
-def save_mock_logs(path, iteration):
-    """Save Mock build logs to <path>/results/round<iteration>-*.log."""
-    basedir = os.path.join(path, "results")
-    loglist = [
-        "build",
-        "root",
-        "srpm-build",
-        "srpm-root",
-        "mock_srpm",
-        "mock_build",
-    ]
-    for log in loglist:
-        src = "{}/{}.log".format(basedir, log)
-        dest = "{}/round{}-{}.log".format(basedir, iteration, log)
-        os.rename(src, dest)
-
-
 def write_prep(conf, workingdir, content):
     """Write metadata to the local workingdir when --prep-only is used."""
     if conf.urlban:
@@ -245,6 +235,61 @@ def main():
     parser.add_argument(
         "-ffc", "--force_fullclone", action="store", dest="force_fullclone", default=None, help="Force full clone from git",
     )
+    parser.add_argument(
+        "-j", "--jobs", action="store", dest="jobs", type=int, default=None, help="Number of worker processes for parallel scanning, defaults to the number of CPUs",
+    )
+    parser.add_argument(
+        "--source-cache", action="store", dest="source_cache", default=sourcecache.default_path(),
+        help="Directory of the source archive cache shared by all packages, empty to disable (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--license-cache", action="store", dest="license_cache", default=licenseserver.default_path(),
+        help="File to keep the license server answers in between runs, empty to disable (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--git-refs-interval", action="store", dest="git_refs_interval", type=int, default=git.REFS_CACHE_INTERVAL,
+        help="Seconds to reuse the tags listed by a git remote before asking it again, 0 to always ask (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--git-mirrors", action="store", dest="git_mirrors", default=git.cache_path("git-mirrors"),
+        help="Directory of the bare mirrors git sources are cloned from and fetched into, empty to clone directly (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--git-filter", action="store", dest="git_filter", default=None,
+        help="Partial clone filter of new git mirrors, e.g. blob:none",
+    )
+    parser.add_argument(
+        "--git-depth", action="store", dest="git_depth", type=int, default=None,
+        help="Only fetch this many commits of history into the git mirrors",
+    )
+    parser.add_argument(
+        "--archive-codec", action="store", dest="archive_codec", default="gzip", choices=sorted(archive.CODECS),
+        help="Compression of the tarballs made from git sources (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--archive-level", action="store", dest="archive_level", type=int, default=None,
+        help="Compression level of the tarballs made from git sources",
+    )
+    parser.add_argument(
+        "--archive-threads", action="store", dest="archive_threads", type=int, default=None,
+        help="Compression threads for the tarballs made from git sources, defaults to the number of CPUs",
+    )
+    parser.add_argument(
+        "--git-archive", action="store_true", dest="git_archive", default=False,
+        help="Make the tarballs of git sources without submodules with git archive, without the .git directory",
+    )
+    parser.add_argument(
+        "--extract-cache", action="store", dest="extract_cache", default=None,
+        help="Keep the extracted sources under this directory and reuse them on the next run if the archives are unchanged",
+    )
+    parser.add_argument(
+        "--preflight", action="store_true", dest="preflight", default=False,
+        help="Add every build requirement declared by configure.ac, CMake and meson files before the first mock round",
+    )
+    parser.add_argument(
+        "--follow-log", action="store_true", dest="follow_log", default=False,
+        help="Scan build.log while mock runs and stop the build as soon as a missing build requirement shows up",
+    )
     parser.add_argument(
         "-dbg", "--debug", action="store_true", dest="debug", default=False, help="Enable debugging",
     )
@@ -257,6 +302,15 @@ def main():
     archives = args.archives or a_archives
     archives_from_git = args.archives_from_git or a_archives_from_git
     util.debugging = args.debug
+    if args.git_refs_interval > 0:
+        git.refs_cache = git.RefsCache(interval=args.git_refs_interval)
+    git.mirrors_dir = args.git_mirrors or None
+    git.mirror_filter = args.git_filter
+    git.mirror_depth = args.git_depth
+    git.archive_codec = args.archive_codec
+    git.archive_level = args.archive_level
+    git.archive_threads = args.archive_threads
+    git.archive_use_git = args.git_archive
     args.integrity = False
     if os.path.exists(f"{name}.license") == False:
         write_out(f"{name}.license", "GPL-2.0\n")
@@ -424,6 +478,12 @@ def main():
         package(
             args, url, name, archives, archives_from_git, "./workingdir", download_from_git, branch, redownload_from_git, redownload_archive, force_module, force_fullclone, mock_dir, short_circuit,
         )
+    elif args.extract_cache:
+        extract_cache = extractcache.ExtractCache(args.extract_cache, args.target)
+        package(
+            args, url, name, archives, archives_from_git, extract_cache.tree, download_from_git, branch, redownload_from_git, redownload_archive, force_module, force_fullclone,
+            mock_dir, short_circuit, extract_cache,
+        )
     else:
         with tempfile.TemporaryDirectory() as workingdir:
             package(
@@ -433,6 +493,7 @@ def main():
 
 def package(
     args, url, name, archives, archives_from_git, workingdir, download_from_git, branch, redownload_from_git, redownload_archive, force_module, force_fullclone, mock_dir, short_circuit,
+    extract_cache=None,
 ):
     """Entry point for building a package with autospec."""
     conf = config.Config(args.target)
@@ -451,7 +512,7 @@ def package(
             print_debug(f"url 2: {url}")
             print_debug(f"BRANCH 2: {branch}")
         # filename_re = re.compile(r"^{}{}".format(name, r"(-|-.)(\d+)(\.\d+)+\.tar\.gz"))
-        filename_re = re.compile(r"^{}{}".format(name, r"-.*\.tar\.gz"))
+        filename_re = re.compile(r"^{}{}".format(name, r"-.*\.tar\.(gz|zst)$"))
         if os.path.basename(os.getcwd()) == name:
             package_path = "./"
             if util.debugging:
@@ -530,7 +591,7 @@ def package(
             fileslist = []
             download_file_full_path = ""
             arch_name = os.path.splitext(os.path.basename(new_arch_url))[0]
-            filename_re = re.compile(r"^{}{}".format(arch_name, r"-.*\.tar\.gz"))
+            filename_re = re.compile(r"^{}{}".format(arch_name, r"-.*\.tar\.(gz|zst)$"))
             if util.debugging:
                 print_debug(f"\n\narch_name: {arch_name}")
             if os.path.basename(os.getcwd()) == name:
@@ -606,6 +667,7 @@ def package(
     check_requirements(args.git)
     conf.detect_build_from_url(url)
     package = build.Build()
+    package.follow_log = args.follow_log
 
     #
     # First, download the tarball, extract it and then do a set
@@ -614,7 +676,9 @@ def package(
     filemanager = files.FileManager(conf, package, mock_dir, short_circuit)
     if util.debugging:
         print_debug(f"url 4: {url}")
-    content = tarball.Content(url, name, args.version, archives, conf, workingdir, giturl, download_from_git, branch, new_archives_from_git, force_module, force_fullclone)
+    source_cache = sourcecache.SourceCache(args.source_cache) if args.source_cache else None
+    content = tarball.Content(url, name, args.version, archives, conf, workingdir, giturl, download_from_git, branch, new_archives_from_git, force_module, force_fullclone,
+                              source_cache, extract_cache)
     content.process(filemanager)
     conf.create_versions(content.multi_version)
     conf.content = content  # hack to avoid recursive dependency on init
@@ -633,6 +697,10 @@ def package(
         write_prep(conf, workingdir, content)
         exit(0)
 
+    license_server = None
+    if conf.license_fetch:
+        license_server = licenseserver.LicenseServer(conf.license_fetch, args.license_cache or None)
+
     if args.license_only:
         try:
             with open(os.path.join(conf.download_path, content.name + ".license"), "r",) as dotlic:
@@ -642,17 +710,22 @@ def package(
         except Exception:
             pass
         # Start one directory higher so we scan *all* versions for licenses
-        license.scan_for_licenses(os.path.dirname(_dir), conf, name)
+        license.scan_for_licenses(os.path.dirname(_dir), conf, name, server=license_server)
         exit(0)
 
+    # Start one directory higher so we scan *all* versions for licenses, the
+    # other scanners walk the _dir part of the same listing
+    tree = util.SourceTree(os.path.dirname(_dir))
+    preflight_added = []
     if short_circuit == "prep" or short_circuit is None:
-        requirements.scan_for_configure(_dir, content.name, conf)
-    specdescription.scan_for_description(content.name, _dir, conf.license_translations, conf.license_blacklist)
-    # Start one directory higher so we scan *all* versions for licenses
-    license.scan_for_licenses(os.path.dirname(_dir), conf, content.name)
-    commitmessage.scan_for_changes(conf.download_path, _dir, conf.transforms)
+        requirements.scan_for_configure(_dir, content.name, conf, tree)
+        if args.preflight:
+            preflight_added = preflight.add_declared_buildreqs(requirements, conf, _dir, tree)
+    specdescription.scan_for_description(content.name, _dir, conf.license_translations, conf.license_blacklist, tree)
+    license.scan_for_licenses(os.path.dirname(_dir), conf, content.name, tree, args.jobs, license_server)
+    commitmessage.scan_for_changes(conf.download_path, _dir, conf.transforms, tree)
     conf.add_sources(archives, content)
-    check.scan_for_tests(_dir, conf, requirements, content)
+    check.scan_for_tests(_dir, conf, requirements, content, tree)
 
     #
     # Now, we have enough to write out a specfile, and try to build it.
@@ -700,10 +773,30 @@ def package(
         if package.round > 20 or package.must_restart == 0:
             break
 
-        save_mock_logs(conf.download_path, package.round)
+        build.save_mock_logs(conf.download_path, package.round)
+
+    if preflight_added:
+        print_info(f"Built in {package.round} mock rounds, pre-flight added {len(preflight_added)} build requirements "
+                   f"that would each have taken up to one more")
+
+    # Read the final build.log once for both the test counts and logcheck
+    log_checker = None
+    test_counts = None
+    build_log = logreader.LogReader(os.path.join(conf.download_path, "results", "build.log"))
+    if os.path.exists(build_log.filename):
+        if package.success == 1 and (short_circuit is None or short_circuit == "build"):
+            log_checker = LogCheck()
+            build_log.register(log_checker.feed)
+        if (short_circuit is None or short_circuit == "install") and not conf.config_opts["skip_tests"]:
+            test_counter = count.TestCounter()
+            build_log.register(test_counter.feed_line)
+        if build_log.consumers:
+            build_log.run()
+        if (short_circuit is None or short_circuit == "install") and not conf.config_opts["skip_tests"]:
+            test_counts = test_counter.finish_log()
 
     if short_circuit == None or short_circuit == "install":
-        check.check_regression(conf.download_path, conf.config_opts["skip_tests"])
+        check.check_regression(conf.download_path, conf.config_opts["skip_tests"], test_counts)
 
     #conf.create_buildreq_cache(content.version, requirements.buildreqs_cache)
     #conf.create_reqs_cache(content.version, requirements.reqs_cache)
@@ -724,7 +817,7 @@ def package(
                 pass
 
         if (short_circuit == None):
-            examine_abi(conf.download_path, content.name)
+            examine_abi(conf.download_path, content.name, args.jobs)
             if os.path.exists("/var/lib/rpm"):
                 print("\nGenerating whatrequires\n")
                 pkg_scan.get_whatrequires(content.name, conf.yum_conf)
@@ -732,7 +825,7 @@ def package(
             write_out(conf.download_path + "/release", content.release + "\n")
 
             # record logcheck output
-            logcheck(conf.download_path)
+            logcheck(conf.download_path, log_checker)
 
             if args.git:
                 print("\nTrying to guess the commit message\n")
@@ -746,14 +839,14 @@ def package(
 
         elif (short_circuit == "build"):
             # record logcheck output
-            logcheck(conf.download_path)
+            logcheck(conf.download_path, log_checker)
 
         #elif (short_circuit == "install"):
             ## record logcheck output
             #logcheck(conf.download_path)
 
         elif (short_circuit == "binary"):
-            examine_abi(conf.download_path, content.name)
+            examine_abi(conf.download_path, content.name, args.jobs)
             if os.path.exists("/var/lib/rpm"):
                 print("\nGenerating whatrequires\n")
                 pkg_scan.get_whatrequires(content.name, conf.yum_conf)
@@ -19,15 +19,30 @@
 # Actually build the package
 #
 
+import hashlib
 import os
 import re
+import shlex
 import shutil
 import sys
 import subprocess
+import time
+import logreader
 import util
 import shutil
 from util import call, write_out, print_fatal, print_debug, print_info, scantree
 
+# Longest build.log section buffered to be skipped when unchanged next round
+SEGMENT_MAX_LINES = 100000
+# Seconds between reads of the build.log followed while mock runs, seconds
+# mock goes on once a missing requirement shows up in it, and seconds it
+# gets to exit once asked to
+FOLLOW_INTERVAL = 1
+FOLLOW_LINGER = 5
+FOLLOW_STOP_TIMEOUT = 60
+# Source and patch files the spec packs into the SRPM
+SPEC_SOURCE_RE = re.compile(r"^(?:Source|Patch)\d*\s*:\s*(\S+)", re.MULTILINE)
+
 def cleanup_req(s: str) -> str:
     """Strip unhelpful strings from requirements."""
     if "is wanted" in s:
@@ -81,6 +96,28 @@ def get_mock_cmd():
     return 'sudo PYTHONMALLOC=malloc MIMALLOC_PAGE_RESET=0 MIMALLOC_LARGE_OS_PAGES=1 LD_PRELOAD=/usr/lib64/libmimalloc.so /usr/bin/mock'
 
 
+def save_mock_logs(path, iteration):
+    """Save Mock build logs to <path>/results/round<iteration>-*.log.
+
+    Logs a round did not write are skipped, a round reusing the SRPM has no
+    srpm logs.
+    """
+    basedir = os.path.join(path, "results")
+    loglist = [
+        "build",
+        "root",
+        "srpm-build",
+        "srpm-root",
+        "mock_srpm",
+        "mock_build",
+    ]
+    for log in loglist:
+        src = "{}/{}.log".format(basedir, log)
+        dest = "{}/round{}-{}.log".format(basedir, iteration, log)
+        if os.path.exists(src):
+            os.rename(src, dest)
+
+
 class Build(object):
     """Manage package builds."""
 
@@ -93,6 +130,17 @@ class Build(object):
         self.warned_about = set()
         self.mock_dir = str()
         self.short_circuit = str()
+        # build.log section digest -> pattern matches, for this round and the last
+        self.log_segments = {}
+        self.previous_segments = {}
+        self.lines_scanned = 0
+        self.lines_total = 0
+        # scan build.log while mock runs and stop it once it must restart
+        self.follow_log = False
+        self.stopped_early = False
+        # digest of the spec and sources the SRPM in results/ was built from
+        self.srpm_digest = None
+        self.srpm_reused = False
 
     def write_normal_bashrc(self, mock_dir, content_name, config):
         """Write normal bashrc to package builddir home directory."""
@@ -288,17 +336,115 @@ class Build(object):
                 util.print_warning(f"Unknown pattern match: {s}")
                 self.warned_about.add(s)
 
+    def dispatch_pattern(self, group, line, pat, args, config, requirements):
+        """Hand a build.log line matching pat to the handler of its group."""
+        if group == "pkgconfig":
+            self.simple_pattern_pkgconfig(line, pat, *args, config.config_opts.get('32bit'), requirements)
+        elif group == "simple":
+            self.simple_pattern(line, pat, *args, requirements)
+        elif group == "failed":
+            self.failed_pattern(line, config, requirements, pat, *args)
+        elif group == "failed_exit":
+            self.failed_exit_pattern(line, config, requirements, pat, *args)
+
+    def scan_log_segment(self, lines, digest, config, requirements):
+        """Run the build.log patterns over one Executing(%...) section.
+
+        A section whose digest matches one from the previous round is not
+        scanned again; the matches recorded then are replayed instead, so
+        the handlers (and must_restart) see exactly what a full scan would
+        give. Pass digest=None for lines that must always be scanned.
+        """
+        key = digest.hexdigest() if digest is not None else None
+        matches = self.previous_segments.get(key) if key else None
+        if matches is None:
+            matches = []
+            for line in lines:
+                # only patterns whose literal prefilter hits are searched
+                for group, pat, args in config.log_patterns.candidates(line):
+                    if pat.search(line):
+                        matches.append((group, line, pat, args))
+            self.lines_scanned += len(lines)
+        if key:
+            self.log_segments[key] = matches
+        for group, line, pat, args in matches:
+            self.dispatch_pattern(group, line, pat, args, config, requirements)
+
+    def run_mock_build(self, command, logfile, config, requirements):
+        """Run the mock rpm build and return its exit code.
+
+        With follow_log, build.log is scanned as mock writes it. Once a line
+        calls for a restart (a missing build requirement), mock is stopped
+        FOLLOW_LINGER seconds later instead of left to finish a build that
+        has to run again anyway. parse_build_results then reads the partial
+        log as usual.
+        """
+        self.stopped_early = False
+        if not self.follow_log or self.short_circuit in ("prep", "binary"):
+            return util.call(command, logfile=logfile, check=False, cwd=config.download_path)
+
+        requirements.verbose = 1
+        self.must_restart = 0
+        found = None
+        with open(logfile, "w") as mock_log:
+            proc = subprocess.Popen(shlex.split(command), stdout=mock_log, stderr=subprocess.STDOUT,
+                                    universal_newlines=True, cwd=config.download_path)
+
+            def keep_following():
+                if proc.poll() is not None:
+                    return False
+                return found is None or time.monotonic() - found < FOLLOW_LINGER
+
+            build_log = os.path.join(config.download_path, "results", "build.log")
+            for line in logreader.follow_lines(build_log, keep_following, FOLLOW_INTERVAL):
+                for group, pat, args in config.log_patterns.candidates(line):
+                    if pat.search(line):
+                        self.dispatch_pattern(group, line, pat, args, config, requirements)
+                if self.must_restart and found is None:
+                    print_info("Missing build requirement found while mock is running, stopping it")
+                    found = time.monotonic()
+
+            if proc.poll() is None:
+                self.stopped_early = True
+                proc.terminate()
+                try:
+                    proc.wait(FOLLOW_STOP_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+            return proc.wait()
+
+    def srpm_inputs_digest(self, config, content, mock_args):
+        """Return a digest of the spec and every Source/Patch file it names.
+
+        mock_args are the options the SRPM is built with, a change to them
+        changes the digest too. Files not downloaded yet hash as missing.
+        """
+        digest = hashlib.sha256()
+        digest.update(" ".join(mock_args).encode("utf-8"))
+        with open(os.path.join(config.download_path, f"{content.name}.spec"), "rb") as specf:
+            spec = specf.read()
+        digest.update(spec)
+        for source in SPEC_SOURCE_RE.findall(spec.decode("utf-8", "surrogateescape")):
+            for macro, value in (("name", content.name), ("version", content.version), ("release", content.release)):
+                source = source.replace("%{" + macro + "}", str(value))
+            path = os.path.join(config.download_path, os.path.basename(source))
+            digest.update(b"\0" + os.path.basename(source).encode("utf-8", "surrogateescape") + b"\0")
+            if not os.path.isfile(path):
+                digest.update(b"missing")
+                continue
+            with open(path, "rb") as sourcef:
+                for chunk in iter(lambda: sourcef.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
     def parse_buildroot_log(self, filename, returncode):
         """Handle buildroot log contents."""
         if returncode == 0:
             return True
         self.must_restart = 0
         is_clean = True
-        util.call("sync")
-        with util.open_auto(filename, "r") as rootlog:
-            loglines = rootlog.readlines()
         missing_pat = re.compile(r"^.*No matching package to install: '(.*)'$")
-        for line in loglines:
+        for line in logreader.read_lines(filename):
             match = missing_pat.match(line)
             if match is not None:
                 util.print_fatal("Cannot resolve dependency name: {}".format(match.group(1)))
@@ -311,23 +457,33 @@ class Build(object):
         self.must_restart = 0
         infiles = 0
 
-        # Flush the build-log to disk, before reading it
-        util.call("sync")
-        with util.open_auto(filename, "r") as buildlog:
-            loglines = buildlog.readlines()
-        for line in loglines:
-            if self.short_circuit != "prep" and self.short_circuit != "binary":
-                for pat in config.pkgconfig_pats:
-                    self.simple_pattern_pkgconfig(line, *pat, config.config_opts.get('32bit'), requirements)
-
-                for pat in config.simple_pats:
-                    self.simple_pattern(line, *pat, requirements)
-
-                for pat in config.failed_pats:
-                    self.failed_pattern(line, config, requirements, *pat)
-
-                for pat in config.failed_exit_pats:
-                    self.failed_exit_pattern(line, config, requirements, *pat)
+        scan_patterns = self.short_circuit != "prep" and self.short_circuit != "binary"
+        # lines of the current Executing(%...) section not yet pattern matched
+        segment = []
+        digest = hashlib.sha1()
+        self.log_segments = {}
+        self.lines_scanned = 0
+        self.lines_total = 0
+
+        for line in logreader.read_lines(filename):
+            self.lines_total += 1
+            if scan_patterns:
+                if line.startswith("Executing(%"):
+                    self.scan_log_segment(segment, digest, config, requirements)
+                    segment = []
+                    digest = hashlib.sha1()
+                elif digest is not None:
+                    # the header names a random rpm-tmp script, keep it out of the hash
+                    digest.update(line.encode("utf-8", "surrogateescape"))
+                if digest is None:
+                    self.scan_log_segment([line], None, config, requirements)
+                else:
+                    segment.append(line)
+                    if len(segment) >= SEGMENT_MAX_LINES:
+                        # too big to hold on to, scan the rest as it streams by
+                        self.scan_log_segment(segment, None, config, requirements)
+                        segment = []
+                        digest = None
 
             #check_for_warning_pattern(line)
 
@@ -387,6 +543,12 @@ class Build(object):
                     print("RPM install build successful")
                     self.success = 1
 
+        if scan_patterns:
+            self.scan_log_segment(segment, digest, config, requirements)
+            print_info(f"Scanned {self.lines_scanned} of {self.lines_total} build.log lines "
+                       f"({self.lines_total - self.lines_scanned} in sections unchanged since the previous round)")
+        self.previous_segments = self.log_segments
+
 
     def package(self, filemanager, mockconfig, mockopts, config, requirements, content, mock_dir, short_circuit, cleanup=False):
         """Run main package build routine."""
@@ -410,26 +572,32 @@ class Build(object):
             shutil.rmtree('{}/results'.format(config.download_path), ignore_errors=True)
             os.makedirs('{}/results'.format(config.download_path))
 
-        cmd_args = [
-            mock_cmd,
-            f"--root={mockconfig}",
-            "--buildsrpm",
-            "--sources=./",
-            f"--spec={content.name}.spec",
-            f"--uniqueext={self.uniqueext}",
-            "--result=results/",
-            cleanup_flag,
-            mockopts,
-        ]
-        util.call(" ".join(cmd_args),
-                  logfile=f"{config.download_path}/results/mock_srpm.log",
-                  cwd=config.download_path)
-
-        # back up srpm mock logs
-        util.call("mv results/root.log results/srpm-root.log", cwd=config.download_path)
-        util.call("mv results/build.log results/srpm-build.log", cwd=config.download_path)
-
         srcrpm = f"results/{content.name}-{content.version}-{content.release}.src.rpm"
+        # rounds that leave the spec and sources as they were reuse the SRPM
+        digest = self.srpm_inputs_digest(config, content, [mockconfig, mockopts])
+        self.srpm_reused = digest == self.srpm_digest and os.path.exists(os.path.join(config.download_path, srcrpm))
+        if self.srpm_reused:
+            print_info(f"Spec and sources unchanged, reusing {srcrpm}")
+        else:
+            cmd_args = [
+                mock_cmd,
+                f"--root={mockconfig}",
+                "--buildsrpm",
+                "--sources=./",
+                f"--spec={content.name}.spec",
+                f"--uniqueext={self.uniqueext}",
+                "--result=results/",
+                cleanup_flag,
+                mockopts,
+            ]
+            util.call(" ".join(cmd_args),
+                      logfile=f"{config.download_path}/results/mock_srpm.log",
+                      cwd=config.download_path)
+
+            # back up srpm mock logs
+            util.call("mv results/root.log results/srpm-root.log", cwd=config.download_path)
+            util.call("mv results/build.log results/srpm-build.log", cwd=config.download_path)
+            self.srpm_digest = digest
 
         cmd_args = [
             mock_cmd,
@@ -440,10 +608,7 @@ class Build(object):
             cleanup_flag,
             mockopts,
         ]
-        ret = util.call(" ".join(cmd_args),
-                        logfile=f"{config.download_path}/results/mock_build.log",
-                        check=False,
-                        cwd=config.download_path)
+        ret = self.run_mock_build(" ".join(cmd_args), f"{config.download_path}/results/mock_build.log", config, requirements)
 
         if self.short_circuit == "prep":
             self.write_normal_bashrc(mock_dir, content.name, config)
@@ -454,6 +619,8 @@ class Build(object):
             util.print_fatal("Mock command failed, results log does not exist. User may not have correct permissions.")
             exit(1)
 
+        # Flush the mock logs to disk, before reading them
+        util.call("sync")
         is_clean = self.parse_buildroot_log(config.download_path + "/results/root.log", ret)
         if is_clean:
             self.parse_build_results(config.download_path + "/results/build.log", ret, filemanager, config, requirements, content)
@@ -103,6 +103,16 @@ def is_version(num_str):
     return False
 
 
+# dependency('name', ...) calls in meson.build, and their required: keyword
+MESON_DEPENDENCY_RE = re.compile(r"""(?<![\w.])dependency\s*\(\s*['"]([^'"]+)['"]([^)]*)""")
+MESON_REQUIRED_RE = re.compile(r"\brequired\s*:\s*(\w+)")
+# Dependencies meson resolves by itself rather than through pkg-config
+MESON_BUILTIN_DEPENDENCIES = {
+    "appleframeworks", "blocks", "boost", "coarray", "cuda", "dl", "gmock", "gtest", "hdf5", "iconv",
+    "intl", "jdk", "jni", "llvm", "mpi", "netcdf", "openmp", "qt4", "qt5", "qt6", "threads", "wxwidgets",
+}
+
+
 def parse_modules_list(modules_string, is_cmake=False):
     """Parse the modules_string for the list of modules, stripping out the version requirements."""
     if is_cmake:
@@ -706,6 +716,25 @@ class Requirements(object):
                     for m in parse_modules_list(module, is_cmake=True):
                         self.add_pkgconfig_buildreq(m, conf32, cache=cache)
 
+    def parse_meson_build(self, filename, conf32, cache=False):
+        """Scan a meson.build file for the pkgconfig modules it requires.
+
+        Dependencies with a required: keyword (false, or a feature option)
+        are optional and left out, and so are the ones meson finds without
+        pkg-config.
+        """
+        with util.open_auto(filename, "r") as f:
+            content = f.read()
+        for match in MESON_DEPENDENCY_RE.finditer(content):
+            module, rest = match.groups()
+            required = MESON_REQUIRED_RE.search(rest)
+            if required and required.group(1) != "true":
+                continue
+            if module in MESON_BUILTIN_DEPENDENCIES:
+                continue
+            for mod in parse_modules_list(module):
+                self.add_pkgconfig_buildreq(mod, conf32, cache=cache)
+
     def qmake_profile(self, filename, qt_modules, cache=False):
         """Scan .pro file for build requirements."""
         with util.open_auto(filename, "r") as f:
@@ -918,8 +947,11 @@ class Requirements(object):
             self.extra_cmake_special_pgo.add("-DCATKIN_BUILD_BINARY_PACKAGE=ON")
             self.extra_cmake_special_pgo.add("-DSETUPTOOLS_DEB_LAYOUT=OFF")
 
-    def scan_for_configure(self, dirn, tname, config):
-        """Scan the package directory for build files to determine build pattern."""
+    def scan_for_configure(self, dirn, tname, config, tree=None):
+        """Scan the package directory for build files to determine build pattern.
+
+        tree is an optional util.SourceTree to walk instead of the file system.
+        """
         if config.default_pattern == "distutils36":
             self.add_buildreq("buildreq-distutils36")
             self.add_buildreq("python-build")
@@ -949,7 +981,8 @@ class Requirements(object):
             self.add_buildreq("buildreq-nginx")
 
         count = 0
-        for dirpath, _, files in os.walk(dirn):
+        walk = tree.walk if tree else os.walk
+        for dirpath, _, files in walk(dirn):
             default_score = 2 if dirpath == dirn else 1
 
             if any(f.endswith(".go") for f in files):
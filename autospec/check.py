@@ -28,12 +28,17 @@ import util
 tests_config = ""
 
 
-def check_regression(pkg_dir, skip_tests):
-    """Check the build log for test regressions using the count module."""
+def check_regression(pkg_dir, skip_tests, result=None):
+    """Check the build log for test regressions using the count module.
+
+    result is the count CSV when the build log was already counted, for
+    instance by a shared logreader.LogReader pass.
+    """
     if skip_tests:
         return
 
-    result = count.parse_log(os.path.join(pkg_dir, "results/build.log"))
+    if result is None:
+        result = count.parse_log(os.path.join(pkg_dir, "results/build.log"))
     titles = [('Package', 'package name', 1),
               ('Total', 'total tests', 1),
               ('Pass', 'total passing', 1),
@@ -52,8 +57,11 @@ def check_regression(pkg_dir, skip_tests):
     util.write_out(os.path.join(pkg_dir, "testresults"), res_str)
 
 
-def scan_for_tests(src_dir, config, requirements, content):
-    """Scan source directory for test files and set tests_config accordingly."""
+def scan_for_tests(src_dir, config, requirements, content, tree=None):
+    """Scan source directory for test files and set tests_config accordingly.
+
+    tree is an optional util.SourceTree to walk instead of the file system.
+    """
     global tests_config
 
     if config.config_opts.get('skip_tests') or tests_config:
@@ -163,7 +171,8 @@ def scan_for_tests(src_dir, config, requirements, content):
         makefile_path = os.path.join(src_dir, "meson.build")
         if not os.path.isfile(makefile_path):
             return
-        for dirpath, _, files in os.walk(src_dir):
+        walk = tree.walk if tree else os.walk
+        for dirpath, _, files in walk(src_dir):
             for f in files:
                 if f == "meson.build":
                     with util.open_auto(os.path.join(dirpath, f)) as fp:
@@ -31,6 +31,8 @@ import shutil
 
 import check
 import license
+import logpatterns
+import patternindex
 from util import call, print_warning, print_fatal, write_out
 from util import open_auto
 
@@ -50,19 +52,9 @@ def read_pattern_conf(filename, dest, list_format=False, path=None):
         file_path = [file_repo_path, file_conf_path]
     else:
         file_path = [file_repo_path]
+    index = patternindex.get_index()
     for fpath in file_path:
-        with open(fpath, "r") as patfile:
-            for line in patfile:
-                if line.startswith("#"):
-                    continue
-                # Make list format a dict for faster lookup times
-                if list_format:
-                    dest[line.strip()] = True
-                    continue
-                # split from the right a maximum of one time, since the pattern
-                # string might contain ", "
-                pattern, package = line.rsplit(", ", 1)
-                dest[pattern] = package.rstrip()
+        dest.update(index.patterns(fpath, list_format))
 
 
 class Config(object):
@@ -420,6 +412,19 @@ class Config(object):
         self.failed_exit_pats = [(r"overwriting an existing profile", 0, None),
                                  (r"\[-Wmissing-profile\]", 0, None),
                                  (r"\[-Wcoverage-mismatch\]", 0, None)]
+        self.compile_log_patterns()
+
+    def compile_log_patterns(self):
+        """Compile the build.log patterns once into a prefiltered matcher.
+
+        Call again after modifying any of the *_pats lists.
+        """
+        self.log_patterns = logpatterns.PatternMatcher([
+            ("pkgconfig", self.pkgconfig_pats),
+            ("simple", self.simple_pats),
+            ("failed", self.failed_pats),
+            ("failed_exit", self.failed_exit_pats),
+        ])
 
     def set_build_pattern(self, pattern, strength):
         """Set the global default pattern and pattern strength."""
@@ -810,6 +815,7 @@ class Config(object):
         read_pattern_conf("license_blacklist", self.license_blacklist, list_format=True, path=path)
         read_pattern_conf("qt_modules", self.qt_modules, path=path)
         read_pattern_conf("cmake_modules", self.cmake_modules, path=path)
+        patternindex.get_index().save()
 
     def parse_existing_spec(self, name):
         """Determine the old version, old patch list, old keyid, and cves from old spec file."""
@@ -1095,7 +1101,7 @@ class Config(object):
         content = self.read_conf_file(os.path.join(self.download_path, "excludes"))
         for exclude in content:
             print("%%exclude for: %s" % exclude)
-        filemanager.excludes += content
+        filemanager.excludes.update(content)
 
         content = self.read_conf_file(os.path.join(self.download_path, "setuid"))
         for suid in content:
@@ -17,1377 +17,986 @@
 #
 
 import argparse
+import codecs
+import collections
+import copy
+import os
 import re
-import util
+from concurrent.futures import ProcessPoolExecutor
 
-testcount = {}
-testpass = {}
-testfail = {}
-testxfail = {}
-testskip = {}
+import logpatterns
+import logreader
 
-total_tests = 0
-total_tests = 0
-total_pass = 0
-total_fail = 0
-total_xfail = 0
-total_skip = 0
 
-counted_tests = 0
-counted_pass = 0
-counted_fail = 0
-counted_xfail = 0
-counted_skip = 0
+def convert_int(intstr):
+    """Integer conversion wrapper."""
+    try:
+        return int(intstr)
+    except ValueError:
+        return 0
 
-name = ''
 
+# Meson summary lines: (number of fields, pattern, counter)
+MESON_RULES = [
+    (2, re.compile(r'^ok:', flags=re.I), "total_pass"),
+    (2, re.compile(r'^fail:', flags=re.I), "total_fail"),
+    (2, re.compile(r'^skip(ped)?:', flags=re.I), "total_skip"),
+    # Count timeouts as failures.
+    (2, re.compile(r'^timeout:', flags=re.I), "total_fail"),
+    (3, re.compile(r'^expected fail:', flags=re.I), "total_xfail"),
+]
+
+
+ZERO_LINES = ["Executing(%check)",
+              "+ make check",
+              "##### Testing packages."]
+
+XTEST_RE = re.compile(r"CLR-XTEST: Package: (.*)")
+
+Rule = collections.namedtuple("Rule", ["group", "literal", "regex", "add", "assign", "incheck", "detect"])
+
+
+def rule(group, pattern, add=None, tally=(), assign=None, incheck=True, literal=None, detect=None):
+    """Return one entry of the rule table.
+
+    group names the test suite format the line belongs to. When pattern
+    matches, each counter in add is increased by its term, then each counter
+    in tally by one, then each counter in assign is set to its term. A term
+    is a group number of the match, or a function of g, where g(n) is the
+    number captured by group n. Unless incheck is False the rule only
+    applies within %check. literal is a substring every matching line has,
+    found from the pattern when not given. g.counter is the TestCounter
+    counting the line. With detect True or False the rule only applies when
+    format detection is on or off.
+    """
+    if isinstance(tally, str):
+        tally = (tally,)
+    add = list((add or {}).items()) + [(counter, lambda g: 1) for counter in tally]
+    return Rule(group, literal or logpatterns.required_literal(pattern), re.compile(pattern),
+                tuple(add), tuple((assign or {}).items()), incheck, detect)
+
+
+# The rule table, in the order rules are tried: the first rule matching a
+# line counts it.
+RULES = [
+    # ACL package
+    # [22] $ rm -Rf d -- ok-
+    # 17 commands (17 passed, 0 failed)-
+    rule("acl", r"\[[0-9]+\].*\-\- ok", tally="counted_pass", incheck=False),
+    rule("acl", r"[0-9]+ commands \(([0-9]+) passed, ([0-9]+) failed\)",
+         {"total_pass": 1, "total_fail": 2}, incheck=False),
+
+    # alembic package
+    # Ran 678 tests in 5.175s
+    # OK (SKIP=15)
+    rule("unittest", r"Ran ([0-9]+) tests? in", {"total_tests": 1}, incheck=False),
+    rule("unittest", r"OK \(SKIP=([0-9]+)\)", {"total_skip": 1}, incheck=False),
+    rule("unittest", r"OK \(skipped=([0-9]+)\)", {"total_skip": 1}, incheck=False),
+
+    # anyjson
+    # test_implementations.test_default_serialization ... ok
+    # note: configure false positive
+    rule("unittest", r"\.\.\. ok$", tally="counted_pass"),
+    rule("unittest", r"\.\.\. skipped$", tally="counted_skip"),
+
+    # apr
+    # testatomic          :  SUCCESS
+    rule("apr", r":  SUCCESS$", tally="counted_pass"),
+
+    # cryptography
+    # ================= 76230 passed, 267 skipped in 140.23 seconds ==================
+    # ================== 47 passed, 2 error in 10.36 seconds =========================
+    # ================ 10 failed, 16 passed, 4 error in 0.16 seconds =================
+    # ========================== 43 passed in 2.90 seconds ===========================
+    # ======= 28 failed, 281 passed, 13 skipped, 10 warnings in 28.48 seconds ========
+    # ===================== 5 failed, 318 passed in 1.06 seconds =====================
+    # ============= 1628 passed, 72 skipped, 4 xfailed in 146.26 seconds =============
+    # =============== 119 passed, 2 skipped, 54 error in 2.19 seconds ================
+    # ========== 1 failed, 74 passed, 10 skipped, 55 error in 2.05 seconds ===========
+    # ==================== 68 passed, 1 warnings in 0.12 seconds =====================
+    # ================ 3 failed, 250 passed, 3 error in 3.28 seconds =================
+    # =============== 1 failed, 407 passed, 10 skipped in 4.71 seconds ===============
+    # ========================== 1 skipped in 0.79 seconds ===========================
+    # =========================== 3 error in 0.41 seconds ============================
+    # ================= 68 passed, 1 pytest-warnings in 0.09 seconds =================
+    # ===== 21 failed, 73 passed, 5 skipped, 2 pytest-warnings in 34.81 seconds ======
+    rule("pytest", r"== ([0-9]+) passed, ([0-9]+) skipped in ",
+         {"total_pass": 1, "total_skip": 2}),
+    rule("pytest", r"== ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) xfailed in ",
+         {"total_pass": 1, "total_skip": 2, "total_xfail": 3}),
+    rule("pytest", r"== ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) error in ",
+         {"total_pass": 1, "total_skip": 2, "total_fail": 3}),
+    rule("pytest", r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) error in ",
+         {"total_pass": 2, "total_skip": 3, "total_fail": lambda g: g(4) + g(1)}),
+    rule("pytest", r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) error in ",
+         {"total_pass": 2, "total_fail": lambda g: g(3) + g(1)}),
+    rule("pytest", r"== ([0-9]+) passed, ([0-9]+) error in ",
+         {"total_pass": 1, "total_fail": 2}),
+    rule("pytest", r"== ([0-9]+) passed, ([0-9]+) warnings in ",
+         {"total_pass": 1, "total_fail": 2}),
+    rule("pytest", r"== ([0-9]+) failed, ([0-9]+) passed in ",
+         {"total_pass": 2, "total_fail": 1}),
+    rule("pytest", r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) xfailed in ",
+         {"total_pass": 2, "total_fail": 1, "total_xfail": 3}),
+    rule("pytest", r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) warnings in ",
+         {"total_pass": 2, "total_fail": lambda g: g(1) + g(4), "total_skip": 3}),
+    rule("pytest", r"== ([0-9]+) passed in [0-9\.]+ seconds ====", {"total_pass": 1}),
+    rule("pytest", r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) skipped in [0-9\.]+ seconds ====",
+         {"total_pass": 2, "total_fail": 1, "total_skip": 3}),
+    rule("pytest", r"== ([0-9]+) skipped in [0-9\.]+ seconds ====", {"total_skip": 1}),
+    rule("pytest", r"== ([0-9]+) error in [0-9\.]+ seconds ====", {"total_fail": 1}),
+    rule("pytest", r"== ([0-9]+) passed\, [0-9]+ [A-Za-z0-9]+\-warnings? in [0-9\.]+ seconds ====",
+         {"total_pass": 1}),
+    # ===== 21 failed, 73 passed, 5 skipped, 2 pytest-warnings in 34.81 seconds ======
+    rule("pytest", r"== ([0-9]+) failed\, ([0-9]+) passed\, ([0-9]+) skipped\, [0-9]+ [A-Za-z0-9]+\-warnings? in [0-9\.]+ seconds ====",
+         {"total_fail": 1, "total_pass": 2, "total_skip": 3}),
+
+    # mercurial
+    # running 59 tests using 8 parallel processes
+    # # Ran 55 tests, 4 skipped, 0 failed.
+    rule("mercurial", r"^# Ran ([0-9]+) tests\, ([0-9]+) skipped\, ([0-9]+) failed.",
+         {"total_fail": 3, "total_skip": 2, "total_pass": lambda g: g(1) - g(2) - g(3)}),
+
+    # swift
+    # ========= 1 failed, 1287 passed, 1 warnings, 62 error in 35.77 seconds =========
+    rule("pytest", r"== ([0-9]+) failed\, ([0-9]+) passed\, ([0-9]+) warnings\, ([0-9]+) error in ",
+         {"total_fail": lambda g: g(1) + g(3) + g(4), "total_pass": 2}),
+
+    # swift
+    # 487 failed, 4114 passed, 32 skipped, 1 pytest-warnings, 34 error in 222.82 seconds
+    rule("pytest", r"\s*([0-9]+) failed, ([0-9]+) passed, ([0-9]+) skipped, [0-9]+ [A-Za-z0-9]+\-warnings?, ([0-9]+) error in ",
+         {"total_fail": lambda g: g(1) + g(4), "total_pass": 2, "total_skip": 3}),
+
+    # tox
+    # ======== 199 passed, 38 skipped, 1 xpassed, 1 warnings in 5.76 seconds =========
+    rule("pytest", r"== ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) xpassed, ([0-9]) warnings in ",
+         {"total_pass": 1, "total_skip": 2, "total_xfail": 3, "total_fail": 4}),
+
+    # augeas
+    # TOTAL: 215
+    # PASS:  212
+    # SKIP:  3
+    # XFAIL: 0
+    # FAIL:  0
+    # XPASS: 0
+    # ERROR: 0
+    rule("automake", r"# TOTAL: +([0-9]+)", {"total_tests": 1}),
+    rule("automake", r"# PASS: +([0-9]+)", {"total_pass": 1}),
+    rule("automake", r"# SKIP: +([0-9]+)", {"total_skip": 1}),
+    rule("automake", r"# FAIL: +([0-9]+)", {"total_fail": 1}),
+    rule("automake", r"# XFAIL: +([0-9]+)", {"total_xfail": 1}),
+    rule("automake", r"# XPASS: +([0-9]+)", {"total_pass": 1}),
+
+    # autoconf
+    # 493 tests behaved as expected.
+    # 10 tests were skipped.
+    # 495: AC_FUNC_STRNLEN                                 ok
+    # 344: Erlang                                          skipped (erlang.at:30)
+    # 26: autoupdating macros recursively                 expected failure (tools.at:945)
+    rule("autotest", r"^([0-9]+) tests behaved as expected", {"total_pass": 1}),
+    rule("autotest", r"^([0-9]+) tests were skipped", {"total_skip": 1}),
+    rule("autotest", r"^[0-9]+\:.*ok$", tally="counted_pass", literal="ok"),
+    rule("autotest", r"^[0-9]+\:.*skipped \(", tally="counted_skip"),
+    rule("autotest", r"^[0-9]+\:.*expected failure \(", tally="counted_xfail"),
+
+    # bison
+    # 470 tests were successful.
+    rule("autotest", r"^([0-9]+) tests were successful", {"total_pass": 1}),
+
+    # binutils
+    # of expected passes            1144
+    # of expected failures          57
+    # of untested testcases         1
+    # of unsupported tests          12
+    rule("dejagnu", r"^# of expected passes.*\t([0-9]+)", {"total_pass": 1}),
+    rule("dejagnu", r"^# of expected failures.*\t([0-9]+)", {"total_xfail": 1}),
+    rule("dejagnu", r"^# of unexpected failures.*\t([0-9]+)", {"total_fail": 1}),
+    rule("dejagnu", r"^# of unsupported tests.*\t([0-9]+)", {"total_skip": 1}),
+
+    # ccache
+    # PASSED: 448 assertions, 88 tests, 10 suites
+    rule("ccache", r"PASSED: [0-9]+ assertions, ([0-9]+) tests, [0-9]+ suites", {"total_pass": 1}),
+
+    # rubygem-rack
+    # 701 tests, 2292 assertions, 0 failures, 0 errors
+    rule("ruby", r"([0-9]+) tests, [0-9]+ assertions, ([0-9]+) failures, ([0-9])+ errors",
+         {"total_pass": 1, "total_fail": lambda g: g(2) + g(3)}),
+
+    # curl
+    # TESTDONE: 686 tests out of 686 reported OK: 100%
+    rule("curl", r"TESTDONE: ([0-9]+) tests out of ([0-9]+) reported OK: ",
+         {"total_tests": 2, "total_pass": 1}, assign={"total_fail": lambda g: g(2) - g(1)}),
+
+    # gcc
+    # All 4 tests passed
+    # PASS: test-strtol-16.
+    rule("automake", r"All ([0-9]+) tests passed", {"total_tests": 1, "total_pass": 1}),
+    rule("automake", r"^PASS\: [A-Za-z]+", tally="counted_pass"),
+    rule("automake", r"^FAIL\: [A-Za-z]+", tally="counted_fail"),
+
+    # gdbm
+    # All 22 tests were successful.
+    rule("autotest", r"All ([0-9]+) tests were successful.", {"total_tests": 1, "total_pass": 1}),
+
+    # glibc
+    # 3 FAIL
+    # 2182 PASS
+    # 1 UNRESOLVED
+    # 199 XFAIL
+    # 3 XPASS
+    rule("glibc", r"^\s*([0-9]+) FAIL$", {"total_fail": 1}, literal=" FAIL"),
+    rule("glibc", r"^\s*([0-9]+) PASS$", {"total_pass": 1}, literal=" PASS"),
+    rule("glibc", r"^\s*([0-9]+) XFAIL$", {"total_xfail": 1}),
+    rule("glibc", r"^\s*([0-9]+) XPASS$", {"total_pass": 1}),
+
+    # libxml2
+    # Total 2908 tests, no errors
+    # Total: 1171 functions, 291083 tests, 0 errors
+    rule("libxml2", r"Total ([0-9]+) tests, no errors", {"total_pass": 1}),
+    rule("libxml2", r"Total: ([0-9]+) functions, ([0-9]+) tests, 0 errors", {"total_pass": 1}),
+
+    # zlib
+    # *** zlib shared test OK ***
+    rule("zlib", r"\*\*\* .* test OK \*\*\*", tally="counted_pass"),
+
+    # e2fsprogs
+    # 153 tests succeeded     0 tests failed
+    rule("e2fsprogs", r"([0-9]+) tests succeeded\s*([0-9]+) tests failed",
+         {"total_pass": 1, "total_fail": 2}),
+
+    # expect
+    # all.tcl:        Total   29      Passed  29      Skipped 0       Failed  0
+    rule("tcl", r".*:\s*Total\s+([0-9]+)\s+Passed\s+([0-9]+)\s+Skipped\s+([0-9]+)\s+Failed\s+([0-9]+)",
+         {"total_tests": 1, "total_pass": 2, "total_skip": 3, "total_fail": 4}, literal="Passed"),
+
+    # expat
+    # 100%: Checks: 50, Failed: 0
+    rule("check", r"[0-9]+%: Checks: ([0-9]+), Failed: ([0-9]+)",
+         {"total_pass": lambda g: g(1) - g(2), "total_fail": 2}),
+
+    # flex
+    # Tests succeeded: 47
+    # Tests FAILED: 0
+    rule("flex", r"^Tests succeeded: ([0-9]+)", {"total_pass": 1}),
+    rule("flex", r"^Tests FAILED: ([0-9]+)", {"total_fail": 1}),
+
+    # this one catches the generic TAP format!
+    #  perl-Capture-tiny
+    # ok 580 - tee_merged|sys|stderr|short - got STDERR
+    rule("tap", r"^ok [0-9]+ \-", tally="counted_pass", literal="ok "),
+    rule("tap", r"^not ok [0-9]+ \-.*# TODO\b", tally="counted_xfail"),
+    rule("tap", r"^not ok [0-9]+ \-", tally="counted_fail"),
+    rule("tap", r"^ok [0-9]+$", tally="counted_pass", literal="ok "),
+    rule("tap", r"^not ok [0-9]+$", tally="counted_fail"),
+
+    # tcpdump
+    #    0 tests failed
+    # 154 tests passed
+    rule("tcpdump", r"^\s*([0-9]+) tests? failed$", {"total_fail": 1}, literal=" failed"),
+    rule("tcpdump", r"^\s*([0-9]+) tests? passed$", {"total_pass": 1}, literal=" passed"),
+
+    # R packages
+    # * checking top-level files ... OK
+    rule("r", r"\* .* \.\.\. OK", tally="counted_pass"),
+    rule("r", r"\* .* \.\.\. PASSED\.", tally="counted_pass"),
+    rule("r", r"\* .* \.\.\. SKIPPED", tally="counted_skip"),
+
+    # python
+    # 365 tests OK.
+    # 22 tests skipped:
+    rule("regrtest", r"^([0-9]+) tests skipped:$", {"total_skip": 1}),
+    rule("regrtest", r"^([0-9]+) tests OK.$", {"total_pass": 1}),
+
+    # jemalloc
+    # Test suite summary: pass: 30/33, skip: 3/33, fail: 0/33
+    rule("jemalloc", r"Test suite summary: pass: ([0-9]+)\/([0-9]+), skip: ([0-9]+)\/([0-9]+), fail: ([0-9]+)\/([0-9]+)",
+         {"total_pass": 1, "total_tests": 2, "total_skip": 3, "total_fail": 5}),
+
+    # util-linux
+    #   All 160 tests PASSED
+    rule("util-linux", r"  All ([0-9]+) tests PASSED$", {"total_pass": 1}),
+
+    # nss
+    # cert.sh: #101: Import chain-2-serverCA-ec CA -t u,u,u for localhost.localdomain (ext.)  - PASSED
+    # Passed:             13036
+    # Failed:             6
+    # Failed with core:   0
+    # Unknown status:     0
+    rule("nss", r"^[a-z]+.sh: #[0-9]+: .*  - PASSED$", tally="counted_pass"),
+    rule("nss", r"^[a-z]+.sh: #[0-9]+: .*  - FAILED$", tally="counted_fail"),
+    rule("nss", r"^Passed:\s+([0-9]+)$", {"total_pass": 1}),
+    rule("nss", r"^Failed:\s+([0-9]+)$", {"total_fail": 1}),
+    rule("nss", r"^Failed with core:\s+([0-9]+)$", {"total_fail": 1}),
+
+    # rsync
+    #      34 passed
+    #      5 skipped
+    rule("rsync", r"^\s+([0-9]+) passed$", {"total_pass": 1}, literal=" passed"),
+    rule("rsync", r"^\s+([0-9]+) skipped$", {"total_skip": 1}, literal=" skipped"),
+
+    # mariadb
+    # 100% tests passed, 0 tests failed out of 53
+    rule("ctest", r"tests passed, ([0-9]+) tests failed out of ([0-9]+)",
+         {"total_fail": 1, "total_tests": 2, "total_pass": lambda g: g(2) - g(1)}),
+
+    # python-runtime-tests
+    # FAILED (KNOWNFAIL=6, SKIP=18, errors=6)
+    # FAILED (failures=1)
+    # FAILED (failures=1, errors=499, skipped=48)
+    # OK (KNOWNFAIL=5, SKIP=15)
+    rule("unittest", r"FAILED \(KNOWNFAIL=([0-9]+), SKIP=([0-9]+), errors=([0-9]+)\)",
+         {"total_xfail": 1, "total_skip": 2, "total_fail": 3}),
+    rule("unittest", r"FAILED \(failures=([0-9]+), errors=([0-9]+), skipped=([0-9]+)\)",
+         {"total_xfail": 2, "total_skip": 3, "total_fail": 1}),
+    rule("unittest", r"FAILED \(failures=([0-9]+), errors=([0-9]+)\)",
+         {"total_xfail": 2, "total_fail": 1}),
+    rule("unittest", r"FAILED \(failures=([0-9]+)\)", {"total_fail": 1}),
+    rule("unittest", r"FAILED \(errors=([0-9]+)\)", {"total_xfail": 1}),
+    rule("unittest", r"OK \(KNOWNFAIL=([0-9]+), SKIP=([0-9]+)\)",
+         {"total_xfail": 1, "total_skip": 2}),
+
+    # qpid-python
+    # Totals: 318 tests, 200 passed, 112 skipped, 0 ignored, 6 failed
+    rule("qpid", r"Totals: ([0-9]+) tests, ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) ignored, ([0-9]+) failed",
+         {"total_tests": 1, "total_pass": 2, "total_skip": 3, "total_xfail": 4, "total_fail": 5}),
+
+    # PyYAML
+    # TESTS: 2577
+    rule("pyyaml", r"^TESTS: ([0-9]+)$", {"total_tests": 1}),
+
+    # sudo
+    # visudo: 7/7 tests passed; 0/7 tests failed
+    # check_symbols: 7 tests run, 0 errors, 100% success rate
+    rule("sudo", r"[a-z_]+\:\s+([0-9]+)\/[0-9]+ tests passed; ([0-9]+)\/[0-9]+ tests failed",
+         {"total_pass": 1, "total_fail": 2}),
+    rule("sudo", r"[a-z_]+\: ([0-9]+) tests run, ([0-9]+) errors",
+         {"total_tests": 1, "total_fail": 2, "total_pass": lambda g: g(1) - g(2)}),
+
+    # R
+    # running code in 'reg-examples1.R' ... OK
+    # Status: 1 ERROR, 1 WARNING, 4 NOTEs
+    # OK: 749 SKIPPED: 4 FAILED: 2
+    rule("r", r"running code in '.*\.R' \.\.. OK", tally="counted_pass"),
+    rule("r", r"Status: ([0-9]+) ERROR, ([0-9]+) WARNING, ([0-9]+) NOTEs", {"total_fail": 1}),
+    rule("r", r"OK: ([0-9]+) SKIPPED: ([0-9]+) FAILED: ([0-9]+)",
+         {"total_pass": 1, "total_fail": 3, "total_skip": 2}),
+
+    # onig
+    # OK: // 'a'
+    rule("onig", r"^OK\: ", tally="counted_pass", literal="OK: "),
+
+    # php
+    # Number of tests : 13526              9794
+    # Tests skipped   : 3732 ( 27.6%) --------
+    # Tests warned    :    0 (  0.0%) (  0.0%)
+    # Tests failed    :   12 (  0.1%) (  0.1%)
+    # Expected fail   :   31 (  0.2%) (  0.3%)
+    # Tests passed    : 9751 ( 72.1%) ( 99.6%)
+    rule("php", r"^Number of tests : ([0-9]+)", {"total_tests": 1}),
+    rule("php", r"^Tests skipped   :\s+([0-9]+) \(", {"total_skip": 1}),
+    rule("php", r"^Tests failed    :\s+([0-9]+) \(", {"total_fail": 1}),
+    rule("php", r"^Expected fail   :\s+([0-9]+) \(", {"total_xfail": 1}),
+    rule("php", r"^Tests passed    :\s+([0-9]+) \(", {"total_pass": 1}),
+
+    # rubygem / rake
+    # 174 runs, 469 assertions, 0 failures, 0 errors, 0 skips
+    rule("ruby", r"([0-9]+) runs, ([0-9]+) assertions, ([0-9]+) failures, ([0-9]+) errors, ([0-9]+) skips",
+         {"total_tests": 1, "total_fail": 3, "total_skip": 5}),
+
+    # cryptsetup
+    #  [OK]
+    rule("cryptsetup", r" \[OK\]$", tally="counted_pass"),
+
+    # lzo
+    #  test passed.
+    rule("lzo", r" test passed.$", tally="counted_pass"),
+
+    # lsof
+    # LTnlink ... OK
+    # LTnfs ... ERROR!!!
+    rule("lsof", r"^LT[a-zA-Z0-9]+ \.\.\. OK$", tally="counted_pass"),
+    rule("lsof", r"^LT[a-zA-Z0-9]+ \.\.\. ERROR\!\!\!", tally="counted_fail"),
+
+    # libaio
+    # Pass: 11  Fail: 1
+    rule("libaio", r"^Pass: ([0-9]+)  Fail: ([0-9]+)$", {"total_pass": 1, "total_fail": 2}),
+
+    # gawk
+    rule("gawk", r"^ALL TESTS PASSED$", tally="total_pass"),
+
+    # gptfdisk
+    # **SUCCESS** ...
+    rule("gptfdisk", r"^\*\*SUCCESS\*\*", tally="counted_pass"),
+
+    # boost
+    # **passed** ...
+    # 8 errors detected.
+    rule("boost", r"^\*\*passed\*\*", tally="counted_pass"),
+    rule("boost", r"([0-9]+) errors? detected\.?", {"total_fail": 1}, literal=" error"),
+    rule("boost", r"([0-9]+) failures? detected\.?", {"total_fail": 1}, literal=" failure"),
+
+    # make
+    # 534 Tests in 118 Categories Complete ... No Failures
+    rule("make", r"([0-9]+) Tests in ([0-9]+) Categories Complete ... No Failures",
+         {"total_tests": 1, "total_pass": 1}),
+
+    # icu4c ---[OK]
+    rule("icu", r"---\[OK\]", tally="counted_pass"),
+
+    # libxslt
+    # Pass 1
+    rule("libxslt", r"^Pass [0-9]+$", tally="counted_pass", literal="Pass "),
+
+    # bash
+    # < Failed 126 of 1378 Unicode tests
+    rule("bash", r"^[<,>] Failed ([0-9]+) of ([0-9]+)", {"total_fail": 1, "total_tests": 2}),
+
+    # crudini
+    # Test 95 OK (line 460)
+    rule("crudini", r"^Test [0-9]+ OK", tally="counted_pass"),
+    rule("crudini", r"^Test [0-9]+ (?!^OK)[A-Z]+", tally="counted_fail"),
+
+    # discount
+    # Reddit-style automatic links ......................... OK
+    rule("discount", r"[A-Za-z\-\s]+ \.\.\.+ (OK|GOOD)$", tally="counted_pass"),
+    rule("discount", r"[A-Za-z\-\s]+ \.\.\.+ (?!^OK)[A-Z]+$", tally="counted_fail"),
+
+    # libjpeg-turbo
+    # JPEG -> RGB Top-Down  2/1 ... Passed.
+    # JPEG -> RGB Top-Down  15/8 ... Passed.
+    # JPEG -> RGB Top-Down  7/4 ... Passed.
+    rule("libjpeg-turbo", r"[A-Za-z0-9\ \>\<\/]+ \.\.\. Passed\.", tally="counted_pass"),
+
+    # LVM2
+    # valgrind pool awareness ... fail
+    # dfa matching ... fail
+    # dfa with non-print regex chars ... pass
+    # bitset iteration ... pass
+    rule("lvm2", r"[a-z\ ]+\ \.\.\.\ pass", tally="counted_pass"),
+    rule("lvm2", r"[a-z\ ]+\ \.\.\.\ fail", tally="counted_fail"),
+
+    # keyring
+    #  76 passed, 62 skipped, 50 xfailed, 14 xpassed, 2 warnings, 32 error in 2.13 seconds
+    rule("pytest", r"([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) xfailed, ([0-9]+) xpassed, ([0-9]+) warnings, ([0-9]+) error in [0-9\.]+ seconds",
+         {"total_pass": lambda g: g(1) + g(4), "total_skip": 2, "total_xfail": 3,
+          "total_fail": lambda g: g(5) + g(6)}),
+
+    # openblas
+    #  Real BLAS Test Program Results
+    #  Test of subprogram number  1             SDOT
+    #                                     ----- PASS -----
+    #  Test of subprogram number  2            SAXPY
+    #                                     ----- PASS -----
+    rule("openblas", r"\ \ +\-\-\-+\ PASS\ \-\-\-+", tally="counted_pass"),
+    rule("openblas", r"\ \ +\-\-\-+\ FAIL\ \-\-\-+", tally="counted_fail"),
+
+    # rubygem-hashie
+    # Finished in 0.07221 seconds (files took 0.28356 seconds to load)
+    # 545 examples, 0 failures, 1 pending
+    rule("rspec", r"([0-9]+) examples?, ([0-9]+) failures?, ([0-9]+) pending",
+         {"total_pass": 1, "total_fail": 2, "total_skip": 3}, literal=" example"),
+
+    # rubygem-warden
+    # Finished in 0.08928 seconds (files took 0.1046 seconds to load)
+    # 215 examples, 14 failures
+    rule("rspec", r"([0-9]+) examples?, ([0-9]+) failures?", {"total_pass": 1, "total_fail": 2},
+         literal=" example"),
+
+    # rubygem-ansi
+    # Executed 12 tests with 7 passing, 5 errors.
+    rule("ruby", r"Executed ([0-9]+) tests with ([0-9+]) passing, ([0-9]+) errors\.",
+         {"total_tests": 1, "total_pass": 2, "total_fail": 3}),
+
+    # vim
+    # Executed 9 tests
+    rule("vim", r"Executed ([0-9]+) tests$", {"total_tests": 1}),
+
+    # rubygem-formatador
+    #   9 succeeded in 0.00375661 seconds
+    rule("ruby", r"([0-9]+) succeeded in [0-9]+\.[0-9]+ seconds", {"total_pass": 1}),
+
+    # ./pigz -kf pigz.c ; ./pigz -t pigz.c.gz
+    # ./pigz -kfb 32 pigz.c ; ./pigz -t pigz.c.gz
+    rule("pigz", r".*\.\/pigz.+(\.\/pigz).+", {"total_pass": lambda g: 2}, literal="./pigz"),
+    rule("pigz", r".*\.\/pigz.+", tally="total_pass", literal="./pigz"),
+
+    # netifaces
+    # Interface lo:
+    # Interface enp2s0:
+    rule("netifaces", r"^Interface [a-zA-Z0-9]+\:", tally="total_pass"),
+
+    # btrfs-progs
+    # [TEST]   001-bad-file-extent-bytenr
+    # [NOTRUN] Need to validate root privileges
+    # test failed for case
+    rule("btrfs-progs", r"    \[TEST\]   .*", tally="total_pass"),
+    rule("btrfs-progs", r"test failed for case.*", tally="total_fail",
+         assign={"total_pass": lambda g: max(0, g.counter.total_pass - 1)}),
+    rule("btrfs-progs", r"    \[NOTRUN\] .*", tally="total_skip"),
+
+    # chrpath
+    # success: chrpath changed rpath to larger path.
+    # error: chrpath unable to change rpath to larger path.
+    rule("chrpath", r"success\: chrpath .*", tally="total_pass"),
+    rule("chrpath", r"error: chrpath .*", tally="total_fail"),
+    rule("chrpath", r"warning: chrpath .*", tally="total_fail"),
+
+    # yajl
+    # 58/58 tests successful
+    rule("yajl", r"([0-9]+)\/([0-9]+) tests successful", {"total_pass": 1, "total_tests": 2}),
+
+    # xmlsec1
+    #     Checking required transforms                            OK
+    #     Verify existing signature                             Fail
+    #     Checking required transforms                          Skip
+    #     Checking required key data                               OK
+    rule("xmlsec1", r"^    [\w ]+\ +OK$", tally="total_pass", literal=" OK"),
+    rule("xmlsec1", r"^    [\w ]+\ +Fail$", tally="total_fail", literal=" Fail"),
+    rule("xmlsec1", r"^    [\w ]+\ +Skip$", tally="total_skip", literal=" Skip"),
+
+    # xdg-utils
+    # TOTAL: 4 tests failed, 90 of 116 tests passed. (140 attempted)
+    rule("xdg-utils", r"TOTAL\: ([0-9]+) tests? failed\, ([0-9]+) of [0-9]+ tests? passed\. \(([0-9]+) attempted\)",
+         {"total_fail": 1, "total_pass": 2, "total_skip": lambda g: g(3) - (g(2) + g(1))}),
+
+    # slang
+    # Testing argv processing ...Ok
+    # ./utf8.sl:14:check_sprintf:Test Error
+    rule("slang", r"^Testing [\w ]+\.\.\.Ok$", tally="total_pass"),
+    rule("slang", r":Test Error", tally="total_fail"),
+
+    # go & golang
+    # ok  	golang.org/x/text/encoding/htmlindex	0.002s
+    # --- FAIL: TestParents (0.00s)
+    # FAIL	golang.org/x/text/internal	0.002s
+    # --- PASS: TestApp_Command (0.00s)
+    rule("go", r"^ok\s+[\w_]+[A-Za-z0-9\.\?_\-]*", tally=("total_tests", "total_pass"), literal="ok"),
+    rule("go", r"(---\s+)?(?<!X)FAIL:?\s*", tally=("total_tests", "total_fail"), literal="FAIL", detect=False),
+    # the above also matches lines of other formats, which would make a
+    # section look like go to the detection
+    rule("go", r"^\s*---\s+FAIL:|^FAIL\s", tally=("total_tests", "total_fail"), literal="FAIL", detect=True),
+    rule("go", r"---\s+PASS|PASS\s+ ", tally=("total_tests", "total_pass"), literal="PASS"),
+
+    # valgrind
+    # == 5 tests, 0 stderr failures, 1 stdout failure, 0 stderrB failures, 0 stdoutB failures, 0 post failures ==
+    # == 55 tests, 48 stderr failures, 6 stdout failures, 0 stderrB failures, 0 stdoutB failures, 0 post failures ==
+    rule("valgrind", r"\=\= ([0-9]+) tests?\, ([0-9]+) stderr failures?\, ([0-9]+) stdout failures?\, "
+         r"([0-9]+) stderrB failures?\, ([0-9]+) stdoutB failures?\, ([0-9]+) post failures? \=\=",
+         {"total_tests": 1, "total_fail": lambda g: g(2) + g(3) + g(4) + g(5) + g(6),
+          "total_pass": lambda g: g(1) - (g(2) + g(3) + g(4) + g(5) + g(6))}),
+
+    # zsh
+    # **************************************
+    # 46 successful test scripts, 0 failures, 1 skipped
+    # **************************************
+    rule("zsh", r"([0-9]+) successful test scripts\, ([0-9]+) failures\, ([0-9]+) skipped",
+         {"total_pass": 1, "total_fail": 2, "total_skip": 3}),
+
+    # glog
+    # Passed 3 tests
+    rule("glog", r"Passed ([0-9]+) tests", {"total_pass": 1}, literal="Passed "),
+
+    # hdf5
+    # Testing h5repack h5repack_szip.h5 -f dset_szip:GZIP=1                  -SKIP-
+    # Verifying h5dump output -f GZIP=1 -m 1024                             *FAILED*
+    # Testing h5repack --metadata_block_size=8192                            PASSED
+    # Verifying h5diff output h5repack_layout.h5 out-meta_long.h5repack_layo PASSED
+    rule("hdf5", r"^Testing .+\ +PASSED$", tally="total_pass", literal=" PASSED"),
+    rule("hdf5", r"^Verifying .+\ +PASSED$", tally="total_pass", literal=" PASSED"),
+    rule("hdf5", r"^Testing .+\ +\-SKIP\-$", tally="total_skip", literal=" -SKIP-"),
+    rule("hdf5", r"^Verifying .+\ +\-SKIP\-$", tally="total_skip", literal=" -SKIP-"),
+    # without detection the go FAIL rule counts these
+    rule("hdf5", r"^Testing .+\ +\*FAILED\*$", tally=("total_tests", "total_fail"), literal=" *FAILED*", detect=True),
+    rule("hdf5", r"^Verifying .+\ +\*FAILED\*$", tally=("total_tests", "total_fail"), literal=" *FAILED*", detect=True),
+
+    # libconfig
+    # 3 tests; 3 passed, 0 failed
+    rule("libconfig", r"^([0-9]+) tests; ([0-9]+) passed\, ([0-9]+) failed",
+         assign={"total_tests": 1, "total_pass": 2, "total_fail": 3}),
+
+    # libogg
+    # testing page spill expansion... 0, (0),  granule:0 1, (1),  granule:4103 2, (2),  granule:5127 ok.
+    # testing max packet segments... 0, (0),  granule:0 1, (1),  granule:261127 2, (2),  granule:262151 ok.
+    # Testing search for capture... ok.
+    # Testing recapture... ok.
+    rule("libogg", r"^[T,t]esting .*\ ok\.$", tally="counted_pass", literal=" ok."),
+
+    # libvorbis
+    #     vorbis_1ch_q-0.5_44100.ogg : ok
+    #     vorbis_2ch_q-0.5_44100.ogg : ok
+    #     ...
+    #     vorbis_8ch_q-0.5_44100.ogg : ok
+    rule("libvorbis", r"^\ \ \ \ vorbis_.*\.ogg\ \:\ ok$", tally="counted_pass", literal=".ogg : ok"),
+
+    # pth
+    # OK - ALL TESTS SUCCESSFULLY PASSED.
+    rule("pth", r"^OK\ \-\ ALL\ TESTS\ SUCCESSFULLY\ PASSED\.$", tally="counted_pass"),
+]
+
+# With detection on, a section of a log whose first DETECT_MATCHES counted
+# lines all belong to one format only tries that format's rules from then on.
+# A line of another format can look like one of that format (a pytest FAILED
+# line, ...), so detection is off unless asked for.
+DETECT_MATCHES = 8
+_rulesets = {}
+
+
+class RuleSet(object):
+    """The rules tried in one state of the parser, behind one prefilter.
+
+    A line containing none of the literals of the rules cannot match any of
+    them, which a single search of the alternation of all literals tells.
+    """
+
+    def __init__(self, rules):
+        """Index rules, a list of Rule in the order they are tried."""
+        self.rules = rules
+        literals = set(r.literal for r in rules)
+        self.always = None in literals or not rules
+        literals.discard(None)
+        self.prefilter = None
+        if literals:
+            alternation = "|".join(re.escape(lit) for lit in sorted(literals, key=len, reverse=True))
+            self.prefilter = re.compile(alternation)
+
+    def match(self, line):
+        """Return (rule, match) for the first rule matching line, or None."""
+        if not self.always and not self.prefilter.search(line):
+            return None
+        for entry in self.rules:
+            if entry.literal is None or entry.literal in line:
+                match = entry.regex.search(line)
+                if match:
+                    return entry, match
+        return None
+
+
+def ruleset(incheck_state, group=None, detect=False):
+    """Return the RuleSet in effect within or outside %check, for one format or all."""
+    key = (incheck_state, group, detect)
+    if key not in _rulesets:
+        _rulesets[key] = RuleSet([r for r in RULES
+                                  if (incheck_state or not r.incheck) and group in (None, r.group)
+                                  and r.detect in (None, detect)])
+    return _rulesets[key]
+
+
+class Groups(object):
+    """The numbers captured by a match, for the terms of a rule."""
+
+    def __init__(self, match, counter):
+        """Wrap match, found while counting for counter."""
+        self.match = match
+        self.counter = counter
+
+    def __call__(self, num):
+        """Return group num of the match as an int."""
+        return convert_int(self.match.group(num))
+
+
+class TestCounter(object):
+    """Count the test results reported in one log.
+
+    Lines, or chunks of the log as they arrive, are fed one at a time, and
+    finish_log() returns the counts as CSV. Counters share no state, so
+    any number of logs can be counted at once.
+    """
+
+    def __init__(self, pkgname='', detect=False):
+        """Set up a counter for a log of pkgname.
+
+        With detect, a section of the log only tries the rules of its
+        format once the format is clear.
+        """
+        self.testcount = {}
+        self.testpass = {}
+        self.testfail = {}
+        self.testxfail = {}
+        self.testskip = {}
+        self.detect = detect
+        TestCounter.zero_test_data(self)
+        self.start_log(pkgname)
+
+    def zero_test_data(self):
+        """Zero test results."""
+        self.total_tests = 0
+        self.total_pass = 0
+        self.total_fail = 0
+        self.total_xfail = 0
+        self.total_skip = 0
+        self.counted_tests = 0
+        self.counted_pass = 0
+        self.counted_fail = 0
+        self.counted_xfail = 0
+        self.counted_skip = 0
+
+    def sanitize_counts(self):
+        """Validate test counts are within sane bounds."""
+        if self.total_tests > 0 and self.total_pass == 0:
+            self.total_pass = self.total_tests - self.total_fail - self.total_skip - self.total_xfail
+
+        if self.total_tests < self.total_pass and self.total_pass > 0:
+            self.total_tests = self.total_pass + self.total_fail + self.total_skip + self.total_xfail
+
+        if self.counted_tests > 0 and self.counted_pass == 0:
+            self.counted_pass = self.counted_tests - self.counted_fail - self.counted_skip - self.counted_xfail
+
+        if self.counted_tests < self.counted_pass and self.counted_pass > 0:
+            self.counted_tests = self.counted_pass + self.counted_fail + self.counted_skip + self.counted_xfail
+
+        total = self.total_pass + self.total_fail + self.total_skip + self.total_xfail
+        if total < self.total_tests:
+            self.total_pass += self.total_tests - total
+
+        total = self.total_pass + self.total_fail + self.total_skip + self.total_xfail
+        if total > self.total_tests:
+            self.total_tests = total
+
+    def collect_output(self):
+        """Sum test results."""
+        for results in (self.testcount, self.testpass, self.testfail, self.testxfail, self.testskip):
+            results.setdefault(self.name, 0)
+
+        if self.counted_tests > self.total_tests:
+            self.testcount[self.name] += self.counted_tests
+            self.testpass[self.name] += self.counted_pass
+            self.testfail[self.name] += self.counted_fail
+            self.testxfail[self.name] += self.counted_xfail
+            self.testskip[self.name] += self.counted_skip
 
-def zero_test_data():
-    """Zero test results."""
-    global total_tests
-    global total_pass
-    global total_fail
-    global total_xfail
-    global total_skip
-    global counted_tests
-    global counted_pass
-    global counted_fail
-    global counted_xfail
-    global counted_skip
-    total_tests = 0
-    total_pass = 0
-    total_fail = 0
-    total_xfail = 0
-    total_skip = 0
-    counted_tests = 0
-    counted_pass = 0
-    counted_fail = 0
-    counted_xfail = 0
-    counted_skip = 0
+        else:
+            self.testcount[self.name] += self.total_tests
+            self.testpass[self.name] += self.total_pass
+            self.testfail[self.name] += self.total_fail
+            self.testxfail[self.name] += self.total_xfail
+            self.testskip[self.name] += self.total_skip
+
+        self.zero_test_data()
+
+    def start_log(self, pkgname=''):
+        """Reset the per-log parser state before feeding lines of a new log."""
+        self.name = pkgname
+        self.incheck = False
+        self.in_meson = False
+        self._partial = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="surrogateescape")
+        self.reset_detection()
+
+    def reset_detection(self):
+        """Forget the format of the current section, all rules apply again."""
+        self._detected = None
+        self._section_group = None
+        self._section_matches = 0
+
+    def detect_format(self, group):
+        """Note a line of group was counted, and settle on it once it is clear."""
+        if self._section_group is None:
+            self._section_group = group
+        elif self._section_group != group:
+            # mixed formats, keep trying everything in this section
+            self._section_group = ""
+        self._section_matches += 1
+        if self.detect and self._section_group and self._section_matches >= DETECT_MATCHES:
+            self._detected = self._section_group
+
+    def parse_meson_test(self, lines):
+        """Parse output of meson tests logs."""
+        for line in lines:
+            lsplit = line.rstrip().split()
+            for fields, pattern, counter in MESON_RULES:
+                if len(lsplit) == fields and pattern.search(line):
+                    setattr(self, counter, getattr(self, counter) + convert_int(lsplit[-1]))
+                    break
+
+    def apply_rule(self, entry, match):
+        """Update the counters for a line entry matched."""
+        g = Groups(match, self)
+        for counter, term in entry.add:
+            setattr(self, counter, getattr(self, counter) + (term(g) if callable(term) else g(term)))
+        for counter, term in entry.assign:
+            setattr(self, counter, term(g) if callable(term) else g(term))
+
+    def feed_line(self, line):
+        """Count the test results reported on one line of a test log."""
+        if self.in_meson:
+            # everything after "meson test" is the meson summary
+            self.parse_meson_test([line])
+            return
 
-def sanitize_counts():
-    """Validate test counts are within sane bounds."""
-    global total_tests
-    global total_pass
-    global total_fail
-    global total_xfail
-    global total_skip
-    global counted_tests
-    global counted_pass
-    global counted_fail
-    global counted_xfail
-    global counted_skip
-    if total_tests > 0 and total_pass == 0:
-        total_pass = total_tests - total_fail - total_skip - total_xfail
+        line = line.rstrip()
 
-    if total_tests < total_pass and total_pass > 0:
-        total_tests = total_pass + total_fail + total_skip + total_xfail
+        for zline in ZERO_LINES:
+            if zline in line:
+                self.reset_detection()
+                if self.incheck:
+                    self.zero_test_data()
+                else:
+                    self.incheck = True
+
+        if "meson test" in line:
+            self.zero_test_data()
+            self.in_meson = True
+            self.parse_meson_test([line])
+            return
+
+        if "CLR-XTEST" in line:
+            match = XTEST_RE.search(line)
+            if match:
+                self.name = match.group(1)
+                self.sanitize_counts()
+                self.collect_output()
+                self.reset_detection()
+
+        found = ruleset(self.incheck, self._detected, self.detect).match(line)
+        if found:
+            self.apply_rule(*found)
+            if self._detected is None:
+                self.detect_format(found[0].group)
+
+    def feed(self, data):
+        """Count the lines of data, a str or bytes chunk of the log.
+
+        Chunks may end in the middle of a line (or of a UTF-8 character),
+        the rest of it is taken from the next chunk.
+        """
+        if isinstance(data, bytes):
+            data = self._decoder.decode(data)
+        lines = (self._partial + data).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self.feed_line(line)
+
+    def finish_log(self):
+        """Sum the counts of the fed log and return them as CSV."""
+        self.feed(self._decoder.decode(b"", final=True))
+        if self._partial:
+            self.feed_line(self._partial)
+            self._partial = ""
+        self.sanitize_counts()
+        self.collect_output()
+        return self.string_out()
+
+    def snapshot(self):
+        """Return a copy of the counter, to finish without disturbing this one."""
+        return copy.deepcopy(self)
+
+    def string_out(self):
+        """Output test result counts."""
+        retstr = ""
+        for key in sorted(self.testcount):
+            # key may be an empty string, which is fine since this is handled by
+            # the calling module
+            retstr += "{},{},{},{},{},{}\n".format(key,
+                                                   self.testcount[key],
+                                                   self.testpass[key],
+                                                   self.testfail[key],
+                                                   self.testskip[key],
+                                                   self.testxfail[key])
+
+        return retstr.strip()  # strip trailing newline
+
+
+# The functions below work on one counter shared by the module, whose state
+# reads as module attributes (count.total_pass, ...) for the callers of the
+# older module API.
+class _ModuleCounter(TestCounter):
+    """The shared counter, zeroed through the module level zero_test_data."""
+
+    def zero_test_data(self):
+        """Zero test results."""
+        zero_test_data()
+
+
+_counter = _ModuleCounter()
+
+STATE = ("testcount", "testpass", "testfail", "testxfail", "testskip",
+         "total_tests", "total_pass", "total_fail", "total_xfail", "total_skip",
+         "counted_tests", "counted_pass", "counted_fail", "counted_xfail", "counted_skip",
+         "name", "incheck", "in_meson")
+
+
+def __getattr__(attr):
+    """Read the state of the shared counter as module attributes."""
+    if attr in STATE:
+        return getattr(_counter, attr)
+    raise AttributeError("module {} has no attribute {}".format(__name__, attr))
 
-    if counted_tests > 0 and counted_pass == 0:
-        counted_pass = counted_tests - counted_fail - counted_skip - counted_xfail
 
-    if counted_tests < counted_pass and counted_pass > 0:
-        counted_tests = counted_pass + counted_fail + counted_skip + counted_xfail
+def zero_test_data():
+    """Zero test results."""
+    TestCounter.zero_test_data(_counter)
 
-    if (total_pass + total_fail + total_skip + total_xfail) < total_tests:
-        total_pass += total_tests - (total_pass + total_fail + total_skip + total_xfail)
 
-    if (total_pass + total_fail + total_skip + total_xfail) > total_tests:
-        total_tests = total_pass + total_fail + total_skip + total_xfail
+def sanitize_counts():
+    """Validate test counts are within sane bounds."""
+    _counter.sanitize_counts()
 
 
 def collect_output():
     """Sum test results."""
-    if not testcount.get(name):
-        testcount[name] = 0 if not testcount.get(name) else testcount[name]
-    if not testpass.get(name):
-        testpass[name] = 0
-    if not testfail.get(name):
-        testfail[name] = 0
-    if not testxfail.get(name):
-        testxfail[name] = 0
-    if not testskip.get(name):
-        testskip[name] = 0
-
-    if counted_tests > total_tests:
-        testcount[name] += counted_tests
-        testpass[name] += counted_pass
-        testfail[name] += counted_fail
-        testxfail[name] += counted_xfail
-        testskip[name] += counted_skip
+    _counter.collect_output()
 
-    else:
-        testcount[name] += total_tests
-        testpass[name] += total_pass
-        testfail[name] += total_fail
-        testxfail[name] += total_xfail
-        testskip[name] += total_skip
 
-    zero_test_data()
+def parse_meson_test(lines):
+    """Parse output of meson tests logs."""
+    _counter.parse_meson_test(lines)
+
 
+def start_log(pkgname=''):
+    """Reset the per-log parser state before feeding lines of a new log."""
+    _counter.start_log(pkgname)
 
-def convert_int(intstr):
-    """Integer conversion wrapper."""
-    try:
-        return int(intstr)
-    except ValueError:
-        return 0
 
+def feed_line(line):
+    """Count the test results reported on one line of a test log."""
+    _counter.feed_line(line)
 
-def parse_meson_test(lines):
-    """Parse output of meson tests logs."""
-    global total_pass
-    global total_xfail
-    global total_fail
-    global total_skip
-    for line in lines:
-        lsplit = line.rstrip().split()
-        if len(lsplit) == 2:
-            val = lsplit[-1]
-            if re.search(r'^ok:', line, flags=re.I):
-                total_pass += convert_int(val)
-            elif re.search(r'^fail:', line, flags=re.I):
-                total_fail += convert_int(val)
-            elif re.search(r'^skip(ped)?:', line, flags=re.I):
-                total_skip += convert_int(val)
-            elif re.search(r'^timeout:', line, flags=re.I):
-                # Count timeouts as failures.
-                total_fail += convert_int(val)
-        elif len(lsplit) == 3:
-            val = lsplit[-1]
-            if re.search(r'^expected fail:', line, flags=re.I):
-                total_xfail += convert_int(val)
-        else:
-            continue
+
+def finish_log():
+    """Sum the counts of the last fed log and return them as CSV."""
+    return _counter.finish_log()
 
 
 def parse_log(log, pkgname=''):
     """Parse output of test logs."""
-    global total_tests
-    global total_pass
-    global total_fail
-    global total_xfail
-    global total_skip
-    global counted_tests
-    global counted_pass
-    global counted_fail
-    global counted_xfail
-    global counted_skip
-    global name
-
-    name = pkgname
-    incheck = False
-    with util.open_auto(log, 'r') as logf:
-        lines = logf.readlines()
-
-    zero_lines = ["Executing(%check)",
-                  "+ make check",
-                  "##### Testing packages."]
-
-    for idx, line in enumerate(lines):
-        line = line.rstrip()
-
-        for zline in zero_lines:
-            if zline in line:
-                if incheck:
-                    zero_test_data()
-                else:
-                    incheck = True
-
-        if "meson test" in line:
-            zero_test_data()
-            parse_meson_test(lines[idx:])
-            break
-
-        match = re.search(r"CLR-XTEST: Package: (.*)", line)
-        if match:
-            name = match.group(1)
-            sanitize_counts()
-            collect_output()
-
-        # ACL package
-        # [22] $ rm -Rf d -- ok-
-        # 17 commands (17 passed, 0 failed)-
-        if re.search(r"\[[0-9]+\].*\-\- ok", line):
-            counted_pass += 1
-            continue
-
-        match = re.search(r"[0-9]+ commands \(([0-9]+) passed, ([0-9]+) failed\)", line)
-        if match:
-            total_pass += convert_int(match.group(1))
-            total_fail += convert_int(match.group(2))
-            continue
-
-        # alembic package
-        # Ran 678 tests in 5.175s
-        # OK (SKIP=15)
-        match = re.search("Ran ([0-9]+) tests? in", line)
-        if match:
-            total_tests += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"OK \(SKIP=([0-9]+)\)", line)
-        if match:
-            total_skip += convert_int(match.group(1))
-            continue
-        else:
-            match = re.search(r"OK \(skipped=([0-9]+)\)", line)
-            if match:
-                total_skip += convert_int(match.group(1))
-                continue
-
-        # anyjson
-        # test_implementations.test_default_serialization ... ok
-        # note: configure false positive
-        if re.search(r"\.\.\. ok$", line) and incheck:
-            counted_pass += 1
-            continue
-
-        if re.search(r"\.\.\. skipped$", line) and incheck:
-            counted_skip += 1
-            continue
-
-        # apr
-        # testatomic          :  SUCCESS
-        if re.search(r":  SUCCESS$", line) and incheck:
-            counted_pass += 1
-            continue
-
-        # cryptography
-        # ================= 76230 passed, 267 skipped in 140.23 seconds ==================
-        # ================== 47 passed, 2 error in 10.36 seconds =========================
-        # ================ 10 failed, 16 passed, 4 error in 0.16 seconds =================
-        # ========================== 43 passed in 2.90 seconds ===========================
-        # ======= 28 failed, 281 passed, 13 skipped, 10 warnings in 28.48 seconds ========
-        # ===================== 5 failed, 318 passed in 1.06 seconds =====================
-        # ============= 1628 passed, 72 skipped, 4 xfailed in 146.26 seconds =============
-        # =============== 119 passed, 2 skipped, 54 error in 2.19 seconds ================
-        # ========== 1 failed, 74 passed, 10 skipped, 55 error in 2.05 seconds ===========
-        # ==================== 68 passed, 1 warnings in 0.12 seconds =====================
-        # ================ 3 failed, 250 passed, 3 error in 3.28 seconds =================
-        # =============== 1 failed, 407 passed, 10 skipped in 4.71 seconds ===============
-        # ========================== 1 skipped in 0.79 seconds ===========================
-        # =========================== 3 error in 0.41 seconds ============================
-        # ================= 68 passed, 1 pytest-warnings in 0.09 seconds =================
-        # ===== 21 failed, 73 passed, 5 skipped, 2 pytest-warnings in 34.81 seconds ======
-        match = re.search(r"== ([0-9]+) passed, ([0-9]+) skipped in ", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_skip += convert_int(match.group(2))
-            continue
-
-        match = re.search(r"== ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) xfailed in ", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_skip += convert_int(match.group(2))
-            total_xfail += convert_int(match.group(3))
-            continue
-
-        match = re.search(r"== ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) error in ", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_skip += convert_int(match.group(2))
-            total_fail += convert_int(match.group(3))
-            continue
-
-        match = re.search(r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) error in ", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(2))
-            total_skip += convert_int(match.group(3))
-            total_fail += convert_int(match.group(4)) + convert_int(match.group(1))
-            continue
-
-        match = re.search(r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) error in ", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(2))
-            total_fail += convert_int(match.group(3)) + convert_int(match.group(1))
-            continue
-
-        match = re.search(r"== ([0-9]+) passed, ([0-9]+) error in ", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_fail += convert_int(match.group(2))
-            continue
-
-        match = re.search(r"== ([0-9]+) passed, ([0-9]+) warnings in ", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_fail += convert_int(match.group(2))
-            continue
-
-        match = re.search(r"== ([0-9]+) failed, ([0-9]+) passed in ", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(2))
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) xfailed in ", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(2))
-            total_fail += convert_int(match.group(1))
-            total_xfail += convert_int(match.group(3))
-            continue
-
-        match = re.search(r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) warnings in ", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(2))
-            total_fail += convert_int(match.group(1)) + convert_int(match.group(4))
-            total_skip += convert_int(match.group(3))
-            continue
-
-        match = re.search(r"== ([0-9]+) passed in [0-9\.]+ seconds ====", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"== ([0-9]+) failed, ([0-9]+) passed, ([0-9]+) skipped in [0-9\.]+ seconds ====", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(2))
-            total_fail += convert_int(match.group(1))
-            total_skip += convert_int(match.group(3))
-            continue
-
-        match = re.search(r"== ([0-9]+) skipped in [0-9\.]+ seconds ====", line)
-        if match and incheck:
-            total_skip += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"== ([0-9]+) error in [0-9\.]+ seconds ====", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"== ([0-9]+) passed\, [0-9]+ [A-Za-z0-9]+\-warnings? in [0-9\.]+ seconds ====", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # ===== 21 failed, 73 passed, 5 skipped, 2 pytest-warnings in 34.81 seconds ======
-        match = re.search(r"== ([0-9]+) failed\, ([0-9]+) passed\, ([0-9]+) skipped\, [0-9]+ [A-Za-z0-9]+\-warnings? in [0-9\.]+ seconds ====", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            total_pass += convert_int(match.group(2))
-            total_skip += convert_int(match.group(3))
-            continue
-
-        # mercurial
-        # running 59 tests using 8 parallel processes
-        # # Ran 55 tests, 4 skipped, 0 failed.
-        match = re.search(r"^# Ran ([0-9]+) tests\, ([0-9]+) skipped\, ([0-9]+) failed.", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(3))
-            total_skip += convert_int(match.group(2))
-            total_pass += (convert_int(match.group(1)) - convert_int(match.group(2)) - convert_int(match.group(3)))
-            continue
-
-        # swift
-        # ========= 1 failed, 1287 passed, 1 warnings, 62 error in 35.77 seconds =========
-        match = re.search(r"== ([0-9]+) failed\, ([0-9]+) passed\, ([0-9]+) warnings\, ([0-9]+) error in ", line)
-        if match and incheck:
-            total_fail += (convert_int(match.group(1)) + convert_int(match.group(3)) + convert_int(match.group(4)))
-            total_pass += convert_int(match.group(2))
-            continue
-
-        # swift
-        # 487 failed, 4114 passed, 32 skipped, 1 pytest-warnings, 34 error in 222.82 seconds
-        match = re.search(r"\s*([0-9]+) failed, ([0-9]+) passed, ([0-9]+) skipped, [0-9]+ [A-Za-z0-9]+\-warnings?, ([0-9]+) error in ", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1)) + convert_int(match.group(4))
-            total_pass += convert_int(match.group(2))
-            total_skip += convert_int(match.group(3))
-            continue
-
-        # tox
-        # ======== 199 passed, 38 skipped, 1 xpassed, 1 warnings in 5.76 seconds =========
-        match = re.search(r"== ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) xpassed, ([0-9]) warnings in ", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_skip += convert_int(match.group(2))
-            total_xfail += convert_int(match.group(3))
-            total_fail += convert_int(match.group(4))
-            continue
-
-        # augeas
-        # TOTAL: 215
-        # PASS:  212
-        # SKIP:  3
-        # XFAIL: 0
-        # FAIL:  0
-        # XPASS: 0
-        # ERROR: 0
-        match = re.search(r"# TOTAL: +([0-9]+)", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"# PASS: +([0-9]+)", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"# SKIP: +([0-9]+)", line)
-        if match and incheck:
-            total_skip += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"# FAIL: +([0-9]+)", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"# XFAIL: +([0-9]+)", line)
-        if match and incheck:
-            total_xfail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"# XPASS: +([0-9]+)", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # autoconf
-        # 493 tests behaved as expected.
-        # 10 tests were skipped.
-        # 495: AC_FUNC_STRNLEN                                 ok
-        # 344: Erlang                                          skipped (erlang.at:30)
-        # 26: autoupdating macros recursively                 expected failure (tools.at:945)
-        match = re.search(r"^([0-9]+) tests behaved as expected", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^([0-9]+) tests were skipped", line)
-        if match and incheck:
-            total_skip += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^[0-9]+\:.*ok$", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"^[0-9]+\:.*skipped \(", line)
-        if match and incheck:
-            counted_skip += 1
-            continue
-
-        match = re.search(r"^[0-9]+\:.*expected failure \(", line)
-        if match and incheck:
-            counted_xfail += 1
-            continue
-
-        # bison
-        # 470 tests were successful.
-        match = re.search(r"^([0-9]+) tests were successful", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # binutils
-        # of expected passes            1144
-        # of expected failures          57
-        # of untested testcases         1
-        # of unsupported tests          12
-        match = re.search(r"^# of expected passes.*\t([0-9]+)", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^# of expected failures.*\t([0-9]+)", line)
-        if match and incheck:
-            total_xfail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^# of unexpected failures.*\t([0-9]+)", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^# of unsupported tests.*\t([0-9]+)", line)
-        if match and incheck:
-            total_skip += convert_int(match.group(1))
-            continue
-
-        # ccache
-        # PASSED: 448 assertions, 88 tests, 10 suites
-        match = re.search(r"PASSED: [0-9]+ assertions, ([0-9]+) tests, [0-9]+ suites", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # rubygem-rack
-        # 701 tests, 2292 assertions, 0 failures, 0 errors
-        match = re.search(r"([0-9]+) tests, [0-9]+ assertions, ([0-9]+) failures, ([0-9])+ errors", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_fail += convert_int(match.group(2))
-            total_fail += convert_int(match.group(3))
-            continue
-
-        # curl
-        # TESTDONE: 686 tests out of 686 reported OK: 100%
-        match = re.search(r"TESTDONE: ([0-9]+) tests out of ([0-9]+) reported OK: ", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(2))
-            total_pass += convert_int(match.group(1))
-            total_fail = convert_int(match.group(2)) - convert_int(match.group(1))
-            continue
-
-        # gcc
-        # All 4 tests passed
-        # PASS: test-strtol-16.
-        match = re.search(r"All ([0-9]+) tests passed", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            total_pass += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^PASS\: [A-Za-z]+", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"^FAIL\: [A-Za-z]+", line)
-        if match and incheck:
-            counted_fail += 1
-            continue
-
-        # gdbm
-        # All 22 tests were successful.
-        match = re.search(r"All ([0-9]+) tests were successful.", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # glibc
-        # 3 FAIL
-        # 2182 PASS
-        # 1 UNRESOLVED
-        # 199 XFAIL
-        # 3 XPASS
-        match = re.search(r"^\s*([0-9]+) FAIL$", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^\s*([0-9]+) PASS$", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^\s*([0-9]+) XFAIL$", line)
-        if match and incheck:
-            total_xfail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^\s*([0-9]+) XPASS$", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # libxml2
-        # Total 2908 tests, no errors
-        # Total: 1171 functions, 291083 tests, 0 errors
-        match = re.search(r"Total ([0-9]+) tests, no errors", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"Total: ([0-9]+) functions, ([0-9]+) tests, 0 errors", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # zlib
-        # *** zlib shared test OK ***
-        match = re.search(r"\*\*\* .* test OK \*\*\*", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        # e2fsprogs
-        # 153 tests succeeded     0 tests failed
-        match = re.search(r"([0-9]+) tests succeeded\s*([0-9]+) tests failed", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_fail += convert_int(match.group(2))
-            continue
-
-        # expect
-        # all.tcl:        Total   29      Passed  29      Skipped 0       Failed  0
-        match = re.search(r".*:\s*Total\s+([0-9]+)\s+Passed\s+([0-9]+)\s+Skipped\s+([0-9]+)\s+Failed\s+([0-9]+)", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            total_pass += convert_int(match.group(2))
-            total_skip += convert_int(match.group(3))
-            total_fail += convert_int(match.group(4))
-            continue
-
-        # expat
-        # 100%: Checks: 50, Failed: 0
-        match = re.search(r"[0-9]+%: Checks: ([0-9]+), Failed: ([0-9]+)", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1)) - convert_int(match.group(2))
-            total_fail += convert_int(match.group(2))
-            continue
-
-        # flex
-        # Tests succeeded: 47
-        # Tests FAILED: 0
-        match = re.search(r"^Tests succeeded: ([0-9]+)", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^Tests FAILED: ([0-9]+)", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        # this one catches the generic TAP format!
-        #  perl-Capture-tiny
-        # ok 580 - tee_merged|sys|stderr|short - got STDERR
-        match = re.search(r"^ok [0-9]+ \-", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"^not ok [0-9]+ \-", line)
-        if match and incheck:
-            if re.search(r"# TODO\b", line):
-                counted_xfail += 1
-            else:
-                counted_fail += 1
-
-            continue
-
-        match = re.search(r"^ok [0-9]+$", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"^not ok [0-9]+$", line)
-        if match and incheck:
-            counted_fail += 1
-            continue
-
-        # tcpdump
-        #    0 tests failed
-        # 154 tests passed
-        match = re.search(r"^\s*([0-9]+) tests? failed$", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^\s*([0-9]+) tests? passed$", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # R packages
-        # * checking top-level files ... OK
-        match = re.search(r"\* .* \.\.\. OK", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"\* .* \.\.\. PASSED\.", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"\* .* \.\.\. SKIPPED", line)
-        if match and incheck:
-            counted_skip += 1
-            continue
-
-        # python
-        # 365 tests OK.
-        # 22 tests skipped:
-        match = re.search(r"^([0-9]+) tests skipped:$", line)
-        if match and incheck:
-            total_skip += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^([0-9]+) tests OK.$", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # jemalloc
-        # Test suite summary: pass: 30/33, skip: 3/33, fail: 0/33
-        match = re.search(r"Test suite summary: pass: ([0-9]+)\/([0-9]+), skip: ([0-9]+)\/([0-9]+), fail: ([0-9]+)\/([0-9]+)", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_tests += convert_int(match.group(2))
-            total_skip += convert_int(match.group(3))
-            total_fail += convert_int(match.group(5))
-            continue
-
-        # util-linux
-        #   All 160 tests PASSED
-        match = re.search(r"  All ([0-9]+) tests PASSED$", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # nss
-        # cert.sh: #101: Import chain-2-serverCA-ec CA -t u,u,u for localhost.localdomain (ext.)  - PASSED
-        # Passed:             13036
-        # Failed:             6
-        # Failed with core:   0
-        # Unknown status:     0
-        match = re.search(r"^[a-z]+.sh: #[0-9]+: .*  - PASSED$", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"^[a-z]+.sh: #[0-9]+: .*  - FAILED$", line)
-        if match and incheck:
-            counted_fail += 1
-            continue
-
-        match = re.search(r"^Passed:\s+([0-9]+)$", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^Failed:\s+([0-9]+)$", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^Failed with core:\s+([0-9]+)$", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        # rsync
-        #      34 passed
-        #      5 skipped
-        match = re.search(r"^\s+([0-9]+) passed$", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^\s+([0-9]+) skipped$", line)
-        if match and incheck:
-            total_skip += convert_int(match.group(1))
-            continue
-
-        # mariadb
-        # 100% tests passed, 0 tests failed out of 53
-        match = re.search(r"tests passed, ([0-9]+) tests failed out of ([0-9]+)", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            total_tests += convert_int(match.group(2))
-            total_pass += convert_int(match.group(2)) - convert_int(match.group(1))
-            continue
-
-        # python-runtime-tests
-        # FAILED (KNOWNFAIL=6, SKIP=18, errors=6)
-        # FAILED (failures=1)
-        # FAILED (failures=1, errors=499, skipped=48)
-        # OK (KNOWNFAIL=5, SKIP=15)
-        match = re.search(r"FAILED \(KNOWNFAIL=([0-9]+), SKIP=([0-9]+), errors=([0-9]+)\)", line)
-        if match and incheck:
-            total_xfail += convert_int(match.group(1))
-            total_skip += convert_int(match.group(2))
-            total_fail += convert_int(match.group(3))
-            continue
-
-        match = re.search(r"FAILED \(failures=([0-9]+), errors=([0-9]+), skipped=([0-9]+)\)", line)
-        if match and incheck:
-            total_xfail += convert_int(match.group(2))
-            total_skip += convert_int(match.group(3))
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"FAILED \(failures=([0-9]+), errors=([0-9]+)\)", line)
-        if match and incheck:
-            total_xfail += convert_int(match.group(2))
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"FAILED \(failures=([0-9]+)\)", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"FAILED \(errors=([0-9]+)\)", line)
-        if match and incheck:
-            total_xfail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"OK \(KNOWNFAIL=([0-9]+), SKIP=([0-9]+)\)", line)
-        if match and incheck:
-            total_xfail += convert_int(match.group(1))
-            total_skip += convert_int(match.group(2))
-            continue
-
-        # qpid-python
-        # Totals: 318 tests, 200 passed, 112 skipped, 0 ignored, 6 failed
-        match = re.search(r"Totals: ([0-9]+) tests, ([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) ignored, ([0-9]+) failed", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            total_pass += convert_int(match.group(2))
-            total_skip += convert_int(match.group(3))
-            total_xfail += convert_int(match.group(4))
-            total_fail += convert_int(match.group(5))
-            continue
-
-        # PyYAML
-        # TESTS: 2577
-        match = re.search(r"^TESTS: ([0-9]+)$", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            continue
-
-        # sudo
-        # visudo: 7/7 tests passed; 0/7 tests failed
-        # check_symbols: 7 tests run, 0 errors, 100% success rate
-        match = re.search(r"[a-z_]+\:\s+([0-9]+)\/[0-9]+ tests passed; ([0-9]+)\/[0-9]+ tests failed", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_fail += convert_int(match.group(2))
-            continue
-
-        match = re.search(r"[a-z_]+\: ([0-9]+) tests run, ([0-9]+) errors", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            total_fail += convert_int(match.group(2))
-            total_pass += convert_int(match.group(1)) - convert_int(match.group(2))
-            continue
-
-        # R
-        # running code in 'reg-examples1.R' ... OK
-        # Status: 1 ERROR, 1 WARNING, 4 NOTEs
-        # OK: 749 SKIPPED: 4 FAILED: 2
-        match = re.search(r"running code in '.*\.R' \.\.. OK", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"Status: ([0-9]+) ERROR, ([0-9]+) WARNING, ([0-9]+) NOTEs", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"OK: ([0-9]+) SKIPPED: ([0-9]+) FAILED: ([0-9]+)", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_fail += convert_int(match.group(3))
-            total_skip += convert_int(match.group(2))
-            continue
-
-        # onig
-        # OK: // 'a'
-        match = re.search(r"^OK\: ", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        # php
-        # Number of tests : 13526              9794
-        # Tests skipped   : 3732 ( 27.6%) --------
-        # Tests warned    :    0 (  0.0%) (  0.0%)
-        # Tests failed    :   12 (  0.1%) (  0.1%)
-        # Expected fail   :   31 (  0.2%) (  0.3%)
-        # Tests passed    : 9751 ( 72.1%) ( 99.6%)
-        match = re.search(r"^Number of tests : ([0-9]+)", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^Tests skipped   :\s+([0-9]+) \(", line)
-        if match and incheck:
-            total_skip += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^Tests failed    :\s+([0-9]+) \(", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^Expected fail   :\s+([0-9]+) \(", line)
-        if match and incheck:
-            total_xfail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"^Tests passed    :\s+([0-9]+) \(", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # rubygem / rake
-        # 174 runs, 469 assertions, 0 failures, 0 errors, 0 skips
-        match = re.search(r"([0-9]+) runs, ([0-9]+) assertions, ([0-9]+) failures, ([0-9]+) errors, ([0-9]+) skips", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            total_fail += convert_int(match.group(3))
-            total_skip += convert_int(match.group(5))
-            continue
-
-        # cryptsetup
-        #  [OK]
-        if re.search(r" \[OK\]$", line) and incheck:
-            counted_pass += 1
-            continue
-
-        # lzo
-        #  test passed.
-        match = re.search(r" test passed.$", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        # lsof
-        # LTnlink ... OK
-        # LTnfs ... ERROR!!!
-        match = re.search(r"^LT[a-zA-Z0-9]+ \.\.\. OK$", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"^LT[a-zA-Z0-9]+ \.\.\. ERROR\!\!\!", line)
-        if match and incheck:
-            counted_fail += 1
-            continue
-
-        # libaio
-        # Pass: 11  Fail: 1
-        match = re.search(r"^Pass: ([0-9]+)  Fail: ([0-9]+)$", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_fail += convert_int(match.group(2))
-            continue
-
-        # gawk
-        match = re.search(r"^ALL TESTS PASSED$", line)
-        if match and incheck:
-            total_pass += 1
-            continue
-
-        # gptfdisk
-        # **SUCCESS** ...
-        match = re.search(r"^\*\*SUCCESS\*\*", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        # boost
-        # **passed** ...
-        # 8 errors detected.
-        match = re.search(r"^\*\*passed\*\*", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"([0-9]+) errors? detected\.?", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        match = re.search(r"([0-9]+) failures? detected\.?", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            continue
-
-        # make
-        # 534 Tests in 118 Categories Complete ... No Failures
-        match = re.search(r"([0-9]+) Tests in ([0-9]+) Categories Complete ... No Failures", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # icu4c ---[OK]
-        match = re.search(r"---\[OK\]", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        # libxslt
-        # Pass 1
-        match = re.search(r"^Pass [0-9]+$", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        # bash
-        # < Failed 126 of 1378 Unicode tests
-        match = re.search(r"^[<,>] Failed ([0-9]+) of ([0-9]+)", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            total_tests += convert_int(match.group(2))
-            continue
-
-        # crudini
-        # Test 95 OK (line 460)
-        match = re.search(r"^Test [0-9]+ OK", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"^Test [0-9]+ (?!^OK)[A-Z]+", line)
-        if match and incheck:
-            counted_fail += 1
-            continue
-
-        # discount
-        # Reddit-style automatic links ......................... OK
-        match = re.search(r"[A-Za-z\-\s]+ \.\.\.+ (OK|GOOD)$", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"[A-Za-z\-\s]+ \.\.\.+ (?!^OK)[A-Z]+$", line)
-        if match and incheck:
-            counted_fail += 1
-            continue
-
-        # libjpeg-turbo
-        # JPEG -> RGB Top-Down  2/1 ... Passed.
-        # JPEG -> RGB Top-Down  15/8 ... Passed.
-        # JPEG -> RGB Top-Down  7/4 ... Passed.
-        match = re.search(r"[A-Za-z0-9\ \>\<\/]+ \.\.\. Passed\.", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        # LVM2
-        # valgrind pool awareness ... fail
-        # dfa matching ... fail
-        # dfa matching ... fail
-        # dfa with non-print regex chars ... pass
-        # bitset iteration ... pass
-        # valgrind pool awareness ... fail
-        # dfa matching ... fail
-        # dfa matching ... fail
-        # dfa with non-print regex chars ... fail
-        # bitset iteration ... fail
-        match = re.search(r"[a-z\ ]+\ \.\.\.\ pass", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"[a-z\ ]+\ \.\.\.\ fail", line)
-        if match and incheck:
-            counted_fail += 1
-            continue
-
-        # keyring
-        #  76 passed, 62 skipped, 50 xfailed, 14 xpassed, 2 warnings, 32 error in 2.13 seconds
-        match = re.search(r"([0-9]+) passed, ([0-9]+) skipped, ([0-9]+) xfailed, ([0-9]+) xpassed, ([0-9]+) warnings, ([0-9]+) error in [0-9\.]+ seconds", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1)) + convert_int(match.group(4))
-            total_skip += convert_int(match.group(2))
-            total_xfail += convert_int(match.group(3))
-            total_fail += convert_int(match.group(5)) + convert_int(match.group(6))
-            continue
-
-        # openblas
-        #  Real BLAS Test Program Results
-        #  Test of subprogram number  1             SDOT
-        #                                     ----- PASS -----
-        #  Test of subprogram number  2            SAXPY
-        #                                     ----- PASS -----
-        #  Test of subprogram number  3            SROTG
-        #                                     ----- PASS -----
-        match = re.search(r"\ \ +\-\-\-+\ PASS\ \-\-\-+", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        match = re.search(r"\ \ +\-\-\-+\ FAIL\ \-\-\-+", line)
-        if match and incheck:
-            counted_fail += 1
-            continue
-
-        # rubygem-hashie
-        # Finished in 0.07221 seconds (files took 0.28356 seconds to load)
-        # 545 examples, 0 failures, 1 pending
-        match = re.search(r"([0-9]+) examples?, ([0-9]+) failures?, ([0-9]+) pending", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_fail += convert_int(match.group(2))
-            total_skip += convert_int(match.group(3))
-            continue
-
-        # rubygem-warden
-        # Finished in 0.08928 seconds (files took 0.1046 seconds to load)
-        # 215 examples, 14 failures
-        match = re.search(r"([0-9]+) examples?, ([0-9]+) failures?", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_fail += convert_int(match.group(2))
-            continue
-
-        # rubygem-ansi
-        # Executed 12 tests with 7 passing, 5 errors.
-        match = re.search(r"Executed ([0-9]+) tests with ([0-9+]) passing, ([0-9]+) errors\.", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            total_pass += convert_int(match.group(2))
-            total_fail += convert_int(match.group(3))
-            continue
-
-        # vim
-        # Executed 9 tests
-        match = re.search(r"Executed ([0-9]+) tests$", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            continue
-
-        # rubygem-formatador
-        #   9 succeeded in 0.00375661 seconds
-        match = re.search(r"([0-9]+) succeeded in [0-9]+\.[0-9]+ seconds", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # ./pigz -kf pigz.c ; ./pigz -t pigz.c.gz
-        # ./pigz -kfb 32 pigz.c ; ./pigz -t pigz.c.gz
-        match = re.search(r".*\.\/pigz.+(\.\/pigz).+", line)
-        if match and incheck:
-            total_pass += 2
-            continue
-        elif re.search(r".*\.\/pigz.+", line) and incheck:
-            total_pass += 1
-            continue
-
-        # netifaces
-        # Interface lo:
-        # Interface enp2s0:
-        match = re.search(r"^Interface [a-zA-Z0-9]+\:", line)
-        if match and incheck:
-            total_pass += 1
-            continue
-
-        # btrfs-progs
-        # [TEST]   001-bad-file-extent-bytenr
-        # [NOTRUN] Need to validate root privileges
-        # test failed for case
-        match = re.search(r"    \[TEST\]   .*", line)
-        if match and incheck:
-            total_pass += 1
-            continue
-
-        match = re.search(r"test failed for case.*", line)
-        if match and incheck:
-            total_fail += 1
-            total_pass = max(0, total_pass - 1)
-            continue
-
-        match = re.search(r"    \[NOTRUN\] .*", line)
-        if match and incheck:
-            total_skip += 1
-            continue
-
-        # chrpath
-        # success: chrpath changed rpath to larger path.
-        # error: chrpath unable to change rpath to larger path.
-        match = re.search(r"success\: chrpath .*", line)
-        if match and incheck:
-            total_pass += 1
-            continue
-        elif re.search(r"error: chrpath .*", line) and incheck:
-            total_fail += 1
-            continue
-        elif re.search(r"warning: chrpath .*", line) and incheck:
-            total_fail += 1
-            continue
-
-        # yajl
-        # 58/58 tests successful
-        match = re.search(r"([0-9]+)\/([0-9]+) tests successful", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_tests += convert_int(match.group(2))
-            continue
-
-        # xmlsec1
-        #     Checking required transforms                            OK
-        #     Verify existing signature                             Fail
-        #     Checking required transforms                          Skip
-        #     Checking required key data                               OK
-        match = re.search(r"^    [\w ]+\ +OK$", line)
-        if match and incheck:
-            total_pass += 1
-            continue
-        elif re.search(r"^    [\w ]+\ +Fail$", line) and incheck:
-            total_fail += 1
-            continue
-        elif re.search(r"^    [\w ]+\ +Skip$", line) and incheck:
-            total_skip += 1
-            continue
-
-        # xdg-utils
-        # TOTAL: 4 tests failed, 90 of 116 tests passed. (140 attempted)
-        match = re.search(r"TOTAL\: ([0-9]+) tests? failed\, ([0-9]+) of [0-9]+ tests? passed\. \(([0-9]+) attempted\)", line)
-        if match and incheck:
-            total_fail += convert_int(match.group(1))
-            total_pass += convert_int(match.group(2))
-            total_skip += convert_int(match.group(3)) - (convert_int(match.group(2)) + convert_int(match.group(1)))
-            continue
-
-        # slang
-        # Testing argv processing ...Ok
-        # ./utf8.sl:14:check_sprintf:Test Error
-        match = re.search(r"^Testing [\w ]+\.\.\.Ok$", line)
-        if match and incheck:
-            total_pass += 1
-            continue
-
-        match = re.search(r":Test Error", line)
-        if match and incheck:
-            total_fail += 1
-            continue
-
-        # go & golang
-        # ok  	golang.org/x/text/encoding/htmlindex	0.002s
-        # --- FAIL: TestParents (0.00s)
-        # FAIL	golang.org/x/text/internal	0.002s
-        # --- PASS: TestApp_Command (0.00s)
-        match = re.search(r"^ok\s+[\w_]+[A-Za-z0-9\.\?_\-]*", line)
-        if match and incheck:
-            total_tests += 1
-            total_pass += 1
-            continue
-
-        match = re.search(r"(---\s+)?(?<!X)FAIL:?\s*", line)
-        if match and incheck:
-            total_tests += 1
-            total_fail += 1
-            continue
-
-        match = re.search(r"---\s+PASS|PASS\s+ ", line)
-        if match and incheck:
-            total_tests += 1
-            total_pass += 1
-            continue
-
-        # valgrind
-        # == 5 tests, 0 stderr failures, 1 stdout failure, 0 stderrB failures, 0 stdoutB failures, 0 post failures ==
-        # == 55 tests, 48 stderr failures, 6 stdout failures, 0 stderrB failures, 0 stdoutB failures, 0 post failures ==
-        # == 125 tests, 12 stderr failures, 0 stdout failures, 0 stderrB failures, 0 stdoutB failures, 0 post failures ==
-        match = re.search(r"\=\= ([0-9]+) tests?\, ([0-9]+) stderr failures?\, ([0-9]+) stdout failures?\, "
-                          r"([0-9]+) stderrB failures?\, ([0-9]+) stdoutB failures?\, ([0-9]+) post failures? \=\=", line)
-        if match and incheck:
-            total_tests += convert_int(match.group(1))
-            total_fail += (convert_int(match.group(2)) + convert_int(match.group(3)) + convert_int(match.group(4)) + convert_int(match.group(5)) + convert_int(match.group(6)))
-            total_pass += \
-                (convert_int(match.group(1)) - (convert_int(match.group(2)) + convert_int(match.group(3)) + convert_int(match.group(4)) + convert_int(match.group(5)) + convert_int(match.group(6))))
-            continue
-
-        # zsh
-        # **************************************
-        # 46 successful test scripts, 0 failures, 1 skipped
-        # **************************************
-        match = re.search(r"([0-9]+) successful test scripts\, ([0-9]+) failures\, ([0-9]+) skipped", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            total_fail += convert_int(match.group(2))
-            total_skip += convert_int(match.group(3))
-            continue
-
-        # glog
-        # Passed 3 tests
-        match = re.search(r"Passed ([0-9]+) tests", line)
-        if match and incheck:
-            total_pass += convert_int(match.group(1))
-            continue
-
-        # hdf5
-        # Testing h5repack h5repack_szip.h5 -f dset_szip:GZIP=1                  -SKIP-
-        # Verifying h5dump output -f GZIP=1 -m 1024                             *FAILED*
-        # Testing h5repack --metadata_block_size=8192                            PASSED
-        # Verifying h5diff output h5repack_layout.h5 out-meta_long.h5repack_layo PASSED
-        match = re.search(r"^Testing .+\ +PASSED$", line)
-        if match and incheck:
-            total_pass += 1
-            continue
-
-        match = re.search(r"^Verifying .+\ +PASSED$", line)
-        if match and incheck:
-            total_pass += 1
-            continue
-
-        match = re.search(r"^Testing .+\ +\-SKIP\-$", line)
-        if match and incheck:
-            total_skip += 1
-            continue
-
-        match = re.search(r"^Verifying .+\ +\-SKIP\-$", line)
-        if match and incheck:
-            total_skip += 1
-            continue
-
-        # libconfig
-        # 3 tests; 3 passed, 0 failed
-        match = re.search(r"^([0-9]+) tests; ([0-9]+) passed\, ([0-9]+) failed", line)
-        if match and incheck:
-            total_tests = convert_int(match.group(1))
-            total_pass = convert_int(match.group(2))
-            total_fail = convert_int(match.group(3))
-            continue
-
-        # libogg
-        # testing page spill expansion... 0, (0),  granule:0 1, (1),  granule:4103 2, (2),  granule:5127 ok.
-        # testing max packet segments... 0, (0),  granule:0 1, (1),  granule:261127 2, (2),  granule:262151 ok.
-        # testing very large packets... 0, (0),  granule:0 1, (1),  granule:1031 2, (2), 3, (3),  granule:4103 ok.
-        # testing continuation resync in very large packets... 0, 1, 2, (2), 3, (3),  granule:4103 ok.
-        # testing zero data page (1 nil packet)... 0, (0),  granule:0 1, (1),  granule:1031 2, (2),  granule:2055 ok.
-        # Testing search for capture... ok.
-        # Testing recapture... ok.
-        match = re.search(r"^[T,t]esting .*\ ok\.$", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        # libvorbis
-        #     vorbis_1ch_q-0.5_44100.ogg : ok
-        #     vorbis_2ch_q-0.5_44100.ogg : ok
-        #     ...
-        #     vorbis_7ch_q-0.5_44100.ogg : ok
-        #     vorbis_8ch_q-0.5_44100.ogg : ok
-        match = re.search(r"^\ \ \ \ vorbis_.*\.ogg\ \:\ ok$", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-        # pth
-        # OK - ALL TESTS SUCCESSFULLY PASSED.
-        match = re.search(r"^OK\ \-\ ALL\ TESTS\ SUCCESSFULLY\ PASSED\.$", line)
-        if match and incheck:
-            counted_pass += 1
-            continue
-
-    sanitize_counts()
-    collect_output()
-    return string_out()
+    start_log(pkgname)
+    for line in logreader.read_lines(log):
+        feed_line(line)
+    return finish_log()
 
 
 def string_out():
     """Output test result counts."""
-    retstr = ""
-    for key in sorted(testcount):
-        # key may be an empty string, which is fine since this is handled by
-        # the calling module
-        retstr += "{},{},{},{},{},{}\n".format(key,
-                                               testcount[key],
-                                               testpass[key],
-                                               testfail[key],
-                                               testskip[key],
-                                               testxfail[key])
+    return _counter.string_out()
+
 
-    return retstr.strip()  # strip trailing newline
+def count_log(log, detect=False):
+    """Return the counts of the log file at path log as CSV, with a fresh counter."""
+    counter = TestCounter(detect=detect)
+    for line in logreader.read_lines(log):
+        counter.feed_line(line)
+    return counter.finish_log()
+
+
+def count_logs(logs, jobs=None, detect=False):
+    """Yield (log, CSV) for every log file in logs, counted over a process pool."""
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        chunksize = max(1, len(logs) // (4 * (jobs or os.cpu_count() or 1)))
+        yield from zip(logs, pool.map(count_log, logs, [detect] * len(logs), chunksize=chunksize))
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument('logfile', help="path to log file to parse")
+    parser.add_argument('logfile', nargs='+', help="path to log file to parse")
+    parser.add_argument('-j', '--jobs', action='store', type=int, default=None,
+                        help="Number of worker processes counting logs, defaults to the number of CPUs")
+    parser.add_argument('--detect', action='store_true', default=False,
+                        help="Only try the rules of a section's format once it is clear")
     args = parser.parse_args()
-    result = parse_log(args.logfile)
-    print(result)
+    if len(args.logfile) == 1:
+        print(count_log(args.logfile[0], args.detect))
+    else:
+        # one CSV line per package, prefixed with the log it was counted in
+        for log, result in count_logs(args.logfile, args.jobs, args.detect):
+            for line in result.split("\n"):
+                print("{},{}".format(log, line))
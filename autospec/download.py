@@ -17,28 +17,69 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import hashlib
 import os
 import sys
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from io import BytesIO
 
 import pycurl
 from util import print_fatal
 
+# Concurrent transfers for fetch_all, in total and to any one host
+FETCH_JOBS = 8
+PER_HOST_LIMIT = 4
 
-def do_curl(url, dest=None, post=None, is_fatal=False):
-    """
-    Perform a curl operation for `url`.
+# worker_pool threads keep a curl handle, so connections to a host are reused
+_local = threading.local()
 
-    If `post` is set, a POST is performed for `url` with fields taken from the
-    specified value. Otherwise a GET is performed for `url`. If `dest` is set,
-    the curl response (if successful) is written to the specified path and the
-    path is returned. Otherwise a successful response is returned as a BytesIO
-    object. If `is_fatal` is `True` (`False` is the default), a GET failure,
-    POST failure, or a failure to write to the path specified for `dest`
-    results in the program exiting with an error. Otherwise, `None` is returned
-    for any of those error conditions.
+
+class _FileSink(object):
+    """Write a download to a file, hashing it on the way."""
+
+    def __init__(self, fp, hashers):
+        """Set up writing to fp and updating hashers."""
+        self.fp = fp
+        self.hashers = hashers
+        self.error = None
+
+    def write(self, data):
+        """Handle a block of data from curl."""
+        try:
+            self.fp.write(data)
+        except OSError as e:
+            self.error = e
+            # a short count makes curl abort the transfer
+            return 0
+        for hasher in self.hashers:
+            hasher.update(data)
+        return None
+
+
+def _hash_file(path, hashers):
+    """Feed the content of path to hashers."""
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(1024 * 1024), b""):
+            for hasher in hashers:
+                hasher.update(block)
+
+
+def _curl(url, writer, post=None, resume_from=0, if_range=None, headers=None):
+    """Fetch url into writer, raises pycurl.error on failure.
+
+    A transfer resumed at resume_from only continues if the file still
+    matches the validator if_range. The response header lines are appended
+    to headers.
     """
-    c = pycurl.Curl()
+    c = getattr(_local, "curl", None)
+    if c:
+        # reset the options but keep the connection cache
+        c.reset()
+    else:
+        c = pycurl.Curl()
     c.setopt(c.URL, url)
     if post:
         c.setopt(c.POSTFIELDS, post)
@@ -48,32 +89,209 @@ def do_curl(url, dest=None, post=None, is_fatal=False):
     c.setopt(c.TIMEOUT, 600)
     c.setopt(c.LOW_SPEED_LIMIT, 1)
     c.setopt(c.LOW_SPEED_TIME, 10)
-    buf = BytesIO()
-    c.setopt(c.WRITEDATA, buf)
+    if resume_from:
+        c.setopt(c.RESUME_FROM_LARGE, resume_from)
+        if if_range:
+            # a changed file comes whole instead, which curl fails on
+            c.setopt(c.HTTPHEADER, ["If-Range: " + if_range])
+    if headers is not None:
+        c.setopt(c.HEADERFUNCTION, headers.append)
+    c.setopt(c.WRITEDATA, writer)
     try:
         c.perform()
-    except pycurl.error as e:
-        if is_fatal:
-            print_fatal("Unable to fetch {}: {}".format(url, e))
-            sys.exit(1)
-        return None
     finally:
-        c.close()
+        if c is not getattr(_local, "curl", None):
+            c.close()
+
+
+def _validator(headers):
+    """Return the strong ETag, else the Last-Modified date, of the last response in headers."""
+    etag = modified = None
+    for raw in headers:
+        line = raw.decode("iso-8859-1").strip()
+        if line.startswith("HTTP/"):
+            # a redirect, only the final response counts
+            etag = modified = None
+        name, _, value = line.partition(":")
+        name = name.strip().lower()
+        value = value.strip()
+        if name == "etag" and not value.startswith("W/"):
+            etag = value
+        elif name == "last-modified":
+            modified = value
+    return etag or modified
+
+
+def _read_validator(path):
+    """Return the validator saved at path, or None."""
+    try:
+        with open(path, "r") as fp:
+            return fp.read().strip() or None
+    except OSError:
+        return None
+
+
+def _remove(path):
+    """Remove path if it exists."""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _fetch_failed(url, e, is_fatal):
+    """Report a failed transfer."""
+    if is_fatal:
+        print_fatal("Unable to fetch {}: {}".format(url, e))
+        sys.exit(1)
+    return None
+
+
+def _write_failed(dest, part, e, is_fatal):
+    """Report a failure to write dest, dropping the partial download."""
+    if os.path.exists(part):
+        os.unlink(part)
+    if is_fatal:
+        print_fatal("Unable to write to {}: {}".format(dest, e))
+        sys.exit(1)
+    return None
+
+
+def do_curl(url, dest=None, post=None, is_fatal=False, digests=None):
+    """
+    Perform a curl operation for `url`.
 
-    # write to dest if specified
-    if dest:
+    If `post` is set, a POST is performed for `url` with fields taken from the
+    specified value. Otherwise a GET is performed for `url`. If `dest` is set,
+    the curl response (if successful) is written to the specified path and the
+    path is returned. Otherwise a successful response is returned as a BytesIO
+    object. If `is_fatal` is `True` (`False` is the default), a GET failure,
+    POST failure, or a failure to write to the path specified for `dest`
+    results in the program exiting with an error. Otherwise, `None` is returned
+    for any of those error conditions.
+
+    A response for `dest` is streamed to `dest`.part, which is renamed to
+    `dest` once complete. A `dest`.part left behind by an interrupted transfer
+    is resumed with a range request, if the server gave an ETag or
+    Last-Modified date for it (kept in `dest`.part.validator) and the file
+    still matches it. Otherwise it is started over. `digests` is an
+    optional dict keyed by hashlib algorithm names, its values are set to
+    the hex digests of `dest`.
+    """
+    if not dest:
+        buf = BytesIO()
         try:
-            with open(dest, 'wb') as fp:
-                fp.write(buf.getvalue())
-        except IOError as e:
-            if os.path.exists(dest):
-                os.unlink(dest)
-            if is_fatal:
-                print_fatal("Unable to write to {}: {}".format(dest, e))
-                sys.exit(1)
-            return None
-
-    if dest:
-        return dest
-    else:
+            _curl(url, buf, post)
+        except pycurl.error as e:
+            return _fetch_failed(url, e, is_fatal)
         return buf
+
+    part = dest + ".part"
+    validator_path = part + ".validator"
+    try:
+        resume_from = 0 if post else os.path.getsize(part)
+    except OSError:
+        resume_from = 0
+    validator = _read_validator(validator_path) if resume_from else None
+    if not validator:
+        # without a validator the rest may be of another file
+        resume_from = 0
+
+    while True:
+        hashers = [hashlib.new(name) for name in digests or []]
+        headers = []
+        sink = None
+        try:
+            if resume_from:
+                _hash_file(part, hashers)
+            with open(part, "ab" if resume_from else "wb") as fp:
+                sink = _FileSink(fp, hashers)
+                _curl(url, sink, post, resume_from, validator, headers)
+        except pycurl.error as e:
+            if sink and sink.error:
+                return _write_failed(dest, part, sink.error, is_fatal)
+            if resume_from:
+                # the server refused the range or the file changed, start over
+                resume_from = 0
+                validator = None
+                _remove(validator_path)
+                continue
+            # anything received is kept for the next attempt to resume, if
+            # the server said how to tell the file has not changed since
+            validator = _validator(headers)
+            try:
+                if not os.path.getsize(part) or not validator:
+                    os.unlink(part)
+                else:
+                    with open(validator_path, "w") as fp:
+                        fp.write(validator + "\n")
+            except OSError:
+                pass
+            return _fetch_failed(url, e, is_fatal)
+        except IOError as e:
+            return _write_failed(dest, part, e, is_fatal)
+        break
+
+    try:
+        os.replace(part, dest)
+    except OSError as e:
+        return _write_failed(dest, part, e, is_fatal)
+    _remove(validator_path)
+
+    if digests is not None:
+        for name, hasher in zip(digests, hashers):
+            digests[name] = hasher.hexdigest()
+    return dest
+
+
+def _init_worker(handles):
+    """Give a worker thread its own curl handle, noting it in handles."""
+    _local.curl = pycurl.Curl()
+    handles.append(_local.curl)
+
+
+@contextmanager
+def worker_pool(jobs):
+    """Return a ThreadPoolExecutor of jobs threads that reuse curl handles.
+
+    Each thread keeps one handle, and with it its connections, for all the
+    transfers it runs. The handles are closed once the pool is shut down on
+    exit, which does not start the work still queued.
+    """
+    handles = []
+    pool = ThreadPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(handles,))
+    try:
+        yield pool
+    finally:
+        pool.shutdown(cancel_futures=True)
+        for handle in handles:
+            handle.close()
+
+
+def fetch_all(downloads, digests=(), is_fatal=False, jobs=FETCH_JOBS, per_host=PER_HOST_LIMIT):
+    """
+    Download the (url, dest) pairs in `downloads` concurrently.
+
+    At most `jobs` transfers run at a time, and at most `per_host` of them to
+    the same host. Yields (index, result, digests) for each download as soon
+    as it completes, where result is what do_curl returned and digests holds
+    the hex digests for the hashlib algorithms named in `digests`. With
+    `is_fatal` set, the first failure exits like do_curl does.
+    """
+    slots = {}
+    lock = threading.Lock()
+
+    def fetch(index, url, dest):
+        host = urllib.parse.urlsplit(url).netloc
+        with lock:
+            slot = slots.setdefault(host, threading.BoundedSemaphore(per_host))
+        found = dict.fromkeys(digests)
+        with slot:
+            result = do_curl(url, dest, is_fatal=is_fatal, digests=found)
+        return index, result, found
+
+    # on a fatal error the downloads still queued are not started
+    with worker_pool(jobs) as pool:
+        futures = [pool.submit(fetch, index, url, dest) for index, (url, dest) in enumerate(downloads)]
+        for future in as_completed(futures):
+            yield future.result()
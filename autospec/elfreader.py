@@ -0,0 +1,244 @@
+#!/bin/true
+#
+# elfreader.py - part of autospec
+# Copyright (C) 2016 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Minimal ELF reader for the ABI report: file type, SONAME, NEEDED entries
+# and the exported symbols, read straight from the dynamic section and
+# dynsym instead of running file, objdump, readelf and nm on every file.
+#
+
+import hashlib
+import mmap
+import os
+import struct
+
+ELF_MAGIC = b"\x7fELF"
+
+ET_EXEC = 2
+ET_DYN = 3
+
+SHT_DYNAMIC = 6
+SHT_NOTE = 7
+SHT_DYNSYM = 11
+
+SHF_EXECINSTR = 0x4
+
+SHN_UNDEF = 0
+SHN_LORESERVE = 0xff00
+SHN_ABS = 0xfff1
+
+DT_NULL = 0
+DT_NEEDED = 1
+DT_SONAME = 14
+DT_FLAGS_1 = 0x6ffffffb
+DF_1_PIE = 0x08000000
+
+STB_GLOBAL = 1
+STT_GNU_IFUNC = 10
+
+NT_GNU_BUILD_ID = 3
+
+# struct layouts per ELF class, without the byte order prefix
+LAYOUTS = {
+    1: {
+        "header": "HHIIIIIHHHHHH",
+        "section": "IIIIIIIIII",
+        "dyn": "iI",
+        "sym": "IIIBBH",
+    },
+    2: {
+        "header": "HHIQQQIHHHHHH",
+        "section": "IIQQQQIIQQ",
+        "dyn": "qQ",
+        "sym": "IBBHQQ",
+    },
+}
+
+
+class ElfFile(object):
+    """What the ABI report needs to know about an ELF file."""
+
+    def __init__(self, bits, elf_type):
+        """Set defaults for ElfFile."""
+        self.bits = bits
+        self.elf_type = elf_type
+        self.soname = None
+        self.needed = []
+        self.flags_1 = 0
+        # Symbols nm --defined-only -g --dynamic reports as A or T
+        self.symbols = set()
+
+    @property
+    def is_shared_object(self):
+        """Match what file(1) calls a shared object, PIE executables are not."""
+        return self.elf_type == ET_DYN and not self.flags_1 & DF_1_PIE
+
+    @property
+    def is_dynamic_binary(self):
+        """Match file(1) shared objects and executables."""
+        return self.elf_type in (ET_EXEC, ET_DYN)
+
+
+def _cstring(data, offset):
+    """Return the NUL terminated string at offset in data."""
+    end = data.find(b"\0", offset)
+    if end < 0:
+        end = len(data)
+    return data[offset:end].decode("utf-8", "replace")
+
+
+def _sections(data):
+    """Parse the ELF and section headers in data.
+
+    Returns (ElfFile, byte order, layout, sections) with each section as
+    (sh_type, sh_flags, sh_offset, sh_size, sh_link, sh_entsize), or None
+    if data is not ELF.
+    """
+    if len(data) < 16 or data[:4] != ELF_MAGIC:
+        return None
+    bits = data[4]
+    if bits not in LAYOUTS:
+        return None
+    order = "<" if data[5] == 1 else ">"
+    layout = LAYOUTS[bits]
+
+    header = struct.unpack_from(order + layout["header"], data, 16)
+    elf_type = header[0]
+    shoff = header[5]
+    shentsize, shnum = header[10:12]
+    elf = ElfFile(bits * 32, elf_type)
+
+    sections = []
+    section_fmt = order + layout["section"]
+    if shoff == 0 or shentsize < struct.calcsize(section_fmt):
+        return elf, order, layout, sections
+    if shnum == 0:
+        # more than SHN_LORESERVE sections, the count is in section 0
+        shnum = struct.unpack_from(section_fmt, data, shoff)[5]
+
+    for idx in range(shnum):
+        sec = struct.unpack_from(section_fmt, data, shoff + idx * shentsize)
+        sections.append((sec[1], sec[2], sec[4], sec[5], sec[6], sec[9]))
+    return elf, order, layout, sections
+
+
+def _section_data(data, sec):
+    """Return the content of section sec."""
+    return data[sec[2]:sec[2] + sec[3]]
+
+
+def _build_id(data, order, sections):
+    """Return the GNU build-id as hex, or None."""
+    for sec in sections:
+        if sec[0] != SHT_NOTE:
+            continue
+        note = _section_data(data, sec)
+        pos = 0
+        while pos + 12 <= len(note):
+            namesz, descsz, note_type = struct.unpack_from(order + "III", note, pos)
+            name_start = pos + 12
+            desc_start = name_start + (namesz + 3) // 4 * 4
+            if note_type == NT_GNU_BUILD_ID and note[name_start:name_start + namesz] == b"GNU\0":
+                return note[desc_start:desc_start + descsz].hex()
+            pos = desc_start + (descsz + 3) // 4 * 4
+    return None
+
+
+def _parse(data):
+    """Parse the ELF image in data, return an ElfFile or None."""
+    parsed = _sections(data)
+    if parsed is None:
+        return None
+    elf, order, layout, sections = parsed
+
+    dyn_fmt = order + layout["dyn"]
+    sym_fmt = order + layout["sym"]
+    for sec in sections:
+        sh_type, _, _, _, sh_link, sh_entsize = sec
+        if sh_type not in (SHT_DYNAMIC, SHT_DYNSYM) or sh_link >= len(sections):
+            continue
+        strtab = _section_data(data, sections[sh_link])
+        body = _section_data(data, sec)
+        if sh_type == SHT_DYNAMIC:
+            size = struct.calcsize(dyn_fmt)
+            for tag, val in struct.iter_unpack(dyn_fmt, body[:len(body) - len(body) % size]):
+                if tag == DT_NULL:
+                    break
+                if tag == DT_NEEDED:
+                    elf.needed.append(_cstring(strtab, val))
+                elif tag == DT_SONAME:
+                    elf.soname = _cstring(strtab, val)
+                elif tag == DT_FLAGS_1:
+                    elf.flags_1 = val
+        else:
+            size = struct.calcsize(sym_fmt)
+            if sh_entsize and sh_entsize != size:
+                continue
+            for sym in struct.iter_unpack(sym_fmt, body[:len(body) - len(body) % size]):
+                if elf.bits == 32:
+                    st_name, _, _, st_info, _, st_shndx = sym
+                else:
+                    st_name, st_info, _, st_shndx, _, _ = sym
+                if st_info >> 4 != STB_GLOBAL or st_info & 0xf == STT_GNU_IFUNC:
+                    continue
+                if st_shndx != SHN_ABS:
+                    # otherwise only defined symbols in code sections
+                    if st_shndx == SHN_UNDEF or st_shndx >= min(SHN_LORESERVE, len(sections)):
+                        continue
+                    if not sections[st_shndx][1] & SHF_EXECINSTR:
+                        continue
+                elf.symbols.add(_cstring(strtab, st_name))
+    return elf
+
+
+def _key(data):
+    """Return the content key of the ELF image in data, or None."""
+    parsed = _sections(data)
+    if parsed is None:
+        return None
+    _, order, _, sections = parsed
+    build_id = _build_id(data, order, sections)
+    if build_id:
+        return "build-id:{}:{}".format(build_id, len(data))
+    return "sha256:{}".format(hashlib.sha256(data).hexdigest())
+
+
+def _mapped(path, parse):
+    """Run parse on the mmapped content of path, None if it can't be read."""
+    try:
+        with open(path, "rb") as elf_file:
+            if os.fstat(elf_file.fileno()).st_size < 64:
+                return None
+            with mmap.mmap(elf_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return parse(data)
+    except (OSError, ValueError, struct.error, IndexError):
+        return None
+
+
+def read_elf(path):
+    """Read path in one pass, return an ElfFile or None if it is not ELF."""
+    return _mapped(path, _parse)
+
+
+def elf_key(path):
+    """Return a key for the content of path, or None if it is not ELF.
+
+    The GNU build-id identifies what was linked; with the file size added
+    it also tells stripped copies and separate debug files apart. Files
+    without a build-id are keyed by their sha256.
+    """
+    return _mapped(path, _key)
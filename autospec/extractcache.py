@@ -0,0 +1,116 @@
+#!/bin/true
+#
+# extractcache.py - part of autospec
+# Copyright (C) 2018 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Persistent extraction directory per package, reused by the next autospec
+# run when the archives and their layout are unchanged and nothing in the
+# extracted tree was touched since.
+#
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+
+MANIFEST_FILE = "manifest.json"
+# Bump when the manifest layout changes, older trees are then re-extracted
+CACHE_VERSION = 1
+
+
+def cache_key(pattern, sources):
+    """Return the key for extracting sources with the build pattern.
+
+    sources lists (url, destination, sha1) for the main source and every
+    archive, in order.
+    """
+    data = json.dumps([CACHE_VERSION, pattern, [list(src) for src in sources]])
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def snapshot(tree):
+    """Return {relative path: [mode, size, mtime_ns]} for everything in tree."""
+    entries = {}
+    stack = [tree]
+    while stack:
+        path = stack.pop()
+        with os.scandir(path) as scan:
+            for entry in scan:
+                st = entry.stat(follow_symlinks=False)
+                entries[os.path.relpath(entry.path, tree)] = [st.st_mode, st.st_size, st.st_mtime_ns]
+                if stat.S_ISDIR(st.st_mode):
+                    stack.append(entry.path)
+    return entries
+
+
+def _make_writable(func, path, _):
+    """Make the directory holding path writable and retry func, for rmtree."""
+    os.chmod(os.path.dirname(path), 0o755)
+    func(path)
+
+
+class ExtractCache(object):
+    """Extraction directory of one package that outlives the autospec run."""
+
+    def __init__(self, path, package_dir):
+        """Use the directory for package_dir under the cache root path."""
+        package_id = hashlib.sha1(os.path.abspath(package_dir).encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(path, package_id)
+        self.tree = os.path.join(self.path, "tree")
+        self.manifest = os.path.join(self.path, MANIFEST_FILE)
+        os.makedirs(self.tree, exist_ok=True)
+
+    def lookup(self, key):
+        """Return the recorded source details if the tree is reusable for key.
+
+        Returns None when the key differs or any file in the tree was added,
+        removed or changed in size or mtime since it was recorded.
+        """
+        try:
+            with open(self.manifest, "r") as manifest:
+                data = json.load(manifest)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION or data.get("key") != key:
+            return None
+        try:
+            if snapshot(self.tree) != data["files"]:
+                return None
+        except OSError:
+            return None
+        return data["sources"]
+
+    def reset(self):
+        """Empty the tree for a fresh extraction."""
+        if os.path.exists(self.manifest):
+            os.unlink(self.manifest)
+        if os.path.exists(self.tree):
+            # extracted directories may be read-only
+            shutil.rmtree(self.tree, onerror=_make_writable)
+        os.makedirs(self.tree, exist_ok=True)
+
+    def record(self, key, sources):
+        """Record the freshly extracted tree for key with the source details."""
+        data = {
+            "version": CACHE_VERSION,
+            "key": key,
+            "sources": sources,
+            "files": snapshot(self.tree),
+        }
+        with open(self.manifest + ".tmp", "w") as manifest:
+            json.dump(data, manifest, separators=(",", ":"))
+        os.replace(self.manifest + ".tmp", self.manifest)
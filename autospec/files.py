@@ -23,13 +23,223 @@ import os
 import re
 import mmap
 import subprocess
+import logpatterns
 import util
 from collections import OrderedDict
+from collections.abc import MutableSet
 from typing import List, Tuple
 
 from util import call, write_out, print_fatal, print_debug, print_info, scantree
 import sys
 
+# Files that are kept by a 32bit_only package
+ONLY32BIT_KEEP_PATS = [
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.so\."),
+    re.compile(r"^/(usr/|usr.*)lib32/lib(asm|dw|elf)-[0-9.]+\.so"),
+    re.compile(r"^/(usr/|usr.*)lib32/cmake/"),
+    re.compile(r"^/(usr/|usr.*)lib32/qt5/mkspecs/"),
+    re.compile(r"^/(usr/|usr.*)lib32/qt5/"),
+    re.compile(r"^/(usr/|usr.*)lib32/libkdeinit5_[a-zA-Z0-9\.\_\+\-]*\.so$"),
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.so$"),
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-\/]*\.a$"),
+    re.compile(r"^/(usr/|usr.*)lib32/haswell/[a-zA-Z0-9\.\_\+\-]*\.a$"),
+    re.compile(r"^/(usr/|usr.*)lib32/pkgconfig/[a-zA-Z0-9\.\_\+\-]*\.pc$"),
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.la$"),
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.prl$"),
+    re.compile(r"^/(usr/|usr.*)lib32/.*/[a-zA-Z0-9\.\_\+\-]*\.so"),
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$"),
+    re.compile(r"^/(usr/|usr.*)lib/[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$")]
+
+# Files that are kept by a compat package
+COMPAT_KEEP_PATS = [
+    re.compile(r"^/(usr/|usr.*)lib/[a-zA-Z0-9\.\_\-\+]*\.so\."),
+    re.compile(r"^/(usr/|usr.*)lib64/[a-zA-Z0-9\.\_\-\+]*\.so\."),
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\-\+]*\.so\."),
+    re.compile(r"^/(usr/|usr.*)lib64/lib(asm|dw|elf)-[0-9.]+\.so"),
+    re.compile(r"^/(usr/|usr.*)lib32/lib(asm|dw|elf)-[0-9.]+\.so"),
+    re.compile(r"^/(usr/|usr.*)lib64/haswell/[a-zA-Z0-9\.\_\-\+]*\.so\."),
+    re.compile(r"^/(usr/|usr.*)share/package-licenses/"),
+    re.compile(r"^/usr/share/locale/.*/(.*)\.mo")]
+
+# Static libraries also kept by a compat package with keepstatic
+COMPAT_STATIC_PATS = [
+    re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-\/]*\.a$"),
+    re.compile(r"^/(usr/|usr.*)lib32/haswell/[a-zA-Z0-9\.\_\+\-]*\.a$"),
+    re.compile(r"^/(usr/|usr.*)lib64/[a-zA-Z0-9\.\_\+\-\/]*\.a$"),
+    re.compile(r"^/(usr/|usr.*)lib64/haswell/[a-zA-Z0-9\.\_\+\-]*\.a$")]
+
+LOCALE_PAT = re.compile(r"^/usr/share/locale/.*/(.*)\.mo")
+AUTOSTART_PAT = re.compile(r"^/(usr/|usr.*)lib/systemd/system/.+\.target\.wants/.+")
+
+# Characters with a special meaning outside of a character class
+_META = set(".^$*+?{}[]()|\\")
+
+
+def _split_alternatives(pattern):
+    """Split pattern on its top-level "|", return None for an unbalanced pattern."""
+    alternatives = []
+    depth = 0
+    start = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "[":
+            # skip the character class, a leading "]" is part of it
+            i += 2 if pattern[i + 1:i + 2] == "^" else 1
+            i += 1 if pattern[i:i + 1] == "]" else 0
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            alternatives.append(pattern[start:i])
+            start = i + 1
+        i += 1
+    if depth != 0:
+        return None
+    alternatives.append(pattern[start:])
+    return alternatives
+
+
+def _literal_run(pattern):
+    """Return the literal text every match of pattern starts with."""
+    alternatives = _split_alternatives(pattern)
+    if alternatives is None:
+        return ""
+    if len(alternatives) > 1:
+        return os.path.commonprefix([_literal_run(alt) for alt in alternatives])
+    literal = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            atom = pattern[i + 1]
+            end = i + 2
+        elif char == "(" and not pattern.startswith("(?", i):
+            # a group only contributes the prefix its alternatives share,
+            # and ends the run unless it is entirely literal
+            depth = 0
+            end = i
+            while end < len(pattern):
+                if pattern[end] == "\\":
+                    end += 1
+                elif pattern[end] == "(":
+                    depth += 1
+                elif pattern[end] == ")":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                end += 1
+            if end >= len(pattern) or pattern[end + 1:end + 2] in ("*", "?", "{", "+"):
+                return literal
+            return literal + _literal_run(pattern[i + 1:end])
+        elif char in _META:
+            return literal
+        else:
+            atom = char
+            end = i + 1
+        if pattern[end:end + 1] in ("*", "?", "{", "+"):
+            return literal
+        literal += atom
+        i = end
+    return literal
+
+
+def literal_prefix(pattern):
+    """Return the literal prefix every filename matched by pattern starts with.
+
+    Only anchored patterns have one, "" is returned for everything else.
+    """
+    if not pattern.startswith("^"):
+        return ""
+    alternatives = _split_alternatives(pattern)
+    if alternatives is None or len(alternatives) > 1:
+        return ""
+    return _literal_run(pattern[1:])
+
+
+class FileClassifier(object):
+    """Find the first of an ordered list of file patterns matching a filename.
+
+    Every pattern is compiled once and indexed in a trie by its literal
+    prefix, so a filename is only tried against the patterns found along
+    its path through the trie. Those candidates are kept in list order and
+    skipped cheaply when the filename lacks a literal they require, so the
+    pattern returned is the one a plain loop over the list would stop at.
+    """
+
+    def __init__(self, patterns):
+        """Index patterns, a list of (pattern, args...) tuples."""
+        self.patterns = patterns
+        # node is [children, own candidates, candidates along the path]
+        self.root = [{}, [], None]
+        for idx, pat_args in enumerate(patterns):
+            node = self.root
+            for char in literal_prefix(pat_args[0]):
+                node = node[0].setdefault(char, [{}, [], None])
+            literal = logpatterns.required_literal(pat_args[0]) or ""
+            node[1].append((idx, literal, re.compile(pat_args[0])))
+
+    def match(self, filename):
+        """Return the (pattern, args...) tuple of the first match, or None."""
+        node = self.root
+        path = [node]
+        for char in filename:
+            node = node[0].get(char)
+            if node is None:
+                break
+            path.append(node)
+        node = path[-1]
+        if node[2] is None:
+            node[2] = sorted(cand for step in path for cand in step[1])
+        for idx, literal, pat in node[2]:
+            if literal in filename and pat.search(filename):
+                return self.patterns[idx]
+        return None
+
+
+class OrderedSet(MutableSet):
+    """Set that iterates in insertion order, for deterministic spec output."""
+
+    def __init__(self, iterable=()):
+        """Create the set from iterable."""
+        self._items = OrderedDict.fromkeys(iterable)
+
+    def __contains__(self, item):
+        """Check membership in constant time."""
+        return item in self._items
+
+    def __iter__(self):
+        """Iterate in insertion order."""
+        return iter(self._items)
+
+    def __len__(self):
+        """Return the number of items."""
+        return len(self._items)
+
+    def __repr__(self):
+        """Show the items in order."""
+        return "OrderedSet({})".format(list(self._items))
+
+    def add(self, item):
+        """Add item, keeping its first position if already present."""
+        self._items[item] = None
+
+    def discard(self, item):
+        """Remove item if present."""
+        self._items.pop(item, None)
+
+    def update(self, iterable):
+        """Add every item of iterable."""
+        for item in iterable:
+            self._items[item] = None
+
+
 class FileManager(object):
     """Class to handle spec file %files section management."""
 
@@ -41,7 +251,8 @@ class FileManager(object):
         self.subpackages = OrderedDict()  # per named sub-packaged (-n <name>)
         self.files = set()  # global file set to weed out dupes
         self.files_blacklist = set()
-        self.excludes = []
+        self.excludes = OrderedSet()
+        self.file_owners = {}  # filename-to-(sub)packages reverse index
         self.file_maps = {}  # Filename-to-package mapping
         self.setuid = []
         self.attrs = {}
@@ -58,6 +269,8 @@ class FileManager(object):
         self.mock_dir : str = mock_dir
         self.short_circuit : str = short_circuit
         self.package_name : str = str()
+        self._classifier = None
+        self._classifier_key = None
 
     @staticmethod
     def banned_path(path):
@@ -93,6 +306,7 @@ class FileManager(object):
                 g = self.attrs[filename][2]
                 filename = "%attr({0},{1},{2}) {3}".format(mod, u, g, filename)
             self.packages[package].add(filename)
+            self.index_file(filename, package, subpackage)
             self.package.must_restart += 1
             if not self.newfiles_printed:
                 print("  New %files content found")
@@ -114,35 +328,25 @@ class FileManager(object):
                 g = self.attrs[filename][2]
                 filename = "%attr({0},{1},{2}) {3}".format(mod, u, g, filename)
             self.subpackages[package].add(filename)
+            self.index_file(filename, package, subpackage)
             self.package.must_restart += 1
             if not self.newfiles_printed:
                 print("  New %files content found")
                 self.newfiles_printed = True
 
+    def index_file(self, filename, package, subpackage):
+        """Record that package (a subpackage if subpackage is set) holds filename."""
+        owners = self.file_owners.setdefault(filename, [])
+        if (package, subpackage) not in owners:
+            owners.append((package, subpackage))
+
     def only32bit_exclude(self, filename):
         """Exclude files not necessary for a 32bit only package."""
         if not self.config.config_opts.get("32bit_only"):
             return False
 
-        patterns = [
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.so\."),
-            re.compile(r"^/(usr/|usr.*)lib32/lib(asm|dw|elf)-[0-9.]+\.so"),
-            re.compile(r"^/(usr/|usr.*)lib32/cmake/"),
-            re.compile(r"^/(usr/|usr.*)lib32/qt5/mkspecs/"),
-            re.compile(r"^/(usr/|usr.*)lib32/qt5/"),
-            re.compile(r"^/(usr/|usr.*)lib32/libkdeinit5_[a-zA-Z0-9\.\_\+\-]*\.so$"),
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.so$"),
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-\/]*\.a$"),
-            re.compile(r"^/(usr/|usr.*)lib32/haswell/[a-zA-Z0-9\.\_\+\-]*\.a$"),
-            re.compile(r"^/(usr/|usr.*)lib32/pkgconfig/[a-zA-Z0-9\.\_\+\-]*\.pc$"),
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.la$"),
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-]*\.prl$"),
-            re.compile(r"^/(usr/|usr.*)lib32/.*/[a-zA-Z0-9\.\_\+\-]*\.so"),
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$"),
-            re.compile(r"^/(usr/|usr.*)lib/[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$")]
-
         exclude = True
-        for pat in patterns:
+        for pat in ONLY32BIT_KEEP_PATS:
             if pat.search(filename):
                 exclude = False
                 break
@@ -154,30 +358,14 @@ class FileManager(object):
         if not self.config.config_opts.get("compat"):
             return False
 
-        patterns = [
-            re.compile(r"^/(usr/|usr.*)lib/[a-zA-Z0-9\.\_\-\+]*\.so\."),
-            re.compile(r"^/(usr/|usr.*)lib64/[a-zA-Z0-9\.\_\-\+]*\.so\."),
-            re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\-\+]*\.so\."),
-            re.compile(r"^/(usr/|usr.*)lib64/lib(asm|dw|elf)-[0-9.]+\.so"),
-            re.compile(r"^/(usr/|usr.*)lib32/lib(asm|dw|elf)-[0-9.]+\.so"),
-            re.compile(r"^/(usr/|usr.*)lib64/haswell/[a-zA-Z0-9\.\_\-\+]*\.so\."),
-            re.compile(r"^/(usr/|usr.*)share/package-licenses/"),
-            re.compile(r"^/usr/share/locale/.*/(.*)\.mo")]
-
         exclude = True
-        for pat in patterns:
+        for pat in COMPAT_KEEP_PATS:
             if pat.search(filename):
                 exclude = False
                 break
 
         if self.config.config_opts.get("keepstatic"):
-            patterns_static = [
-                re.compile(r"^/(usr/|usr.*)lib32/[a-zA-Z0-9\.\_\+\-\/]*\.a$"),
-                re.compile(r"^/(usr/|usr.*)lib32/haswell/[a-zA-Z0-9\.\_\+\-]*\.a$"),
-                re.compile(r"^/(usr/|usr.*)lib64/[a-zA-Z0-9\.\_\+\-\/]*\.a$"),
-                re.compile(r"^/(usr/|usr.*)lib64/haswell/[a-zA-Z0-9\.\_\+\-]*\.a$")]
-
-            for pat in patterns_static:
+            for pat in COMPAT_STATIC_PATS:
                 if pat.search(filename):
                     exclude = False
                     break
@@ -191,37 +379,38 @@ class FileManager(object):
         If that file is also in the excludes list, prepend "%exclude " before pushing the filename.
         Returns True if a file was pushed, False otherwise.
         """
-        if not replacement:
-            replacement = prefix + filename
-
         # compat files should always be excluded
         if self.compat_exclude(filename):
-            self.excludes.append(filename)
+            self.excludes.add(filename)
             return True
 
         # non 32bit files should always be excluded when 32bit_only
         if self.only32bit_exclude(filename):
-            self.excludes.append(filename)
+            self.excludes.add(filename)
             return True
 
-        pat = re.compile(pattern)
-        match = pat.search(filename)
-        if match:
-            if filename in self.excludes:
-                return True
-
-            self.push_package_file(replacement, package, subpackage)
+        if re.search(pattern, filename):
+            self.push_matched_file(filename, pattern, package, replacement, prefix, subpackage)
             return True
         else:
             return False
 
+    def push_matched_file(self, filename, pattern, package, replacement="", prefix="", subpackage=False):
+        """Push filename, that matched pattern, unless it is excluded."""
+        if not replacement:
+            replacement = prefix + filename
+
+        if filename in self.excludes:
+            return
+
+        self.push_package_file(replacement, package, subpackage)
+
     def file_is_locale(self, filename):
         """If a file is a locale, appends to self.locales and returns True, returns False otherwise."""
-        pat = re.compile(r"^/usr/share/locale/.*/(.*)\.mo")
-        match = pat.search(filename)
+        match = LOCALE_PAT.search(filename)
         if match:
             if self.config.config_opts["exclude_locales"]:
-                self.excludes.append(filename)
+                self.excludes.add(filename)
                 return True
             lang = match.group(1)
             if lang not in self.locales and filename not in self.excludes:
@@ -300,16 +489,46 @@ class FileManager(object):
             return
 
         # autostart
-        part = re.compile(r"^/(usr/|usr.*)lib/systemd/system/.+\.target\.wants/.+")
-        if part.search(filename) and 'update-triggers.target.wants' not in filename:
+        if AUTOSTART_PAT.search(filename) and 'update-triggers.target.wants' not in filename:
             if filename not in self.excludes:
                 self.push_package_file(filename, "autostart")
                 self.push_package_file("%exclude " + filename, "services")
                 return
 
-        if self.want_dev_split and self.file_pat_match(filename, r"^/usr/.*/include/.*\.(h|hpp)$", "dev"):
+        # compat files should always be excluded, and non 32bit files
+        # should always be excluded when 32bit_only
+        if self.compat_exclude(filename) or self.only32bit_exclude(filename):
+            self.excludes.add(filename)
+            return
+
+        pat_args = self.file_classifier(pkg_name).match(filename)
+        if pat_args:
+            self.push_matched_file(filename, *pat_args)
+            return
+
+        if filename in self.excludes:
             return
 
+        self.push_package_file(filename)
+
+    def file_classifier(self, pkg_name):
+        """Return the compiled FileClassifier for the file_patterns table.
+
+        The table only changes with the package name and a few options, so
+        it is built and compiled once rather than for every file.
+        """
+        key = (pkg_name, self.package_name, bool(self.config.config_opts.get('so_to_lib')), self.want_dev_split)
+        if self._classifier_key != key:
+            self._classifier = FileClassifier(self.file_patterns(pkg_name))
+            self._classifier_key = key
+        return self._classifier
+
+    def file_patterns(self, pkg_name):
+        """Return the ordered (pattern, package, ...) table used by push_file.
+
+        Order matters, first match wins: the dev split comes first, then the
+        rules specific to package_name and finally the general rules.
+        """
         # if configured to do so, add .so files to the lib package instead of
         # the dev package. THis is useful for packages with a plugin
         # architecture like elfutils and mesa.
@@ -489,9 +708,7 @@ class FileManager(object):
 
                 (r"^/usr/share/man/man\d/[a-zA-Z0-9\.\_\+\-]*\.\d$", "doc"),
                 (r"^/usr/share/info/[a-zA-Z0-9\.\_\+\-\/]*\.info$", "doc")]
-            for pat_args in patterns_gcc:
-                if self.file_pat_match(filename, *pat_args):
-                    return
+            patterns = patterns_gcc + patterns
 
         if self.package_name == "db":
             patterns_db = [
@@ -500,9 +717,7 @@ class FileManager(object):
                 # order matters, first match wins!
                 (r"^/usr/lib/rpm[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$", "main"),
                 (r"/usr/lib64/libdb_cxx(?:\-5\.(?:3\.)?|\.)so", "cxx")]
-            for pat_args in patterns_db:
-                if self.file_pat_match(filename, *pat_args):
-                    return
+            patterns = patterns_db + patterns
 
         if self.package_name == "nss":
             patterns_nss = [
@@ -512,9 +727,7 @@ class FileManager(object):
                 (r"^/usr/lib/rpm[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$", "main"),
                 (r"/usr/lib64/lib(?:(?:softokn|freebl)3\.chk|(?:softokn|freebl)3\.so|nss(?:dbm3\.(?:chk|so)|(?:util)?3\.so)|s(?:mime|sl)3\.so)", "lib"),
                 (r"/usr/lib32/lib(?:(?:softokn|freebl)3\.chk|(?:softokn|freebl)3\.so|nss(?:dbm3\.(?:chk|so)|(?:util)?3\.so)|s(?:mime|sl)3\.so)", "lib32")]
-            for pat_args in patterns_nss:
-                if self.file_pat_match(filename, *pat_args):
-                    return
+            patterns = patterns_nss + patterns
 
         if self.package_name == "ncurses":
             patterns_ncurses = [
@@ -525,9 +738,7 @@ class FileManager(object):
                 (r"^/usr/lib64/libncurses\+\+w?\.so\.6(?:\.2)?$", "lib-plusplus"),
                 (r"^/usr/lib64/lib(?:ncurses\.so\.6(?:\.2)?|(?:panel|tinfo|form|menu)\.so\.6(?:\.2)?)$", "lib-narrow"),
                 (r"^/usr/share/terminfo/i/ibm.*$", "data-rare")]
-            for pat_args in patterns_ncurses:
-                if self.file_pat_match(filename, *pat_args):
-                    return
+            patterns = patterns_ncurses + patterns
 
         if self.package_name == "glibc":
             patterns_glibc = [
@@ -565,9 +776,7 @@ class FileManager(object):
                 (r"^/usr/bin/makedb$", "extras"),
                 (r"^/usr/bin/bench-[a-zA-Z0-9\.\_\+\-\/]*", "bench"),
                 (r"^/usr/lib64/glibc/benchmarks/[a-zA-Z0-9\.\_\+\-\/]*", "bench")]
-            for pat_args in patterns_glibc:
-                if self.file_pat_match(filename, *pat_args):
-                    return
+            patterns = patterns_glibc + patterns
 
         if self.package_name == "gmp":
             patterns_gmp = [
@@ -576,18 +785,12 @@ class FileManager(object):
                 # order matters, first match wins!
                 (r"^/usr/lib/rpm[a-zA-Z0-9\.\_\+\-\/]*/[a-zA-Z0-9\.\_\+\-\/]*$", "main"),
                 (r"^/usr/lib64/haswell/libgmp\.so\.(?:[0-9\.])*$", "lib-hsw")]
-            for pat_args in patterns_gmp:
-                if self.file_pat_match(filename, *pat_args):
-                    return
+            patterns = patterns_gmp + patterns
 
-        for pat_args in patterns:
-            if self.file_pat_match(filename, *pat_args):
-                return
+        if self.want_dev_split:
+            patterns.insert(0, (r"^/usr/.*/include/.*\.(h|hpp)$", "dev"))
 
-        if filename in self.excludes:
-            return
-
-        self.push_package_file(filename)
+        return patterns
 
     def write_cargo_find_install_assets(self, content_name: str):
         """ Find custom assets to install such as docs, shell completion, etc """
@@ -811,14 +1014,11 @@ class FileManager(object):
             self.files.remove(filename)
             print("File no longer present: {}".format(filename))
             hit = True
-        for pkg in self.packages:
-            if filename in self.packages[pkg]:
-                self.packages[pkg].remove(filename)
-                print("File no longer present in {}: {}".format(pkg, filename))
-                hit = True
-        for pkg in self.subpackages:
-            if filename in self.subpackages[pkg]:
-                self.subpackages[pkg].remove(filename)
+        for pkg, subpackage in self.file_owners.pop(filename, []):
+            pkgs = self.subpackages if subpackage else self.packages
+            # the (sub)package may have dropped it since, see _clean_dirs
+            if filename in pkgs.get(pkg, ()):
+                pkgs[pkg].remove(filename)
                 print("File no longer present in {}: {}".format(pkg, filename))
                 hit = True
         if hit:
@@ -19,17 +19,151 @@
 # Commit to git
 #
 
+import fcntl
 import glob
+import hashlib
+import json
 import os
+import shutil
 import sys
 import subprocess
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import archive
 import util
 import natsort
 import fastnumbers
 import validators
 from util import call, write_out, print_fatal, print_debug, print_info
 
+# Version in a tag name, optionally after a name- or v prefix
+SEMVER_RE = re.compile(r"(?:^(?:[a-zA-Z]+[0-9]?[a-zA-Z0-9]*[\-]+)?|^(?:[vV]+)?)(0|[1-9]\d*)(?:\.|\_)(0|[1-9]\d*)?(?:(?:\.|\_)(0|[1-9]\d*))?(?:(?:\.|\_)(0|[1-9]\d*))?((?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*))*)?(?:\-((?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*))*))?([a-zA-Z0-9\_\.\-]+)?", re.MULTILINE)
+TAG_REF_RE = re.compile(r"(?<=refs\/tags\/).*", re.MULTILINE)
+# Tags that are dates or plain names rather than versions
+DEFAULT_TAG_SKIP = r"(?:^\d{8,8})|(?:^[a-zA-Z]+[-_.]+[a-zA-Z]+)"
+DEFAULT_TAG_SKIP_RE = re.compile(DEFAULT_TAG_SKIP, re.MULTILINE)
+
+REFS_CACHE_FILE = "git_refs.json"
+# Bump when the cache layout changes, older caches are then dropped
+REFS_CACHE_VERSION = 1
+# How long the tags listed by a remote are reused, in seconds
+REFS_CACHE_INTERVAL = 60 * 60
+
+# RefsCache shared by find_version_git, None to always ask the remotes
+refs_cache = None
+
+# Directory of the bare mirrors git_clone clones from, None to clone directly
+mirrors_dir = None
+# Partial clone filter (e.g. blob:none) and depth of new mirrors and fetches
+mirror_filter = None
+mirror_depth = None
+# Refs kept in the mirrors, not the pull requests and such of --mirror
+MIRROR_REFSPECS = ["+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"]
+# Codec, level and threads of the archives made from git sources, the
+# defaults of archive.write_archive if None
+archive_codec = "gzip"
+archive_level = None
+archive_threads = None
+# Archive clones without submodules with git archive, leaving out .git
+archive_use_git = False
+
+
+def cache_path(name):
+    """Return the path of name in the autospec directory of the XDG cache home."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "autospec", name)
+
+
+class RefsCache(object):
+    """Tag listings of git remotes kept on disk for a limited time.
+
+    Entries hold the `git ls-remote` output of a remote URL with the time it
+    was listed and are reused for interval seconds.
+    """
+
+    def __init__(self, path=None, interval=REFS_CACHE_INTERVAL):
+        """Load the cache stored at path, the XDG cache home by default."""
+        self.path = path or cache_path(REFS_CACHE_FILE)
+        self.interval = interval
+        self.entries = {}  # url -> [time listed, listing]
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """Read the cache file, starting empty if it is missing or stale."""
+        try:
+            with open(self.path, "r") as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == REFS_CACHE_VERSION:
+            self.entries = data.get("remotes", {})
+
+    def get(self, url):
+        """Return the listing of url if it is recent enough, else None."""
+        with self.lock:
+            entry = self.entries.get(url)
+        if entry and 0 <= time.time() - entry[0] < self.interval:
+            return entry[1]
+        return None
+
+    def put(self, url, listing):
+        """Remember the listing of url as of now."""
+        with self.lock:
+            self.entries[url] = [time.time(), listing]
+            self.dirty = True
+
+    def save(self):
+        """Write the cache file atomically, dropping expired entries.
+
+        The cache is only an optimization, failing to write it is not an
+        error.
+        """
+        if not self.dirty:
+            return
+        now = time.time()
+        with self.lock:
+            remotes = {url: entry for url, entry in self.entries.items() if now - entry[0] < self.interval}
+        tmp = "{}.{}.tmp".format(self.path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, "w") as cache_file:
+                json.dump({"version": REFS_CACHE_VERSION, "remotes": remotes}, cache_file)
+            os.replace(tmp, self.path)
+            self.dirty = False
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+
+def ls_remote_tags(remote_url, clone_path):
+    """Return the tags listed by git ls-remote for remote_url.
+
+    The listing is taken from refs_cache while it is recent enough.
+    """
+    if refs_cache is not None:
+        listing = refs_cache.get(remote_url)
+        if listing is not None:
+            if util.debugging:
+                print_debug(f"Tags of {remote_url} from the cache")
+            return listing
+    process = subprocess.run(
+        f"git ls-remote --refs --tags {remote_url}",
+        check=False,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        universal_newlines=True,
+        cwd=clone_path,
+    )
+    if refs_cache is not None and process.returncode == 0:
+        refs_cache.put(remote_url, process.stdout)
+    return process.stdout
+
 
 def get_git_remote_url(target, clone_path):
     """Get the remote url for a targeted git repository."""
@@ -109,7 +243,7 @@ def git_describe(clone_path):
     git_describe_cmd1_result = process.stdout
 
     if git_describe_cmd1_result:
-        git_describe_cmd2_re1 = re.compile(r"(?:^(?:[a-zA-Z]+[0-9]?[a-zA-Z0-9]*[\-]+)?|^(?:[vV]+)?)(0|[1-9]\d*)(?:\.|\_)(0|[1-9]\d*)?(?:(?:\.|\_)(0|[1-9]\d*))?(?:(?:\.|\_)(0|[1-9]\d*))?((?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*))*)?(?:\-((?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*))*))?([a-zA-Z0-9\_\.\-]+)?", re.MULTILINE)
+        git_describe_cmd2_re1 = SEMVER_RE
         git_describe_cmd2_re1_result = git_describe_cmd2_re1.search(git_describe_cmd1_result)
         if git_describe_cmd2_re1_result:
             if util.debugging:
@@ -129,26 +263,28 @@ def git_describe(clone_path):
             return outputVersion1
 
 
-def git_ls_remote_custom_re(remote_url_cmd, clone_path, path, conf):
+def git_ls_remote_custom_re(remote_url_cmd, clone_path, path, conf, listing=None):
     git_ls_remote_cmd1_result = ""
     git_ls_remote_cmd1_re1_result_pre_sort = []
     git_ls_remote_cmd1_re1_result_sorted = []
 
-    process = subprocess.run(
-        remote_url_cmd,
-        check=False,
-        shell=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        universal_newlines=True,
-        cwd=clone_path,
-    )
-    git_ls_remote_cmd1_result = process.stdout
+    if listing is None:
+        process = subprocess.run(
+            remote_url_cmd,
+            check=False,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            universal_newlines=True,
+            cwd=clone_path,
+        )
+        listing = process.stdout
+    git_ls_remote_cmd1_result = listing
 
     git_ls_remote_cmd1_re1_result = []
     if git_ls_remote_cmd1_result:
-        git_ls_remote_cmd1_re1 = re.compile(r"(?<=refs\/tags\/).*", re.MULTILINE)
+        git_ls_remote_cmd1_re1 = TAG_REF_RE
         git_ls_remote_cmd1_re1_result = git_ls_remote_cmd1_re1.findall(git_ls_remote_cmd1_result)
         if util.debugging:
             if git_ls_remote_cmd1_re1_result:
@@ -191,26 +327,28 @@ def git_ls_remote_custom_re(remote_url_cmd, clone_path, path, conf):
         return ""
 
 
-def git_ls_remote(remote_url_cmd, clone_path, path, conf):
+def git_ls_remote(remote_url_cmd, clone_path, path, conf, listing=None):
     git_ls_remote_cmd1_result = ""
     git_ls_remote_cmd1_re1_result_pre_sort = []
     git_ls_remote_cmd1_re1_result_sorted = []
 
-    process = subprocess.run(
-        remote_url_cmd,
-        check=False,
-        shell=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        universal_newlines=True,
-        cwd=clone_path,
-    )
-    git_ls_remote_cmd1_result = process.stdout
+    if listing is None:
+        process = subprocess.run(
+            remote_url_cmd,
+            check=False,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            universal_newlines=True,
+            cwd=clone_path,
+        )
+        listing = process.stdout
+    git_ls_remote_cmd1_result = listing
 
     git_ls_remote_cmd1_re1_result = []
     if git_ls_remote_cmd1_result:
-        git_ls_remote_cmd1_re1 = re.compile(r"(?<=refs\/tags\/).*", re.MULTILINE)
+        git_ls_remote_cmd1_re1 = TAG_REF_RE
         git_ls_remote_cmd1_re1_result = git_ls_remote_cmd1_re1.findall(git_ls_remote_cmd1_result)
         if util.debugging:
             if git_ls_remote_cmd1_re1_result:
@@ -219,7 +357,7 @@ def git_ls_remote(remote_url_cmd, clone_path, path, conf):
 
         if git_ls_remote_cmd1_re1_result:
             git_ls_remote_cmd1_re2_result_delete = []
-            default_re = r"(?:^\d{8,8})|(?:^[a-zA-Z]+[-_.]+[a-zA-Z]+)"
+            default_re = DEFAULT_TAG_SKIP
             if conf.custom_git_re:
                 if util.debugging:
                     print_debug(f"conf.custom_git_re: {conf.custom_git_re}")
@@ -232,7 +370,7 @@ def git_ls_remote(remote_url_cmd, clone_path, path, conf):
                         print_fatal(f"Unable to create custom git regex: {err}")
                 print_info(f"Custom git regex: {git_ls_remote_cmd1_re2.pattern}")
             else:
-                git_ls_remote_cmd1_re2 = re.compile(default_re, re.MULTILINE)
+                git_ls_remote_cmd1_re2 = DEFAULT_TAG_SKIP_RE
             if util.debugging:
                 print_debug("Reverse: '{git_ls_remote_cmd1_re2}':")
             for i, r in enumerate(git_ls_remote_cmd1_re1_result):
@@ -249,9 +387,9 @@ def git_ls_remote(remote_url_cmd, clone_path, path, conf):
 
         if git_ls_remote_cmd1_re1_result:
             git_ls_remote_cmd1_re3_result_delete = []
-            git_ls_remote_cmd1_re3 = re.compile(r"(?:^(?:[a-zA-Z]+[0-9]?[a-zA-Z0-9]*[\-]+)?|^(?:[vV]+)?)(0|[1-9]\d*)(?:\.|\_)(0|[1-9]\d*)?(?:(?:\.|\_)(0|[1-9]\d*))?(?:(?:\.|\_)(0|[1-9]\d*))?((?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*))*)?(?:\-((?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*))*))?([a-zA-Z0-9\_\.\-]+)?", re.MULTILINE)
+            git_ls_remote_cmd1_re3 = SEMVER_RE
             if util.debugging:
-                print_debug("'(?:^(?:[a-zA-Z]+[0-9]?[a-zA-Z0-9]*[\-]+)?|^(?:[vV]+)?)(0|[1-9]\d*)(?:\.|\_)(0|[1-9]\d*)?(?:(?:\.|\_)(0|[1-9]\d*))?(?:(?:\.|\_)(0|[1-9]\d*))?((?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*))*)?(?:\-((?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*))*))?([a-zA-Z0-9\_\.\-]+)?':")
+                print_debug(f"'{SEMVER_RE.pattern}':")
             for i, r in enumerate(git_ls_remote_cmd1_re1_result):
                 git_ls_remote_cmd1_re3_result = git_ls_remote_cmd1_re3.search(r)
                 if not git_ls_remote_cmd1_re3_result:
@@ -265,7 +403,7 @@ def git_ls_remote(remote_url_cmd, clone_path, path, conf):
                     print_debug(r)
 
         if git_ls_remote_cmd1_re1_result:
-            git_ls_remote_cmd1_re4 = re.compile(r"(?:^(?:[a-zA-Z]+[0-9]?[a-zA-Z0-9]*[\-]+)?|^(?:[vV]+)?)(0|[1-9]\d*)(?:\.|\_)(0|[1-9]\d*)?(?:(?:\.|\_)(0|[1-9]\d*))?(?:(?:\.|\_)(0|[1-9]\d*))?((?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*))*)?(?:\-((?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z][0-9a-zA-Z]*))*))?([a-zA-Z0-9\_\.\-]+)?", re.MULTILINE)
+            git_ls_remote_cmd1_re4 = SEMVER_RE
             for r in git_ls_remote_cmd1_re1_result:
                 git_ls_remote_cmd1_re4_result = git_ls_remote_cmd1_re4.search(r)
                 if git_ls_remote_cmd1_re4_result:
@@ -308,20 +446,21 @@ def find_version_git(url, clone_path, path, conf):
     outputDateVersion = ""
     outputVersionFinal = ""
 
-    if conf.custom_git_re2:
-        outputVersion1 = git_describe_custom_re(clone_path=clone_path, conf=conf)
-    else:
-        outputVersion1 = git_describe(clone_path=clone_path)
-    if remote_url_origin:
+    # List the tags of both remotes concurrently, while describing locally
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        listing_origin = pool.submit(ls_remote_tags, remote_url_origin, clone_path) if remote_url_origin else None
+        listing_insilications = pool.submit(ls_remote_tags, remote_url_insilications, clone_path) if remote_url_insilications else None
         if conf.custom_git_re2:
-            outputVersion2 = git_ls_remote_custom_re(remote_url_cmd=git_tag_version_cmd2, clone_path=clone_path, path=path, conf=conf)
+            outputVersion1 = git_describe_custom_re(clone_path=clone_path, conf=conf)
         else:
-            outputVersion2 = git_ls_remote(remote_url_cmd=git_tag_version_cmd2, clone_path=clone_path, path=path, conf=conf)
+            outputVersion1 = git_describe(clone_path=clone_path)
+    if refs_cache is not None:
+        refs_cache.save()
+    ls_remote_parse = git_ls_remote_custom_re if conf.custom_git_re2 else git_ls_remote
+    if remote_url_origin:
+        outputVersion2 = ls_remote_parse(remote_url_cmd=git_tag_version_cmd2, clone_path=clone_path, path=path, conf=conf, listing=listing_origin.result())
     if remote_url_insilications:
-        if conf.custom_git_re2:
-            outputVersion3 = git_ls_remote_custom_re(remote_url_cmd=git_tag_version_cmd3, clone_path=clone_path, path=path, conf=conf)
-        else:
-            outputVersion3 = git_ls_remote(remote_url_cmd=git_tag_version_cmd3, clone_path=clone_path, path=path, conf=conf)
+        outputVersion3 = ls_remote_parse(remote_url_cmd=git_tag_version_cmd3, clone_path=clone_path, path=path, conf=conf, listing=listing_insilications.result())
 
     outputVersionCompare = []
     outputVersionCompareSorted = []
@@ -374,9 +513,100 @@ def remove_clone_archive(path, clone_path, is_fatal):
             print_fatal("Unable to remove {}: {}".format(clone_path, err))
 
 
-def git_clone(url, path, cmd_args, clone_path, force_module, force_fullclone, is_fatal=True):
+def mirror_path(url):
+    """Return where the bare mirror of url is kept."""
+    name = os.path.basename(url.rstrip("/"))
+    if not name.endswith(".git"):
+        name += ".git"
+    return os.path.join(mirrors_dir, "{}-{}".format(hashlib.sha1(url.encode("utf-8")).hexdigest()[:12], name))
+
+
+def update_mirror(url):
+    """Create or update the bare mirror of url, fetching only new objects.
+
+    Only branches and tags are mirrored. Returns the path of the mirror.
+    Concurrent runs wait for each other.
+    """
+    mirror = mirror_path(url)
+    depth = f" --depth={mirror_depth}" if mirror_depth else ""
+    os.makedirs(mirrors_dir, exist_ok=True)
+    with open(mirror + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.isdir(mirror):
+            print_info(f"git fetch --prune{depth} {url}")
+            call(f"git fetch --prune{depth} origin", cwd=mirror)
+        else:
+            partial = f" --filter={mirror_filter}" if mirror_filter else ""
+            print_info(f"git fetch{partial}{depth} {url}")
+            # create aside, a failed fetch must not look like a mirror
+            if os.path.isdir(mirror + ".tmp"):
+                shutil.rmtree(mirror + ".tmp")
+            call(f"git init -q --bare {mirror}.tmp")
+            call(f"git remote add origin {url}", cwd=mirror + ".tmp")
+            call("git config --unset-all remote.origin.fetch", cwd=mirror + ".tmp")
+            for refspec in MIRROR_REFSPECS:
+                call(f"git config --add remote.origin.fetch {refspec}", cwd=mirror + ".tmp")
+            if mirror_filter:
+                call("git config core.repositoryformatversion 1", cwd=mirror + ".tmp")
+                call("git config extensions.partialClone origin", cwd=mirror + ".tmp")
+                call("git config remote.origin.promisor true", cwd=mirror + ".tmp")
+                call(f"git config remote.origin.partialclonefilter {mirror_filter}", cwd=mirror + ".tmp")
+            call(f"git fetch -q{partial}{depth} origin", cwd=mirror + ".tmp")
+            os.rename(mirror + ".tmp", mirror)
+    return mirror
+
+
+def backfill_mirror(mirror, rev):
+    """Fetch the objects of rev a partial mirror lacks into the mirror.
+
+    Checkouts from the mirror then find them locally, this run and the
+    next, instead of each fetching them from upstream.
+    """
+    process = subprocess.run(["git", "rev-list", "--objects", "--missing=print", rev], cwd=mirror,
+                             stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    missing = [line[1:] for line in process.stdout.splitlines() if line.startswith("?")]
+    if not missing:
+        return
+    print_info(f"Fetching {len(missing)} missing objects of {rev} into {mirror}")
+    # the same request git makes when a promisor fills in missing objects
+    subprocess.run(["git", "-c", "fetch.negotiationAlgorithm=noop", "fetch", "-q", "origin", "--no-tags",
+                    "--no-write-fetch-head", "--recurse-submodules=no", f"--filter={mirror_filter}", "--stdin"],
+                   cwd=mirror, input="\n".join(missing) + "\n", universal_newlines=True, check=True)
+
+
+def clone_from_mirror(url, path, branch, name, force_module, force_fullclone):
+    """Clone branch of url as path/name from the mirror of url.
+
+    The clone is local, so only what the mirror lacks comes from the
+    network, and a partial mirror is filled in with what the checkout
+    needs first. It ends up with url as its origin, like a direct clone.
+    """
+    mirror = update_mirror(url)
+    if mirror_filter:
+        with open(mirror + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            backfill_mirror(mirror, branch or "HEAD")
+    clone_path = os.path.join(path, name)
+    single_branch = "" if force_fullclone is True else " --single-branch"
+    call(f"git clone --no-checkout{single_branch} --branch={branch} {mirror} {name}", cwd=path)
+    call(f"git remote set-url origin {url}", cwd=clone_path)
+    if mirror_filter:
+        # whatever the mirror still lacks comes from upstream
+        call("git config remote.origin.promisor true", cwd=clone_path)
+        call(f"git config remote.origin.partialclonefilter {mirror_filter}", cwd=clone_path)
+        call("git config extensions.partialClone origin", cwd=clone_path)
+    call("git reset -q --hard", cwd=clone_path)
+    if force_module is not True:
+        shallow = " --depth=1" if force_fullclone is not True else ""
+        call(f"git submodule update --init --recursive -j8{shallow}", cwd=clone_path)
+
+
+def git_clone(url, path, cmd_args, clone_path, force_module, force_fullclone, is_fatal=True, branch=None, name=None):
+    """Clone url, through its mirror in mirrors_dir if branch and name are given."""
     try:
-        if force_module is True:
+        if mirrors_dir and name:
+            clone_from_mirror(url, path, branch, name, force_module, force_fullclone)
+        elif force_module is True:
             if force_fullclone is True:
                 print_info(f"git clone -j8 --branch={cmd_args}")
                 call(f"git clone -j8 --branch={cmd_args}", cwd=path)
@@ -408,7 +638,7 @@ def git_archive_all(path, name, url, branch, force_module, force_fullclone, conf
 
     is_url = validators.url(url)
     if is_url is True:
-        git_clone(url=url, path=path, cmd_args=cmd_args, clone_path=clone_path, force_module=force_module, force_fullclone=force_fullclone, is_fatal=is_fatal)
+        git_clone(url=url, path=path, cmd_args=cmd_args, clone_path=clone_path, force_module=force_module, force_fullclone=force_fullclone, is_fatal=is_fatal, branch=branch, name=name)
         try:
             outputVersion = find_version_git(url=url, clone_path=clone_path, path=path, conf=conf)
         except:
@@ -420,26 +650,20 @@ def git_archive_all(path, name, url, branch, force_module, force_fullclone, conf
         if not outputVersion.startswith("v") and not outputVersion.startswith("V"):
             outputVersion = f"v{outputVersion}"
 
-        clone_file = f"{name}-{outputVersion}.tar.gz"
-        absolute_file_path = os.path.abspath(clone_file)
+        clone_file = f"{name}-{outputVersion}{archive.CODECS[archive_codec][0]}"
+        absolute_file_path = os.path.abspath(os.path.join(path, clone_file))
         absolute_url_file = f"file://{absolute_file_path}"
         if util.debugging:
             print_debug(f"{clone_file}")
             print_debug(f"clone_path: {clone_path}")
             print_debug(f"absolute_file_path: {absolute_file_path}")
             print_debug(f"absolute_url_file: {absolute_url_file}")
+        tree = os.path.join(path, name)
+        # git archive leaves out .git, only use it if it has everything
+        use_git = archive_use_git and not os.path.exists(os.path.join(tree, ".gitmodules"))
         try:
-            process = subprocess.run(
-                f"tar --create --file=- {clone_path}/ | pigz -9 -p 16 > {clone_file}",
-                check=True,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                universal_newlines=True,
-                cwd=path,
-            )
-        except subprocess.CalledProcessError as err:
+            archive.write_archive(tree, absolute_file_path, name, archive_codec, archive_level, archive_threads, use_git)
+        except (subprocess.CalledProcessError, OSError) as err:
             if is_fatal:
                 remove_clone_archive(path, clone_path, is_fatal)
                 print_fatal(f"Unable to archive {clone_path} in {clone_file} from {url}: {err}")
@@ -455,7 +679,7 @@ def git_archive_all(path, name, url, branch, force_module, force_fullclone, conf
             if not outputVersion.startswith("v") and not outputVersion.startswith("V"):
                 outputVersion = f"v{outputVersion}"
 
-            clone_file = f"{name}-{outputVersion}.tar.gz"
+            clone_file = f"{name}-{outputVersion}{archive.CODECS[archive_codec][0]}"
             clone_path_norm = os.path.normpath(clone_path)
             absolute_file_path = os.path.abspath(clone_file)
             absolute_url_file = f"file://{absolute_file_path}"
@@ -465,17 +689,8 @@ def git_archive_all(path, name, url, branch, force_module, force_fullclone, conf
                 print_debug(f"absolute_file_path: {absolute_file_path}")
                 print_debug(f"absolute_url_file: {absolute_url_file}")
             try:
-                process = subprocess.run(
-                    f"tar --create --file=- {os.path.basename(clone_path_norm)}/ | pigz -9 -p 16 > {absolute_file_path}",
-                    check=True,
-                    shell=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    universal_newlines=True,
-                    cwd=os.path.dirname(clone_path_norm),
-                )
-            except subprocess.CalledProcessError as err:
+                archive.write_archive(clone_path_norm, absolute_file_path, None, archive_codec, archive_level, archive_threads)
+            except (subprocess.CalledProcessError, OSError) as err:
                 if is_fatal:
                     remove_clone_archive(path, clone_path, is_fatal)
                     print_fatal(f"Unable to archive {clone_path} in {clone_file} from {url}: {err}")
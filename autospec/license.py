@@ -21,16 +21,17 @@
 # exact matches on hashes of the COPYING file
 #
 
+import hashlib
 import os
 import re
 import shlex
 import sys
-import urllib.parse
 
 import chardet
 import download
+import licenseserver
 
-from util import get_contents, get_sha1sum, print_fatal, print_warning
+from util import get_contents, print_fatal, print_warning
 
 default_license = "TO BE DETERMINED"
 
@@ -56,8 +57,11 @@ def add_license(lic, translations, blacklist):
     presence in the blacklist. Returns False if no license were added, True
     otherwise.
     """
-    global licenses
-    global license_files
+    return _add_license(licenses, lic, translations, blacklist)
+
+
+def _add_license(found, lic, translations, blacklist):
+    """Add the translation of lic to the found list, see add_license."""
     lic = lic.strip().strip(',')
     result = False
 
@@ -67,15 +71,52 @@ def add_license(lic, translations, blacklist):
     for real_lic in real_lics:
         if real_lic in blacklist:
             continue
-        elif real_lic in licenses:
+        elif real_lic in found:
             result = True
         else:
             result = True
-            licenses.append(real_lic)
+            found.append(real_lic)
 
     return result
 
 
+class LicenseResult(object):
+    """Licenses found in a single license file.
+
+    Candidate files are examined concurrently, so nothing is added to the
+    package wide licenses, license_files and hashes until merge() is called,
+    which the scan does in a fixed order.
+    """
+
+    def __init__(self):
+        """Set defaults for LicenseResult."""
+        self.licenses = []
+        self.license_files = []
+        self.hashes = dict()
+        # (print function, arguments) to replay on merge
+        self.output = []
+
+    def add_license(self, lic, translations, blacklist):
+        """Add lic to this result, see add_license."""
+        return _add_license(self.licenses, lic, translations, blacklist)
+
+    def defer(self, func, *args):
+        """Queue output so it shows up in merge order."""
+        self.output.append((func, args))
+
+    def merge(self):
+        """Add this result to the package licenses, license_files and hashes."""
+        for func, args in self.output:
+            func(*args)
+        for lic in self.licenses:
+            if lic not in licenses:
+                licenses.append(lic)
+        for lic_path in self.license_files:
+            if lic_path not in license_files:
+                license_files.append(lic_path)
+            hashes[lic_path] = self.hashes[lic_path]
+
+
 def decode_license(license):
     """Try and decode the license string."""
     def try_with_charset(license, charset):
@@ -94,35 +135,38 @@ def decode_license(license):
     return try_with_charset(license, chardet.detect(license)['encoding'])
 
 
-def license_from_copying_hash(copying, srcdir, config, name):
-    """Add licenses based on the hash of the copying file."""
+def examine_copying(copying, srcdir, config, name, server=None):
+    """Identify the license in the copying file.
+
+    The file is read once and hashed from the same buffer. Safe to run in a
+    worker thread, returns a LicenseResult or None if it is no license file.
+    server is the licenseserver.LicenseServer to ask if license_fetch is set.
+    """
     try:
-        data = get_contents(copying)
+        raw = get_contents(copying)
     except FileNotFoundError:
         # LICENSE file is a bad symlink (qemu-4.2.0!)
-        return
+        return None
 
-    if data.startswith(b'#!'):
+    if raw.startswith(b'#!'):
         # Not a license if this is a script
-        return
+        return None
 
-    data = decode_license(data)
+    data = decode_license(raw)
     if not data:
-        return
+        return None
 
-    hash_sum = get_sha1sum(copying)
+    hash_sum = hashlib.sha1(raw).hexdigest()
+    result = LicenseResult()
 
     if config.license_fetch:
-        values = {'hash': hash_sum, 'text': data, 'package': name}
-        data = urllib.parse.urlencode(values)
-        data = data.encode('utf-8')
-
-        buffer = download.do_curl(config.license_fetch, post=data, is_fatal=True)
-        response = buffer.getvalue()
-        page = response.decode('utf-8').strip()
+        if server is None:
+            server = licenseserver.LicenseServer(config.license_fetch)
+        page = server.query(hash_sum, data, name)
         if page:
-            print("License     : ", page, " (server) (", hash_sum, ")")
-            process_licenses(page, config.license_translations, config.license_blacklist)
+            result.defer(print, "License     : ", page, " (server) (", hash_sum, ")")
+            for lic in page.split():
+                result.add_license(lic, config.license_translations, config.license_blacklist)
 
             if page != "none":
                 # Strip the build source directory off the front
@@ -131,25 +175,37 @@ def license_from_copying_hash(copying, srcdir, config, name):
                 while lic_path.startswith('/'):
                     lic_path = lic_path[1:]
                 lic_path = shlex.quote(lic_path)
-                license_files.append(lic_path)
-                hashes[lic_path] = hash_sum
+                result.license_files.append(lic_path)
+                result.hashes[lic_path] = hash_sum
 
-            return
+            return result
 
     if hash_sum in config.license_hashes:
-        add_license(config.license_hashes[hash_sum],
-                    config.license_translations,
-                    config.license_blacklist)
-    else:
-        if not config.license_show:
-            return
-        print_warning("Unknown license {0} with hash {1}".format(copying, hash_sum))
+        result.add_license(config.license_hashes[hash_sum],
+                           config.license_translations,
+                           config.license_blacklist)
+    elif config.license_show:
+        result.defer(print_warning, "Unknown license {0} with hash {1}".format(copying, hash_sum))
         hash_url = config.license_show % {'HASH': hash_sum}
-        print_warning("Visit {0} to enter".format(hash_url))
+        result.defer(print_warning, "Visit {0} to enter".format(hash_url))
+    return result
 
 
-def scan_for_licenses(srcdir, config, pkg_name):
-    """Scan the project directory for things we can use to guess a description and summary."""
+def license_from_copying_hash(copying, srcdir, config, name):
+    """Add licenses based on the hash of the copying file."""
+    result = examine_copying(copying, srcdir, config, name)
+    if result:
+        result.merge()
+
+
+def scan_for_licenses(srcdir, config, pkg_name, tree=None, jobs=None, server=None):
+    """Scan the project directory for things we can use to guess a description and summary.
+
+    tree is an optional util.SourceTree to walk instead of the file system.
+    Candidate files are examined by up to jobs threads and their results
+    merged in walk order. The license server is asked once per distinct
+    license hash, through server if given.
+    """
     targets = ["copyright",
                "copyright.txt",
                "apache-2.0",
@@ -164,16 +220,28 @@ def scan_for_licenses(srcdir, config, pkg_name):
     # look for files that start with copying or licen[cs]e (but are
     # not likely scripts) or end with licen[cs]e
     target_pat = re.compile(r"^((copying)|(licen[cs]e)|(e[dp]l-v\d+))|(licen[cs]e)(\.(txt|xml))?$")
-    for dirpath, dirnames, files in os.walk(srcdir):
+    walk = tree.walk if tree else os.walk
+    candidates = []
+    for dirpath, dirnames, files in walk(srcdir):
         for name in files:
             if name.lower() in targets or target_pat.search(name.lower()):
-                license_from_copying_hash(os.path.join(dirpath, name),
-                                          srcdir, config, pkg_name)
+                candidates.append(os.path.join(dirpath, name))
             # Also look for files that end with .txt and reside in a LICENSES
             # directory. This is a convention that KDE is adopting.
-            if os.path.basename(dirpath) == "LICENSES" and re.search(r'\.txt$', name):
-                license_from_copying_hash(os.path.join(dirpath, name),
-                                          srcdir, config, pkg_name)
+            elif os.path.basename(dirpath) == "LICENSES" and re.search(r'\.txt$', name):
+                candidates.append(os.path.join(dirpath, name))
+
+    if config.license_fetch and server is None:
+        server = licenseserver.LicenseServer(config.license_fetch)
+    # licenseserver queries reuse the connection of their thread
+    with download.worker_pool(jobs) as pool:
+        results = pool.map(lambda copying: examine_copying(copying, srcdir, config, pkg_name, server), candidates)
+        for result in results:
+            if result:
+                result.merge()
+    if server and server.cache_path:
+        server.save()
+        print(server.summary())
 
     if not licenses:
         print_fatal(" Cannot find any license or a valid {}.license file!\n".format(pkg_name))
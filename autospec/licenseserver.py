@@ -0,0 +1,159 @@
+#!/bin/true
+#
+# licenseserver.py - part of autospec
+# Copyright (C) 2018 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Client of the license server that asks about each license hash once, and
+# remembers the answers between runs for a limited time.
+#
+
+import json
+import os
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future
+
+import download
+
+CACHE_FILE = "license_server.json"
+# Bump when the cache layout changes, older caches are then dropped
+CACHE_VERSION = 1
+# How long an answer of the server is reused, in seconds
+DEFAULT_TTL = 7 * 24 * 60 * 60
+
+
+def default_path():
+    """Return the default cache file under the XDG cache home."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "autospec", CACHE_FILE)
+
+
+class LicenseServer(object):
+    """Thread safe license server client, deduplicating queries by hash.
+
+    Threads asking about a hash that is already being fetched wait for that
+    answer instead of sending their own. With a cache_path, the answers are
+    kept there for ttl seconds.
+    """
+
+    def __init__(self, url, cache_path=None, ttl=DEFAULT_TTL):
+        """Query the license server at url, caching answers in cache_path."""
+        self.url = url
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.answers = {}  # hash -> (page, time it was fetched)
+        self.pending = {}  # hash -> Future of the query in flight
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.hits = 0
+        self.fetched = 0
+        if cache_path:
+            self.load()
+
+    def _read_cache(self):
+        """Return the answers of every server in the cache file."""
+        try:
+            with open(self.cache_path, "r") as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return {}
+        return data.get("servers", {})
+
+    def _fresh(self, entry, now):
+        """Check if the cached entry has not expired yet."""
+        return now - entry[1] < self.ttl
+
+    def load(self):
+        """Read the unexpired answers of this server from the cache file."""
+        now = time.time()
+        for hash_sum, entry in self._read_cache().get(self.url, {}).items():
+            if self._fresh(entry, now):
+                self.answers[hash_sum] = tuple(entry)
+
+    def save(self):
+        """Add the new answers to the cache file, dropping expired ones.
+
+        The cache is only an optimization, failing to write it is not an
+        error.
+        """
+        if not self.cache_path or not self.dirty:
+            return
+        now = time.time()
+        servers = self._read_cache()
+        with self.lock:
+            servers.setdefault(self.url, {}).update(self.answers)
+        for url in list(servers):
+            servers[url] = {h: e for h, e in servers[url].items() if self._fresh(e, now)}
+            if not servers[url]:
+                del servers[url]
+        tmp = "{}.{}.tmp".format(self.cache_path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp, "w") as cache_file:
+                json.dump({"version": CACHE_VERSION, "servers": servers}, cache_file, separators=(",", ":"))
+            os.replace(tmp, self.cache_path)
+            self.dirty = False
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def fetch(self, hash_sum, text, package):
+        """POST the license text to the server and return its answer."""
+        values = {'hash': hash_sum, 'text': text, 'package': package}
+        data = urllib.parse.urlencode(values).encode('utf-8')
+        buffer = download.do_curl(self.url, post=data, is_fatal=True)
+        return buffer.getvalue().decode('utf-8').strip()
+
+    def query(self, hash_sum, text, package):
+        """Return the server's answer for the license text with hash_sum."""
+        with self.lock:
+            entry = self.answers.get(hash_sum)
+            if entry and self._fresh(entry, time.time()):
+                self.hits += 1
+                return entry[0]
+            future = self.pending.get(hash_sum)
+            waiting = future is not None
+            if waiting:
+                self.hits += 1
+            else:
+                future = self.pending[hash_sum] = Future()
+        if waiting:
+            return future.result()
+
+        try:
+            page = self.fetch(hash_sum, text, package)
+        except BaseException as e:
+            # including SystemExit, every waiter fails the same way
+            with self.lock:
+                del self.pending[hash_sum]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            del self.pending[hash_sum]
+            self.fetched += 1
+            if page:
+                # an empty answer may be a hiccup, ask again next time
+                self.answers[hash_sum] = (page, time.time())
+                self.dirty = True
+        future.set_result(page)
+        return page
+
+    def summary(self):
+        """Return the query summary line."""
+        return "License server: {} queries, {} answered from cache".format(self.fetched, self.hits)
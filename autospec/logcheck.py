@@ -19,42 +19,39 @@
 import os
 import re
 
+import logreader
 from util import print_fatal, write_out
 
 
-def logcheck(pkg_loc):
-    """Try to discover configuration options that were automatically switched off."""
-    log = os.path.join(pkg_loc, 'results', 'build.log')
-    if not os.path.exists(log):
-        print('build log is missing, unable to perform logcheck.')
-        return
-
-    whitelist = []
+def read_list(name):
+    """Read one of the configure_whitelist/configure_blacklist files."""
+    entries = set()
     file_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(file_dir, 'configure_whitelist')
-    with open(file_path, "r") as whitelistf:
-        for line in whitelistf:
+    file_path = os.path.join(file_dir, name)
+    with open(file_path, "r") as listf:
+        for line in listf:
             if line.startswith("#"):
                 continue
-            whitelist.append(line.rstrip())
+            entries.add(line.rstrip())
+    return entries
 
-    blacklist = []
-    file_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(file_dir, 'configure_blacklist')
-    with open(file_path, "r") as blacklistf:
-        for line in blacklistf:
-            if line.startswith("#"):
-                continue
-            blacklist.append(line.rstrip())
 
-    with open(log, 'r') as logf:
-        lines = logf.readlines()
+class LogCheck(object):
+    """Collect configure misses from build.log lines as they are read."""
 
     pat = re.compile(r"^checking (?:for )?(.*?)\.\.\. no")
-    misses = []
-    for line in lines:
+
+    def __init__(self):
+        """Load the white and black lists."""
+        self.whitelist = read_list('configure_whitelist')
+        self.blacklist = read_list('configure_blacklist')
+        # (miss, blacklisted) pairs in log order
+        self.misses = []
+
+    def feed(self, line):
+        """Record the configure miss reported on line, if any."""
         match = None
-        m = pat.search(line)
+        m = self.pat.search(line)
         if m:
             match = m.group(1)
 
@@ -64,10 +61,30 @@ def logcheck(pkg_loc):
         if "warning: format not a string literal" in line:
             match = line
 
-        if not match or match in whitelist:
-            continue
+        if not match or match in self.whitelist:
+            return
+
+        self.misses.append((match, match in self.blacklist))
+
 
-        if match in blacklist:
+def logcheck(pkg_loc, checker=None):
+    """Try to discover configuration options that were automatically switched off.
+
+    checker is a LogCheck that was already fed the build log, for instance
+    by a shared logreader.LogReader pass; without it the log is read here.
+    """
+    if checker is None:
+        log = os.path.join(pkg_loc, 'results', 'build.log')
+        if not os.path.exists(log):
+            print('build log is missing, unable to perform logcheck.')
+            return
+        checker = LogCheck()
+        for line in logreader.read_lines(log):
+            checker.feed(line)
+
+    misses = []
+    for match, blacklisted in checker.misses:
+        if blacklisted:
             print_fatal("Blacklisted configure-miss is forbidden: " + match)
             misses.append("Blacklisted configure-miss is forbidden: " + match)
             write_misses(pkg_loc, misses)
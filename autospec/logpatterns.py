@@ -0,0 +1,185 @@
+#!/bin/true
+#
+# logpatterns.py - part of autospec
+# Copyright (C) 2015 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Precompiled build.log pattern matching
+#
+
+import re
+
+# Characters with a special meaning outside of a character class
+_META = set(".^$*+?{}[]()|\\")
+# Characters that make the preceding atom optional or repeated
+_QUANTIFIERS = set("*?{")
+_REPEAT = re.compile(r"\{\d*(?:,\d*)?\}")
+# Literals shorter than this are too common to be a useful prefilter
+MIN_LITERAL = 3
+
+
+def _skip_class(pattern, i):
+    """Return the index just past the character class starting at pattern[i]."""
+    i += 1
+    if i < len(pattern) and pattern[i] == "^":
+        i += 1
+    if i < len(pattern) and pattern[i] == "]":
+        i += 1
+    while i < len(pattern) and pattern[i] != "]":
+        if pattern[i] == "\\":
+            i += 1
+        i += 1
+    return i + 1
+
+
+def _skip_group(pattern, i):
+    """Return the index just past the group starting at pattern[i]."""
+    depth = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "[":
+            i = _skip_class(pattern, i)
+            continue
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def required_literal(pattern):
+    """Find the longest literal substring every match of pattern must contain.
+
+    Only the top level of the pattern is considered: groups, character
+    classes and escapes such as \\d end the current literal run, and a
+    quantified character is dropped from it. Returns None when the pattern
+    has a top-level alternation or no literal of at least MIN_LITERAL
+    characters, in which case the pattern must always be tried.
+    """
+    runs = []
+    run = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            if nxt.isalnum():
+                # \d, \s, \1, ... are not literals
+                runs.append(run)
+                run = ""
+                i += 2
+                continue
+            atom = nxt
+            i += 2
+        elif char == "|":
+            return None
+        elif char == "{":
+            runs.append(run)
+            run = ""
+            repeat = _REPEAT.match(pattern, i)
+            i = repeat.end() if repeat else i + 1
+            continue
+        elif char == "[":
+            runs.append(run)
+            run = ""
+            i = _skip_class(pattern, i)
+            continue
+        elif char == "(":
+            runs.append(run)
+            run = ""
+            i = _skip_group(pattern, i)
+            continue
+        elif char in _META:
+            runs.append(run)
+            run = ""
+            i += 1
+            continue
+        else:
+            atom = char
+            i += 1
+        if i < len(pattern) and (pattern[i] in _QUANTIFIERS or pattern[i] == "+"):
+            # the atom may be missing or repeated, end the run before it
+            if pattern[i] == "+":
+                # at least one occurrence is still required on both sides
+                runs.append(run + atom)
+                run = atom
+            else:
+                runs.append(run)
+                run = ""
+            continue
+        run += atom
+    runs.append(run)
+    best = max(runs, key=len)
+    if len(best) < MIN_LITERAL:
+        return None
+    return best
+
+
+class PatternMatcher(object):
+    """Match build.log lines against several ordered pattern groups.
+
+    Every pattern is compiled once and indexed by a literal substring it
+    requires. A single alternation of all literals rejects the (vast
+    majority of) lines that cannot match anything, and lines that pass are
+    only offered to the patterns whose literal they contain.
+    """
+
+    def __init__(self, groups):
+        """Compile groups, a list of (name, [(regex, args...), ...]) tuples."""
+        self.groups = []
+        literals = set()
+        self.always = False
+        for name, patterns in groups:
+            compiled = []
+            for pat in patterns:
+                literal = required_literal(pat[0])
+                if literal is None:
+                    self.always = True
+                else:
+                    literals.add(literal)
+                compiled.append((literal, re.compile(pat[0]), pat[1:]))
+            self.groups.append((name, compiled))
+        if literals:
+            alternation = "|".join(re.escape(lit) for lit in sorted(literals, key=len, reverse=True))
+            self.prefilter = re.compile(alternation)
+        else:
+            self.prefilter = None
+
+    def candidates(self, line):
+        """Yield (group, compiled pattern, args) for patterns line may match.
+
+        Patterns are yielded in group order and, within a group, in the
+        order they were given, so callers see the same sequence as when
+        looping over every pattern.
+        """
+        if not self.always and (self.prefilter is None or not self.prefilter.search(line)):
+            return
+        for name, compiled in self.groups:
+            for literal, pat, args in compiled:
+                if literal is None or literal in line:
+                    yield name, pat, args
+
+    def search(self, line):
+        """Yield (group, match, args) for every pattern matching line."""
+        for name, pat, args in self.candidates(line):
+            match = pat.search(line)
+            if match:
+                yield name, match, args
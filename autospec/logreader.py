@@ -0,0 +1,94 @@
+#!/bin/true
+#
+# logreader.py - part of autospec
+# Copyright (C) 2015 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Streaming reader for mock build logs
+#
+
+import os
+import time
+
+import util
+
+
+def read_lines(filename):
+    """Yield the lines of a log file one at a time.
+
+    The file is never held in memory as a whole, and logs ending in .gz are
+    decompressed on the fly by util.open_auto.
+    """
+    with util.open_auto(filename, "r") as logf:
+        for line in logf:
+            yield line
+
+
+def follow_lines(filename, running, interval=1.0):
+    """Yield the lines of a log file as another process appends them.
+
+    The file is checked every interval seconds, and need not exist yet.
+    Once running() returns False the lines written so far are yielded, a
+    last line without a newline included, and the generator ends.
+    """
+    logf = None
+    partial = ""
+    try:
+        while True:
+            alive = running()
+            if logf is None and os.path.exists(filename):
+                logf = util.open_auto(filename, "r")
+            while logf is not None:
+                chunk = logf.readline()
+                if not chunk:
+                    break
+                partial += chunk
+                if partial.endswith("\n"):
+                    yield partial
+                    partial = ""
+            if not alive:
+                if partial:
+                    yield partial
+                return
+            time.sleep(interval)
+    finally:
+        if logf is not None:
+            logf.close()
+
+
+class LogReader(object):
+    """Read a log once and hand every line to each registered consumer."""
+
+    def __init__(self, filename):
+        """Set up a reader for filename, nothing is read until run()."""
+        self.filename = filename
+        self.consumers = []
+        self.lines = 0
+
+    def register(self, feed, finish=None):
+        """Register feed(line), and finish() to call once the log is done."""
+        self.consumers.append((feed, finish))
+
+    def run(self):
+        """Stream the log through all consumers and return the line count."""
+        feeds = [feed for feed, _ in self.consumers]
+        for line in read_lines(self.filename):
+            self.lines += 1
+            for feed in feeds:
+                feed(line)
+        for _, finish in self.consumers:
+            if finish:
+                finish()
+        return self.lines
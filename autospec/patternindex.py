@@ -0,0 +1,143 @@
+#!/bin/true
+#
+# patternindex.py - part of autospec
+# Copyright (C) 2018 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Persistent index of the parsed pattern tables (license_hashes,
+# failed_commands, translate.dic, ...), so they are only parsed again when
+# the file they come from changes.
+#
+
+import os
+import pickle
+
+INDEX_FILE = "patterns.pickle"
+# Bump when a table layout changes, older indexes are then dropped
+INDEX_VERSION = 1
+
+
+def default_path():
+    """Return the default index file under the XDG cache home."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "autospec", INDEX_FILE)
+
+
+def parse_pattern_file(path, list_format=False):
+    """Parse a fail-pattern configuration file into a dict.
+
+    Lines are <pattern>, <package>, or a bare pattern mapped to True with
+    list_format. Lines starting with '#' are ignored.
+    """
+    table = {}
+    with open(path, "r") as patfile:
+        for line in patfile:
+            if line.startswith("#"):
+                continue
+            if list_format:
+                table[line.strip()] = True
+                continue
+            # split from the right a maximum of one time, since the pattern
+            # string might contain ", "
+            pattern, package = line.rsplit(", ", 1)
+            table[pattern] = package.rstrip()
+    return table
+
+
+def parse_translations(path):
+    """Parse the name=translation lines of translate.dic, first one wins."""
+    table = {}
+    with open(path, "r") as dicfile:
+        for line in dicfile:
+            name, sep, _ = line.strip().partition("=")
+            if sep:
+                table.setdefault(name, line.strip().split("=")[1])
+    return table
+
+
+class PatternIndex(object):
+    """Parsed tables keyed by source file, valid while its mtime and size hold."""
+
+    def __init__(self, path=None):
+        """Load the index stored at path, the default_path() if None."""
+        self.path = path or default_path()
+        self.tables = {}  # (kind, abspath) -> (mtime_ns, size, table)
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        """Read the index file, starting empty if it is missing or stale."""
+        try:
+            with open(self.path, "rb") as index_file:
+                data = pickle.load(index_file)
+        except Exception:
+            # missing, truncated or written by an incompatible version
+            return
+        if isinstance(data, dict) and data.get("version") == INDEX_VERSION:
+            self.tables = data.get("tables", {})
+
+    def save(self):
+        """Write the index file atomically if anything was parsed.
+
+        The index is only a cache, failing to write it is not an error.
+        """
+        if not self.dirty:
+            return
+        tmp = "{}.{}.tmp".format(self.path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, "wb") as index_file:
+                pickle.dump({"version": INDEX_VERSION, "tables": self.tables}, index_file, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+            self.dirty = False
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def _table(self, kind, path, parse):
+        """Return the table of path, calling parse(path) if it changed."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        entry = self.tables.get((kind, path))
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            self.hits += 1
+            return entry[2]
+        self.misses += 1
+        table = parse(path)
+        self.tables[(kind, path)] = (st.st_mtime_ns, st.st_size, table)
+        self.dirty = True
+        return table
+
+    def patterns(self, path, list_format=False):
+        """Return the dict parsed from the pattern file at path."""
+        kind = "list" if list_format else "patterns"
+        return self._table(kind, path, lambda p: parse_pattern_file(p, list_format))
+
+    def translations(self, path):
+        """Return the name -> translation dict of the dictionary at path."""
+        return self._table("translations", path, parse_translations)
+
+
+_index = None
+
+
+def get_index():
+    """Return the index shared by the whole process."""
+    global _index
+    if _index is None:
+        _index = PatternIndex()
+    return _index
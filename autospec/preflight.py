@@ -0,0 +1,79 @@
+#!/bin/true
+#
+# preflight.py - part of autospec
+# Copyright (C) 2018 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Pre-flight discovery of the build requirements a source tree declares,
+# so they are all in the spec before the first mock round
+#
+
+import contextlib
+import io
+import os
+
+import buildreq
+from util import print_info
+
+
+def declared_buildreqs(dirn, config, tree=None):
+    """Return the build requirements declared by the build files below dirn.
+
+    Every configure.ac/configure.in, CMakeLists.txt, *.cmake and meson.build
+    is parsed, whatever the build pattern, as a failing configure step would
+    only report the first of them it misses.
+    """
+    found = buildreq.Requirements("")
+    conf32 = config.config_opts.get("32bit")
+    walk = tree.walk if tree else os.walk
+    # the parsers report what they add to found, which is not the spec
+    with contextlib.redirect_stdout(io.StringIO()):
+        for dirpath, _, files in walk(dirn):
+            for name in sorted(files):
+                path = os.path.join(dirpath, name)
+                lname = name.lower()
+                if lname in ("configure.ac", "configure.in"):
+                    found.parse_configure_ac(path, config)
+                elif lname == "cmakelists.txt" or lname.endswith(".cmake"):
+                    found.parse_cmake(path, config.cmake_modules, conf32)
+                elif name == "meson.build":
+                    found.parse_meson_build(path, conf32)
+    return found.buildreqs
+
+
+def is_available(req, packages):
+    """Tell whether req can be installed, as far as the package list knows.
+
+    Provides such as pkgconfig(...) are not in the list of package names and
+    are left for mock to resolve.
+    """
+    return "(" in req or not packages or req in packages
+
+
+def add_declared_buildreqs(requirements, config, dirn, tree=None):
+    """Add the missing declared build requirements and return them, sorted.
+
+    Each of them would otherwise stop configure in its own mock round.
+    """
+    added = []
+    for req in sorted(declared_buildreqs(dirn, config, tree) - requirements.buildreqs):
+        if not is_available(req, config.os_packages):
+            print(f"  Pre-flight: {req} not found in os_packages, skipping")
+            continue
+        if requirements.add_buildreq(req):
+            added.append(req)
+    if added:
+        print_info(f"Pre-flight added {len(added)} build requirements, avoiding up to {len(added)} mock rounds")
+    return added
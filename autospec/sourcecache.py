@@ -0,0 +1,205 @@
+#!/bin/true
+#
+# sourcecache.py - part of autospec
+# Copyright (C) 2018 Intel Corporation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Content addressed cache of downloaded source archives shared by all
+# packages, so a tarball used by several packages or branches is only
+# downloaded once.
+#
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+from collections import OrderedDict
+from contextlib import contextmanager
+
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+# Bump when the index layout changes, older indexes are then dropped
+CACHE_VERSION = 1
+# Size the cache is trimmed to, least recently used first
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024 * 1024
+# ioctl to share the extents of a file on btrfs, xfs and the like
+FICLONE = 0x40049409
+
+
+def default_path():
+    """Return the default cache directory under the XDG cache home."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "autospec", "sources")
+
+
+def file_digests(path, names=("sha1", "sha256")):
+    """Return a dict of hex digests of path for the hashlib algorithms in names."""
+    hashers = [hashlib.new(name) for name in names]
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(1024 * 1024), b""):
+            for hasher in hashers:
+                hasher.update(block)
+    return {name: hasher.hexdigest() for name, hasher in zip(names, hashers)}
+
+
+def share_file(src, dst):
+    """Make dst a copy of src, sharing its data where the file system can.
+
+    Tries a reflink, then falls back to a plain copy. A hardlink is never
+    used, so rewriting dst in place cannot change src. dst is replaced
+    atomically.
+    """
+    tmp = dst + ".tmp"
+    if os.path.lexists(tmp):
+        os.unlink(tmp)
+    with open(src, "rb") as src_file, open(tmp, "wb") as tmp_file:
+        try:
+            fcntl.ioctl(tmp_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            shutil.copyfileobj(src_file, tmp_file, 1024 * 1024)
+    os.replace(tmp, dst)
+
+
+class SourceCache(object):
+    """Size bounded LRU cache of source archives keyed by URL and sha256.
+
+    Archives are stored once per sha256 under objects/, the index maps each
+    URL to the sha256 and sha1 of what it served. The index is re-read and
+    written under a lock for every change, so concurrent autospec runs can
+    share a cache.
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        """Use the cache stored at path, the default_path() if None."""
+        self.path = path or default_path()
+        self.max_bytes = max_bytes
+        self.objects = OrderedDict()  # sha256 -> size, oldest first
+        self.urls = {}  # url -> (sha256, sha1)
+        self.hits = 0
+        self.stored = 0
+        self.evicted = 0
+
+    def object_path(self, sha256):
+        """Return where the archive with sha256 is stored."""
+        return os.path.join(self.path, "objects", sha256[:2], sha256)
+
+    def load(self):
+        """Read the index, starting empty if it is missing or stale."""
+        self.objects = OrderedDict()
+        self.urls = {}
+        try:
+            with open(os.path.join(self.path, INDEX_FILE), "r") as index_file:
+                data = json.load(index_file)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return
+        for sha256, size in data.get("objects", []):
+            self.objects[sha256] = size
+        for url, (sha256, sha1) in data.get("urls", {}).items():
+            if sha256 in self.objects:
+                self.urls[url] = (sha256, sha1)
+
+    def save(self):
+        """Write the index atomically."""
+        data = {
+            "version": CACHE_VERSION,
+            "objects": [[sha256, size] for sha256, size in self.objects.items()],
+            "urls": {url: list(entry) for url, entry in self.urls.items()},
+        }
+        index_path = os.path.join(self.path, INDEX_FILE)
+        with open(index_path + ".tmp", "w") as index_file:
+            json.dump(data, index_file, separators=(",", ":"))
+        os.replace(index_path + ".tmp", index_path)
+
+    @contextmanager
+    def locked(self):
+        """Hold the cache lock with the index freshly loaded, save it on exit."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, LOCK_FILE), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.load()
+            yield
+            self.save()
+
+    def __contains__(self, url):
+        """Check if url is cached."""
+        self.load()
+        return url in self.urls
+
+    def fetch(self, url, dest):
+        """Materialize the archive cached for url as dest.
+
+        Returns its sha1, or None if url is not cached. An archive that no
+        longer matches its sha256 is dropped and missed.
+        """
+        with self.locked():
+            entry = self.urls.get(url)
+            if not entry:
+                return None
+            sha256, sha1 = entry
+            if not os.path.exists(self.object_path(sha256)):
+                # removed behind our back
+                self._drop(sha256)
+                return None
+            if file_digests(self.object_path(sha256), ("sha256",))["sha256"] != sha256:
+                # changed behind our back
+                self._drop(sha256)
+                return None
+            share_file(self.object_path(sha256), dest)
+            self.objects.move_to_end(sha256)
+            self.hits += 1
+            return sha1
+
+    def store(self, url, path, digests):
+        """Add the archive at path downloaded from url.
+
+        digests holds its "sha1" and "sha256" hex digests.
+        """
+        sha256 = digests["sha256"]
+        with self.locked():
+            obj = self.object_path(sha256)
+            if sha256 not in self.objects or not os.path.exists(obj):
+                os.makedirs(os.path.dirname(obj), exist_ok=True)
+                share_file(path, obj)
+                self.objects[sha256] = os.path.getsize(obj)
+                self.stored += 1
+            self.objects.move_to_end(sha256)
+            self.urls[url] = (sha256, digests["sha1"])
+            self._evict()
+
+    def _drop(self, sha256):
+        """Forget the archive with sha256 and remove it."""
+        self.objects.pop(sha256, None)
+        for url in [url for url, entry in self.urls.items() if entry[0] == sha256]:
+            del self.urls[url]
+        try:
+            os.unlink(self.object_path(sha256))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """Drop least recently used archives until the cache fits."""
+        size = sum(self.objects.values())
+        while size > self.max_bytes and len(self.objects) > 1:
+            sha256, obj_size = next(iter(self.objects.items()))
+            self._drop(sha256)
+            size -= obj_size
+            self.evicted += 1
+
+    def summary(self):
+        """Return the hit/store summary line."""
+        return "Source cache: {} hits, {} stored, {} evicted".format(self.hits, self.stored, self.evicted)
@@ -240,11 +240,15 @@ def description_from_readme(readmefile):
     assign_description(desc, score)
 
 
-def scan_for_description(package, dirn, translations, blacklist):
-    """Scan the project directory for things we can use to guess a description and summary."""
+def scan_for_description(package, dirn, translations, blacklist, tree=None):
+    """Scan the project directory for things we can use to guess a description and summary.
+
+    tree is an optional util.SourceTree to walk instead of the file system.
+    """
     test_pat = re.compile(r"tests?")
     dirpath_seen = ""
-    for dirpath, dirnames, files in os.walk(dirn):
+    walk = tree.walk if tree else os.walk
+    for dirpath, dirnames, files in walk(dirn):
         if dirpath_seen != dirpath:
             dirpath_seen = dirpath
             dirnames[:] = [d for d in dirnames if not re.match(test_pat, d)]
@@ -20,33 +20,176 @@
 import configparser
 import os
 import re
+import shutil
+import subprocess
 import tarfile
+import tempfile
 import zipfile
 from collections import OrderedDict
+from contextlib import contextmanager
 
 import download
-from util import do_regex, get_sha1sum, print_fatal, write_out, print_debug
+import extractcache
+import sourcecache
+import util
+from util import do_regex, get_sha1sum, print_fatal, print_info, print_warning, write_out, print_debug
+
+# External decompressors by file magic, tried in place of tarfile's in-process
+# (single threaded) ones when they are installed. tarfile has no zstd at all.
+DECOMPRESSORS = [
+    (b"\xfd7zXZ\x00", ["xz", "-dc", "-T0"]),
+    (b"\x28\xb5\x2f\xfd", ["zstd", "-dcq"]),
+    (b"\x1f\x8b", ["pigz", "-dc"]),
+]
+
+
+def decompress_command(path):
+    """Return the external decompressor command line for path, or None."""
+    try:
+        with open(path, "rb") as archive:
+            magic = archive.read(8)
+    except OSError:
+        return None
+    for prefix, command in DECOMPRESSORS:
+        if magic.startswith(prefix) and shutil.which(command[0]):
+            return command + [path]
+    return None
+
+
+@contextmanager
+def open_tar_stream(path):
+    """Open the tar at path for a single sequential pass.
+
+    The archive is decompressed by an external decompressor writing to a pipe
+    if one is available for it, by tarfile otherwise.
+    """
+    command = decompress_command(path)
+    if not command:
+        with tarfile.open(path, "r|*") as content:
+            yield content
+        return
+
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        with tarfile.open(fileobj=proc.stdout, mode="r|") as content:
+            yield content
+        # drain the zero padding after the end of archive marker so the
+        # decompressor finishes instead of dying of SIGPIPE
+        while proc.stdout.read(1024 * 1024):
+            pass
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise tarfile.ReadError("{} exited with {}".format(command[0], returncode))
+
+
+def is_within_directory(directory, target):
+    """Check that target does not escape from directory."""
+    abs_directory = os.path.abspath(directory)
+    abs_target = os.path.abspath(target)
+    prefix = os.path.commonprefix([abs_directory, abs_target])
+    return prefix == abs_directory
+
+
+def stream_tar(path, pattern=None, extraction_path=None):
+    """Decompress the tar at path once, extracting it to extraction_path if set.
+
+    The path traversal check and the common prefix are worked out as the
+    members stream by. Returns (number of members, prefix), where prefix is
+    None unless there is more than one member, like set_tar_prefix expects.
+    """
+    count = 0
+    prefix = None
+    skipped_package_xml = pattern not in ['phpize']
+    dirs = []
+    extract_args = {}
+    if hasattr(tarfile, "fully_trusted_filter"):
+        # paths are checked below, keep extracting everything else as is
+        extract_args["filter"] = "fully_trusted"
+    with open_tar_stream(path) as content:
+        for member in content:
+            count += 1
+            if member.name == "package.xml" and not skipped_package_xml:
+                skipped_package_xml = True
+            else:
+                prefix = member.name if prefix is None else os.path.commonpath([prefix, member.name])
+            if not extraction_path:
+                continue
+            if not is_within_directory(extraction_path, os.path.join(extraction_path, member.name)):
+                raise Exception("Attempted Path Traversal in Tar File")
+            if member.isdir():
+                dirs.append(member)
+            content.extract(member, extraction_path, set_attrs=not member.isdir(), **extract_args)
+        # like extractall, set directory attributes last so read-only
+        # directories do not get in the way of their content
+        for member in sorted(dirs, key=lambda m: m.name, reverse=True):
+            dirpath = os.path.join(extraction_path, member.name)
+            content.chown(member, dirpath, False)
+            content.utime(member, dirpath)
+            content.chmod(member, dirpath)
+    if count < 2:
+        prefix = None
+    return count, prefix
+
+
+def move_tree(src, dst):
+    """Move the content of directory src into dst, merging directories."""
+    os.makedirs(dst, exist_ok=True)
+    with os.scandir(src) as entries:
+        for entry in entries:
+            target = os.path.join(dst, entry.name)
+            target_is_dir = os.path.isdir(target) and not os.path.islink(target)
+            if entry.is_dir(follow_symlinks=False) and target_is_dir:
+                move_tree(entry.path, target)
+                continue
+            if target_is_dir:
+                shutil.rmtree(target)
+            os.replace(entry.path, target)
+    os.rmdir(src)
 
 
 class Source(object):
     """Holds data and methods for source code or archives management."""
 
-    def __init__(self, url, destination, path, pattern=None):
-        """Set default values for source file."""
+    def __init__(self, url, destination, path, pattern=None, base_path=None, details=None):
+        """Set default values for source file.
+
+        With base_path set, a tar archive is extracted to a staging directory
+        there by the same pass that finds its prefix, extract() then only
+        moves the files into place. details from a previous get_details()
+        take the place of inspecting the archive.
+        """
         self.url = url
         self.destination = destination
         self.path = path
         self.pattern = pattern
+        self.base_path = base_path
         self.type = None
         self.prefix = None
         self.subdir = None
         self.gem_subdir = None
+        self.staged = None
 
+        if details:
+            self.type = details["type"]
+            self.prefix = details["prefix"]
+            self.subdir = details["subdir"]
+            self.gem_subdir = details["gem_subdir"]
         # Extra  compressed archives
-        if not self.destination.startswith(':'):
+        elif not self.destination.startswith(':'):
             self.set_type()
             self.set_prefix()
 
+    def get_details(self):
+        """Return what was found out about the archive, for the extraction cache."""
+        return {
+            "type": self.type,
+            "prefix": self.prefix,
+            "subdir": self.subdir,
+            "gem_subdir": self.gem_subdir,
+        }
+
     def set_type(self):
         """Determine compression type."""
         if self.url.lower().endswith(('.zip', 'jar')):
@@ -69,21 +212,27 @@ class Source(object):
             self.gem_subdir = os.path.splitext(os.path.basename(self.path))[0]
 
     def set_tar_prefix(self):
-        """Determine prefix folder name of tar file."""
-        if tarfile.is_tarfile(self.path):
-            with tarfile.open(self.path, 'r') as content:
-                lines = content.getnames()
-                # When tarball is not empty
-                if len(lines) == 0:
-                    print_fatal("Tar file doesn't appear to have any content")
-                    exit(1)
-                elif len(lines) > 1:
-                    if 'package.xml' in lines and self.pattern in ['phpize']:
-                        lines.remove('package.xml')
-                    self.prefix = os.path.commonpath(lines)
-        else:
+        """Determine prefix folder name of tar file, staging its content."""
+        staging = None
+        if self.base_path:
+            os.makedirs(self.base_path, exist_ok=True)
+            staging = tempfile.mkdtemp(prefix=".extract-", dir=self.base_path)
+        count = None
+        try:
+            count, self.prefix = stream_tar(self.path, self.pattern, staging)
+        except (tarfile.TarError, EOFError):
+            pass
+        finally:
+            if staging and not count:
+                shutil.rmtree(staging)
+        if count is None:
             print_fatal("Not a valid tar file.")
             exit(1)
+        # When tarball is not empty
+        if count == 0:
+            print_fatal("Tar file doesn't appear to have any content")
+            exit(1)
+        self.staged = staging
 
     def set_zip_prefix(self):
         """Determine prefix folder name of zip file."""
@@ -116,27 +265,11 @@ class Source(object):
 
     def extract_tar(self, extraction_path):
         """Extract tar in path."""
-        with tarfile.open(self.path) as content:
-            def is_within_directory(directory, target):
-                
-                abs_directory = os.path.abspath(directory)
-                abs_target = os.path.abspath(target)
-            
-                prefix = os.path.commonprefix([abs_directory, abs_target])
-                
-                return prefix == abs_directory
-            
-            def safe_extract(tar, path=".", members=None, *, numeric_owner=False):
-            
-                for member in tar.getmembers():
-                    member_path = os.path.join(path, member.name)
-                    if not is_within_directory(path, member_path):
-                        raise Exception("Attempted Path Traversal in Tar File")
-            
-                tar.extractall(path, members, numeric_owner=numeric_owner) 
-                
-            
-            safe_extract(content, path=extraction_path)
+        if self.staged:
+            move_tree(self.staged, extraction_path)
+            self.staged = None
+        else:
+            stream_tar(self.path, self.pattern, extraction_path)
 
     def extract_zip(self, extraction_path):
         """Extract zip in path."""
@@ -186,8 +319,15 @@ def convert_version(ver_str, name):
 class Content(object):
     """Detect static information about the project."""
 
-    def __init__(self, url, name, version, archives, config, base_path, giturl, download_from_git, branch, new_archives_from_git, force_module, force_fullclone):
-        """Initialize Default content settings."""
+    def __init__(self, url, name, version, archives, config, base_path, giturl, download_from_git, branch, new_archives_from_git, force_module, force_fullclone,
+                 source_cache=None, extract_cache=None):
+        """Initialize Default content settings.
+
+        source_cache is an optional sourcecache.SourceCache shared with other
+        packages to take tarballs from before downloading them. extract_cache
+        is an optional extractcache.ExtractCache whose tree is base_path, to
+        reuse the extracted sources of the previous run.
+        """
         self.name = name
         self.rawname = ""
         self.version = version
@@ -210,6 +350,10 @@ class Content(object):
         self.force_fullclone = force_fullclone
         self.archives_from_git = new_archives_from_git
         self.gem_subdir = str()
+        self.source_cache = source_cache
+        self.extract_cache = extract_cache
+        self.extract_key = None
+        self.upstream_hashes = dict()
 
     def write_upstream(self, sha, tarfile, mode="w"):
         """Write the upstream hash to the upstream file."""
@@ -223,20 +367,74 @@ class Content(object):
             if src.destination != ':':
                 src.extract(self.base_path)
 
+    def local_tarball(self, upstream_url, tarball_path):
+        """Return the sha1 of tarball_path if present locally or in the source cache.
+
+        Returns None if it needs to be downloaded.
+        """
+        if os.path.isfile(tarball_path):
+            if self.source_cache is not None and upstream_url not in self.source_cache:
+                digests = sourcecache.file_digests(tarball_path)
+                self.cache_tarball(upstream_url, tarball_path, digests)
+                return digests["sha1"]
+            return get_sha1sum(tarball_path)
+        if self.source_cache is not None:
+            try:
+                return self.source_cache.fetch(upstream_url, tarball_path)
+            except OSError as e:
+                print_warning("Unable to use the source cache: {}".format(e))
+        return None
+
+    def cache_tarball(self, upstream_url, tarball_path, digests):
+        """Add a tarball to the source cache, return its sha1."""
+        if self.source_cache is not None:
+            try:
+                self.source_cache.store(upstream_url, tarball_path, digests)
+            except OSError as e:
+                print_warning("Unable to add {} to the source cache: {}".format(tarball_path, e))
+        return digests["sha1"]
+
     def check_or_get_file(self, upstream_url, tarfile, mode="w"):
         """Download tarball from url unless it is present locally."""
         tarball_path = self.config.download_path + "/" + tarfile
-        if not os.path.isfile(tarball_path):
-            download.do_curl(upstream_url, dest=tarball_path, is_fatal=True)
-            self.write_upstream(get_sha1sum(tarball_path), tarfile, mode)
-        else:
-            self.write_upstream(get_sha1sum(tarball_path), tarfile, mode)
+        sha = self.local_tarball(upstream_url, tarball_path)
+        if not sha:
+            digests = {"sha1": None, "sha256": None}
+            download.do_curl(upstream_url, dest=tarball_path, is_fatal=True, digests=digests)
+            sha = self.cache_tarball(upstream_url, tarball_path, digests)
+        self.upstream_hashes[upstream_url] = sha
+        self.write_upstream(sha, tarfile, mode)
         return tarball_path
 
+    def check_or_get_files(self, upstream_urls):
+        """Download the tarballs missing locally, concurrently.
+
+        Yields (index, path, sha1) for each of upstream_urls, the local ones
+        first and the others as their download completes.
+        """
+        missing = OrderedDict()
+        for idx, upstream_url in enumerate(upstream_urls):
+            tarball_path = self.config.download_path + "/" + os.path.basename(upstream_url)
+            if tarball_path in missing:
+                missing[tarball_path][1].append(idx)
+                continue
+            sha = self.local_tarball(upstream_url, tarball_path)
+            if sha:
+                yield idx, tarball_path, sha
+            else:
+                missing[tarball_path] = (upstream_url, [idx])
+
+        downloads = [(upstream_url, tarball_path) for tarball_path, (upstream_url, _) in missing.items()]
+        fetched = download.fetch_all(downloads, digests=("sha1", "sha256"), is_fatal=True)
+        for idx, tarball_path, digests in fetched:
+            sha = self.cache_tarball(downloads[idx][0], tarball_path, digests)
+            for url_idx in missing[tarball_path][1]:
+                yield url_idx, tarball_path, sha
+
     def process_main_source(self, url):
         """Download and get important information from main source code."""
         src_path = self.check_or_get_file(url, os.path.basename(url))
-        main_src = Source(url, '', src_path, self.config.default_pattern)
+        main_src = Source(url, '', src_path, self.config.default_pattern, self.base_path)
         return main_src
 
     def print_header(self):
@@ -456,14 +654,13 @@ class Content(object):
                     multiver_archives.append('')
                     self.set_multi_version(None)
 
-    def process_archives(self, main_src):
-        """Process extra sources needed by package.
+    def archive_list(self, main_src):
+        """Return the (url, destination) of the extra sources.
 
         This sources include: archives, go archives and multiversion.
         """
         go_archives = []
         multiver_archives = []
-        src_objects = []
 
         if os.path.basename(main_src.url) == "list":
             # Add extra archives and multiversion for Go packages
@@ -473,21 +670,72 @@ class Content(object):
             self.process_multiver_archives(main_src, multiver_archives)
 
         full_archives = self.archives + go_archives + multiver_archives
-        # Download and extract full list
-        for arch_url, destination in zip(full_archives[::2], full_archives[1::2]):
-            if util.debugging:
-                print_debug("arch_url 3: {} - {}".format(arch_url, destination))
-            src_path = self.check_or_get_file(arch_url, os.path.basename(arch_url), mode="a")
-            # Create source object and extract archive
-            archive = Source(arch_url, destination, src_path, self.config.default_pattern)
+        return list(zip(full_archives[::2], full_archives[1::2]))
+
+    def record_archives(self, archives, hashes, src_objects):
+        """Record the extra sources in archive order."""
+        for (arch_url, _), sha, archive in zip(archives, hashes, src_objects):
+            self.write_upstream(sha, os.path.basename(arch_url), mode="a")
             # Add archive prefix to list
             self.config.archive_details[arch_url + "prefix"] = archive.prefix
             self.prefixes[arch_url] = archive.prefix
-            # Add archive to list
-            src_objects.append(archive)
 
+    def process_archives(self, main_src):
+        """Process extra sources needed by package.
+
+        This sources include: archives, go archives and multiversion.
+        """
+        archives = self.archive_list(main_src)
+        src_objects = [None] * len(archives)
+        hashes = [None] * len(archives)
+        # Download the full list concurrently, extracting each archive as
+        # soon as it is complete
+        for idx, src_path, sha in self.check_or_get_files([arch_url for arch_url, _ in archives]):
+            arch_url, destination = archives[idx]
+            if util.debugging:
+                print_debug("arch_url 3: {} - {}".format(arch_url, destination))
+            hashes[idx] = sha
+            # Create source object and extract archive
+            src_objects[idx] = Source(arch_url, destination, src_path, self.config.default_pattern, self.base_path)
+
+        # Record the results in archive order however the downloads finished
+        self.record_archives(archives, hashes, src_objects)
         return src_objects
 
+    def process_cached_sources(self):
+        """Download the sources, reusing the extraction cache if it matches.
+
+        Everything is downloaded before anything is extracted, as the cache
+        is keyed by the hashes of all of them. Returns the main source, the
+        extra sources and whether they still need to be extracted.
+        """
+        main_path = self.check_or_get_file(self.url, os.path.basename(self.url))
+        # only the url of the main source is needed to list the archives
+        archives = self.archive_list(Source(self.url, ':', main_path))
+        paths = [None] * len(archives)
+        hashes = [None] * len(archives)
+        for idx, src_path, sha in self.check_or_get_files([arch_url for arch_url, _ in archives]):
+            paths[idx] = src_path
+            hashes[idx] = sha
+
+        sources = [(self.url, '', self.upstream_hashes[self.url])]
+        sources += [(arch_url, destination, sha) for (arch_url, destination), sha in zip(archives, hashes)]
+        self.extract_key = extractcache.cache_key(self.config.default_pattern, sources)
+        details = self.extract_cache.lookup(self.extract_key)
+        pattern = self.config.default_pattern
+        if details:
+            print_info("Reusing the sources extracted by the previous run")
+            main_src = Source(self.url, '', main_path, pattern, details=details[0])
+            archives_src = [Source(arch_url, destination, src_path, pattern, details=arch_details)
+                            for (arch_url, destination), src_path, arch_details in zip(archives, paths, details[1:])]
+        else:
+            self.extract_cache.reset()
+            main_src = Source(self.url, '', main_path, pattern, self.base_path)
+            archives_src = [Source(arch_url, destination, src_path, pattern, self.base_path)
+                            for (arch_url, destination), src_path in zip(archives, paths)]
+        self.record_archives(archives, hashes, archives_src)
+        return main_src, archives_src, not details
+
     def process(self, filemanager):
         """Download and process the tarball."""
         # determine build pattern and build requirements from url
@@ -501,7 +749,10 @@ class Content(object):
         # exists)
         self.set_gcov()
         # Download and process main source
-        main_src = self.process_main_source(self.url)
+        if self.extract_cache is not None:
+            main_src, archives_src, extract = self.process_cached_sources()
+        else:
+            main_src = self.process_main_source(self.url)
         # Store the detected prefix associated with this file
         self.prefixes[self.url] = main_src.prefix
         self.tarball_prefix = main_src.prefix
@@ -513,8 +764,15 @@ class Content(object):
         #print(f"self.path: {self.path} - self.base_path: {self.base_path} - self.tarball_prefix: {self.tarball_prefix}")
         # Now that the metadata has been collected print the header
         self.print_header()
-        # Download and process extra sources: archives, go archives and
-        # multiversion
-        archives_src = self.process_archives(main_src)
-        # Extract all sources
-        self.extract_sources(main_src, archives_src)
+        if self.extract_cache is None:
+            # Download and process extra sources: archives, go archives and
+            # multiversion
+            archives_src = self.process_archives(main_src)
+            # Extract all sources
+            self.extract_sources(main_src, archives_src)
+        elif extract:
+            self.extract_sources(main_src, archives_src)
+            details = [src.get_details() for src in [main_src] + archives_src]
+            self.extract_cache.record(self.extract_key, details)
+        if self.source_cache is not None:
+            print_info(self.source_cache.summary())
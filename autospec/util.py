@@ -17,6 +17,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import gzip
 import hashlib
 import os
 import re
@@ -24,8 +25,10 @@ import shlex
 import subprocess
 import sys
 
+import patternindex
+
 dictionary_filename = os.path.dirname(__file__) + "/translate.dic"
-dictionary = [line.strip() for line in open(dictionary_filename, 'r')]
+dictionary = patternindex.get_index().translations(dictionary_filename)
 os_paths = None
 debugging : bool = False
 
@@ -39,6 +42,75 @@ def scantree(path):
             yield entry
 
 
+class SourceTree(object):
+    """Directory listing of a source tree, read with a single traversal.
+
+    The scanners that used to run os.walk over the same tree one after the
+    other walk this in-memory index instead, so the file system is only
+    traversed once however many of them look at it.
+    """
+
+    def __init__(self, root):
+        """Index every directory below root."""
+        self.root = root
+        self.dirs = {}  # normalized dirpath -> (dirnames, filenames) in scandir order
+        stack = [os.path.normpath(root)]
+        while stack:
+            path = stack.pop()
+            dirnames = []
+            filenames = []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        # classify and descend like os.walk: symlinks to
+                        # directories are listed as such but not followed
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        if not is_dir:
+                            filenames.append(entry.name)
+                            continue
+                        dirnames.append(entry.name)
+                        try:
+                            if not entry.is_symlink():
+                                stack.append(entry.path)
+                        except OSError:
+                            pass
+            except OSError:
+                # unreadable, os.walk skips it as well
+                continue
+            self.dirs[path] = (dirnames, filenames)
+
+    def walk(self, top, topdown=True):
+        """Yield (dirpath, dirnames, filenames) exactly as os.walk(top) would.
+
+        With topdown, pruning dirnames in place skips those directories.
+        Falls back to os.walk for a top outside of the index.
+        """
+        key = os.path.normpath(top)
+        if key not in self.dirs:
+            yield from os.walk(top, topdown=topdown)
+            return
+        # look paths up normalized but yield them spelled as os.walk(top) does
+        stack = [(top, key, False)]
+        while stack:
+            path, key, visited = stack.pop()
+            dirnames, filenames = self.dirs[key]
+            if visited:
+                yield path, list(dirnames), list(filenames)
+                continue
+            if topdown:
+                dirnames = list(dirnames)
+                yield path, dirnames, list(filenames)
+            else:
+                stack.append((path, key, True))
+            for name in reversed(dirnames):
+                subkey = os.path.join(key, name)
+                if subkey in self.dirs:
+                    stack.append((os.path.join(path, name), subkey, False))
+
+
 def call(command, logfile=None, check=True, **kwargs):
     """Subprocess.call convenience wrapper."""
     returncode = 1
@@ -73,11 +145,7 @@ def _file_write(self, s):
 
 def translate(package):
     """Convert terms to their alternate definition."""
-    global dictionary
-    for item in dictionary:
-        if item.startswith(package + "="):
-            return item.split("=")[1]
-    return package
+    return dictionary.get(package, package)
 
 
 def do_regex(patterns, re_str):
@@ -209,11 +277,20 @@ def open_auto(*args, **kwargs):
     """Open a file with UTF-8 encoding.
 
     Open file with UTF-8 encoding and "surrogate" escape characters that are
-    not valid UTF-8 to avoid data corruption.
+    not valid UTF-8 to avoid data corruption. Files ending in .gz are
+    (de)compressed transparently, and in a binary mode give bytes.
     """
     # 'encoding' and 'errors' are fourth and fifth positional arguments, so
     # restrict the args tuple to (file, mode, buffering) at most
     assert len(args) <= 3
     assert 'encoding' not in kwargs
     assert 'errors' not in kwargs
+    if isinstance(args[0], str) and args[0].endswith(".gz"):
+        # compressed (archived) logs are read and written transparently
+        mode = args[1] if len(args) > 1 else kwargs.pop("mode", "r")
+        if "b" in mode:
+            return gzip.open(args[0], mode)
+        if "t" not in mode:
+            mode += "t"
+        return gzip.open(args[0], mode, encoding="utf-8", errors="surrogateescape")
     return open(*args, encoding="utf-8", errors="surrogateescape", **kwargs)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+#
+# Benchmark counting test results in a large synthetic test log, with and
+# without format detection
+#
+# PYTHONPATH=autospec python3 tests/bench_count.py [lines]
+#
+
+import os
+import sys
+import tempfile
+import time
+
+import count
+
+NOISE = [
+    "make[2]: Entering directory '/builddir/build/BUILD/foo-1.0/tests'",
+    "gcc -DHAVE_CONFIG_H -I. -I..  -O2 -g -c -o test-main.o test-main.c",
+    "libtool: link: gcc -O2 -g -o .libs/test-main test-main.o ../src/.libs/libfoo.so",
+    "# Subtest: lib/Foo/Bar.pm",
+]
+
+
+def write_log(path, lines):
+    """Write a %check log of about lines lines, TAP results among build noise."""
+    with open(path, "w") as logf:
+        logf.write("Executing(%check)\n+ make check\n")
+        for i in range(lines):
+            if i % 3:
+                logf.write(NOISE[i % len(NOISE)] + "\n")
+            elif i % 100:
+                logf.write("ok {} - test number {}\n".format(i, i))
+            else:
+                logf.write("not ok {} - test number {} # TODO later\n".format(i, i))
+
+
+def parse(path, detect):
+    """Return the result and seconds taken parsing path."""
+    start = time.perf_counter()
+    result = count.count_log(path, detect)
+    return result, time.perf_counter() - start
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmpd:
+        path = os.path.join(tmpd, "build.log")
+        write_log(path, lines)
+        for detect in (False, True):
+            result, elapsed = parse(path, detect)
+            print("detect={}: {} lines in {:.3f}s ({:.0f} lines/s) -> {}".format(
+                detect, lines, elapsed, lines / elapsed, result))
+
+
+if __name__ == '__main__':
+    main()
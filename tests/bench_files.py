@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+#
+# Benchmark FileManager.push_file on a synthetic install tree
+#
+# PYTHONPATH=autospec python3 tests/bench_files.py [count]
+#
+
+import sys
+import time
+
+import build
+import config
+from files import FileManager
+
+DIRS = ["/usr/bin", "/usr/lib64", "/usr/lib64/haswell", "/usr/lib32", "/usr/include/foo",
+        "/usr/lib64/pkgconfig", "/usr/share/man/man1", "/usr/share/man/man3",
+        "/usr/share/doc/foo", "/usr/share/info", "/usr/lib/python3.9/site-packages/foo",
+        "/usr/share/texmf-dist/tex/latex/foo", "/usr/share/icons/hicolor/48x48/apps",
+        "/usr/lib64/cmake/Foo", "/usr/share/qt5/translations", "/usr/libexec/foo"]
+NAMES = ["foo", "libfoo.so", "libfoo.so.1.2.3", "libfoo.a", "foo.h", "foo.pc", "foo.1",
+         "foo.3", "README", "foo.info", "foo.py", "foo.sty", "foo.png", "FooConfig.cmake",
+         "foo_de.qm", "helper"]
+
+
+def synthetic_tree(count):
+    """Return count distinct synthetic install paths."""
+    paths = []
+    i = 0
+    while len(paths) < count:
+        for d in DIRS:
+            for n in NAMES:
+                paths.append("{}/d{}/{}".format(d, i, n))
+        i += 1
+    return paths[:count]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    paths = synthetic_tree(count)
+    conf = config.Config("")
+    conf.config_opts["exclude_locales"] = False
+    fm = FileManager(conf, build.Build(), "", None)
+    fm.newfiles_printed = True
+    start = time.perf_counter()
+    for path in paths:
+        fm.push_file(path, "foo")
+    elapsed = time.perf_counter() - start
+    print("classified {} paths in {:.2f}s ({:.0f} paths/s)".format(count, elapsed, count / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+#
+# Benchmark loading the pattern tables cold (parsed from text) and warm
+# (from the pattern index), and translate() lookups
+#
+# PYTHONPATH=autospec python3 tests/bench_patterns.py [lookups]
+#
+
+import os
+import sys
+import tempfile
+import time
+
+import config
+import patternindex
+import util
+
+
+def load_patterns(index_path):
+    """Return the seconds taken by both setup_patterns calls of a run."""
+    patternindex._index = patternindex.PatternIndex(index_path)
+    start = time.perf_counter()
+    conf = config.Config("")
+    conf.setup_patterns()
+    conf.setup_patterns(conf.failed_pattern_dir)
+    patternindex.get_index().translations(util.dictionary_filename)
+    return time.perf_counter() - start
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmpd:
+        index_path = os.path.join(tmpd, patternindex.INDEX_FILE)
+        cold = load_patterns(index_path)
+        warm = min(load_patterns(index_path) for _ in range(5))
+    print("pattern tables: cold {:.1f}ms, from index {:.1f}ms".format(cold * 1000, warm * 1000))
+
+    names = list(util.dictionary) + ["not-translated"]
+    start = time.perf_counter()
+    for i in range(lookups):
+        util.translate(names[i % len(names)])
+    elapsed = time.perf_counter() - start
+    print("translated {} names in {:.3f}s ({:.0f} lookups/s)".format(lookups, elapsed, lookups / elapsed))
+
+
+if __name__ == '__main__':
+    main()
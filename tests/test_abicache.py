@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+import abicache
+import elfreader
+
+
+def make_elf(soname, symbols):
+    elf = elfreader.ElfFile(64, elfreader.ET_DYN)
+    elf.soname = soname
+    elf.needed = ["libc.so.6"]
+    elf.symbols = set(symbols)
+    return elf
+
+
+class TestAbicache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpd.name, abicache.CACHE_FILE)
+
+    def tearDown(self):
+        self.tmpd.cleanup()
+
+    def test_get_put(self):
+        """
+        Test a cached entry comes back equal and hits and misses are counted
+        """
+        cache = abicache.AbiCache(self.path)
+        self.assertIsNone(cache.get("sha256:a"))
+        cache.put("sha256:a", make_elf("liba.so.1", ["a1", "a2"]))
+        elf = cache.get("sha256:a")
+        self.assertEqual(elf.soname, "liba.so.1")
+        self.assertEqual(elf.needed, ["libc.so.6"])
+        self.assertEqual(elf.symbols, set(["a1", "a2"]))
+        self.assertTrue(elf.is_shared_object)
+        self.assertEqual(cache.summary(), "ABI cache: 1 hits, 1 misses, 0 evicted, 1 entries")
+
+    def test_save_load(self):
+        """
+        Test the cache survives a save and load, and a stale version is dropped
+        """
+        cache = abicache.AbiCache(self.path)
+        cache.put("sha256:a", make_elf("liba.so.1", ["a1"]))
+        cache.save()
+        self.assertEqual(abicache.AbiCache(self.path).get("sha256:a").symbols, set(["a1"]))
+
+        backup = abicache.CACHE_VERSION
+        abicache.CACHE_VERSION = backup + 1
+        try:
+            self.assertIsNone(abicache.AbiCache(self.path).get("sha256:a"))
+        finally:
+            abicache.CACHE_VERSION = backup
+
+    def test_load_corrupt(self):
+        """
+        Test a corrupt cache file is ignored
+        """
+        with open(self.path, "w") as cache_file:
+            cache_file.write("{not json")
+        self.assertEqual(len(abicache.AbiCache(self.path).entries), 0)
+
+    def test_lru_eviction(self):
+        """
+        Test the least recently used entries are evicted to fit max_bytes
+        """
+        weight = abicache._weight({"symbols": ["s" * 100], "needed": ["libc.so.6"]})
+        cache = abicache.AbiCache(self.path, max_bytes=weight * 2)
+        cache.put("a", make_elf("liba", ["s" * 100]))
+        cache.put("b", make_elf("libb", ["s" * 100]))
+        cache.get("a")
+        cache.put("c", make_elf("libc", ["s" * 100]))
+        self.assertEqual(list(cache.entries), ["a", "c"])
+        self.assertEqual(cache.evicted, 1)
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
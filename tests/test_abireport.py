@@ -1,5 +1,11 @@
+import os
+import tempfile
 import unittest
+from concurrent.futures import ProcessPoolExecutor
+import abicache
 import abireport
+import elfreader
+from test_elfreader import build_elf
 
 
 def mock_return(retval):
@@ -174,6 +180,48 @@ class TestAbireport(unittest.TestCase):
 
         self.assertEqual(dumpsymbols.exception.code, 1)
 
+    def test_get_all_dependencies(self):
+        """
+        Test get_all_dependencies skips internal sonames and gives the same
+        result when the tree is scanned by a worker pool
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            os.makedirs(os.path.join(tmpd, "usr/lib64"))
+            os.makedirs(os.path.join(tmpd, "usr/bin"))
+            with open(os.path.join(tmpd, "usr/lib64/libtest.so.1"), "wb") as elf:
+                elf.write(build_elf(needed=("libc.so.6",)))
+            with open(os.path.join(tmpd, "usr/bin/test"), "wb") as elf:
+                elf.write(build_elf(soname=None, needed=("libtest.so.1", "libm.so.6"), flags_1=elfreader.DF_1_PIE))
+            with open(os.path.join(tmpd, "usr/bin/script"), "w") as script:
+                script.write("#!/bin/sh\n")
+            os.symlink("libtest.so.1", os.path.join(tmpd, "usr/lib64/libtest.so"))
+
+            self.assertEqual(abireport.get_all_dependencies(tmpd), set(["libc.so.6", "libm.so.6"]))
+            with ProcessPoolExecutor(max_workers=2) as pool:
+                elves = abireport.scan_elf_files(tmpd, pool)
+            self.assertEqual(sorted(elves), sorted(abireport.scan_elf_files(tmpd)))
+            self.assertIsNone(elves[os.path.join(tmpd, "usr/bin/script")])
+            self.assertEqual(abireport.get_all_dependencies(tmpd, elves), set(["libc.so.6", "libm.so.6"]))
+
+    def test_scan_elf_files_cache(self):
+        """
+        Test scan_elf_files only inspects files missing from the cache
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            with open(os.path.join(tmpd, "libtest.so.1"), "wb") as elf:
+                elf.write(build_elf())
+            with open(os.path.join(tmpd, "README"), "w") as readme:
+                readme.write("not an ELF file\n")
+            cache = abicache.AbiCache(os.path.join(tmpd, "cache"))
+            first = abireport.scan_elf_files(tmpd, cache=cache)
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+            second = abireport.scan_elf_files(tmpd, cache=cache)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            lib = os.path.join(tmpd, "libtest.so.1")
+            self.assertEqual(second[lib].symbols, first[lib].symbols)
+            self.assertEqual(second[lib].soname, "libtest.so.1")
+            self.assertIsNone(second[os.path.join(tmpd, "README")])
+
 
 READELF1 = """
 
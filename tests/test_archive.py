@@ -0,0 +1,141 @@
+import os
+import shutil
+import socket
+import subprocess
+import tarfile
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import archive
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.tree = os.path.join(self.tmpd.name, "pkg-1.0")
+        os.mkdir(self.tree)
+        os.mkdir(os.path.join(self.tree, "src"))
+        for name, mode in [("README", 0o664), ("configure", 0o775), ("src/main.c", 0o600)]:
+            with open(os.path.join(self.tree, name), "w") as srcf:
+                srcf.write(name)
+            os.chmod(os.path.join(self.tree, name), mode)
+        os.symlink("README", os.path.join(self.tree, "README.md"))
+
+    def tearDown(self):
+        self.tmpd.cleanup()
+
+    def archive(self, tree, name, **kwargs):
+        dest = os.path.join(self.tmpd.name, name)
+        with patch.dict(os.environ, {"SOURCE_DATE_EPOCH": "1000000000"}):
+            archive.write_archive(tree, dest, "pkg-1.0", **kwargs)
+        with open(dest, "rb") as archf:
+            return dest, archf.read()
+
+    def test_write_archive_reproducible(self):
+        """
+        Test archives of the same files checked out at another time, with
+        another umask, are identical, sorted and normalized
+        """
+        dest, first = self.archive(self.tree, "first.tar.gz")
+        copy = os.path.join(self.tmpd.name, "copy")
+        shutil.copytree(self.tree, copy, symlinks=True)
+        for name in ["README", "configure", "src/main.c"]:
+            os.chmod(os.path.join(copy, name), 0o644 if name != "configure" else 0o755)
+            os.utime(os.path.join(copy, name), (2000000000, 2000000000))
+        _, second = self.archive(copy, "second.tar.gz")
+        self.assertEqual(first, second)
+
+        with tarfile.open(dest) as tar:
+            members = tar.getmembers()
+        self.assertEqual([m.name for m in members],
+                         ["pkg-1.0", "pkg-1.0/README", "pkg-1.0/README.md", "pkg-1.0/configure", "pkg-1.0/src", "pkg-1.0/src/main.c"])
+        modes = {m.name: m.mode for m in members}
+        self.assertEqual(modes["pkg-1.0/configure"], 0o755)
+        self.assertEqual(modes["pkg-1.0/src/main.c"], 0o644)
+        self.assertTrue(all(m.uid == 0 and m.uname == "" and m.mtime <= 1000000000 for m in members))
+
+    def test_write_archive_socket(self):
+        """
+        Test sockets in the tree are left out of the archive
+        """
+        sock = socket.socket(socket.AF_UNIX)
+        sock.bind(os.path.join(self.tree, "src", "agent.sock"))
+        try:
+            dest, _ = self.archive(self.tree, "socket.tar.gz")
+        finally:
+            sock.close()
+        with tarfile.open(dest) as tar:
+            self.assertNotIn("pkg-1.0/src/agent.sock", tar.getnames())
+            self.assertIn("pkg-1.0/src/main.c", tar.getnames())
+
+    def test_write_archive_git_state(self):
+        """
+        Test the index, reflogs and fetch state of a clone and its
+        submodules are left out, the rest of .git is kept
+        """
+        for name in [".git/HEAD", ".git/index", ".git/FETCH_HEAD", ".git/logs/HEAD", ".git/refs/heads/index",
+                     ".git/modules/sub/index", ".git/modules/sub/config", "index"]:
+            os.makedirs(os.path.dirname(os.path.join(self.tree, name)), exist_ok=True)
+            with open(os.path.join(self.tree, name), "w") as gitf:
+                gitf.write(name)
+        dest, _ = self.archive(self.tree, "git.tar.gz")
+        with tarfile.open(dest) as tar:
+            names = [n[len("pkg-1.0/"):] for n in tar.getnames()]
+        self.assertEqual(sorted(n for n in names if "git" in n or "index" in n),
+                         [".git", ".git/HEAD", ".git/modules", ".git/modules/sub", ".git/modules/sub/config",
+                          ".git/refs", ".git/refs/heads", ".git/refs/heads/index", "index"])
+
+    def test_write_archive_gzip_module(self):
+        """
+        Test the gzip module writes reproducible archives without pigz
+        """
+        with patch("archive.shutil.which", return_value=None):
+            dest, first = self.archive(self.tree, "first.tar.gz", level=1)
+            _, second = self.archive(self.tree, "second.tar.gz", level=1)
+        self.assertEqual(first, second)
+        with tarfile.open(dest) as tar:
+            self.assertEqual(tar.extractfile("pkg-1.0/src/main.c").read(), b"src/main.c")
+
+    @unittest.skipUnless(shutil.which("zstd"), "zstd is not installed")
+    def test_write_archive_zstd(self):
+        """
+        Test zstd archives do not depend on the number of threads
+        """
+        _, first = self.archive(self.tree, "first.tar.zst", codec="zstd", level=3, threads=1)
+        _, second = self.archive(self.tree, "second.tar.zst", codec="zstd", level=3, threads=4)
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith(b"\x28\xb5\x2f\xfd"))
+
+    def test_write_archive_git(self):
+        """
+        Test git archive writes the committed files without .git
+        """
+        git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        for args in (["init", "-q"], ["add", "."], ["commit", "-q", "-m", "initial"]):
+            subprocess.run(git + args, cwd=self.tree, check=True)
+        with open(os.path.join(self.tree, "untracked"), "w") as untracked:
+            untracked.write("")
+        dest, first = self.archive(self.tree, "first.tar.gz", use_git=True)
+        _, second = self.archive(self.tree, "second.tar.gz", use_git=True)
+        self.assertEqual(first, second)
+        with tarfile.open(dest) as tar:
+            names = tar.getnames()
+        self.assertIn("pkg-1.0/src/main.c", names)
+        self.assertNotIn("pkg-1.0/untracked", names)
+        self.assertFalse([name for name in names if "/.git/" in name])
+
+    def test_write_archive_failure(self):
+        """
+        Test a failing compressor raises and leaves no archive behind
+        """
+        dest = os.path.join(self.tmpd.name, "pkg.tar.gz")
+        with patch("archive.compress_command", return_value=["false"]):
+            with self.assertRaises(subprocess.CalledProcessError):
+                archive.write_archive(self.tree, dest)
+        self.assertEqual(sorted(os.listdir(self.tmpd.name)), ["pkg-1.0"])
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
@@ -528,6 +528,216 @@ class TestBuildpattern(unittest.TestCase):
         # check no files were added
         self.assertEqual(pkg.must_restart, 0)
 
+    def test_parse_build_results_unchanged_sections(self):
+        """
+        Test parse_build_results only scans build.log sections that changed
+        since the previous round, and replays the matches of the others
+        """
+        conf = config.Config('')
+        conf.setup_patterns()
+        tcontent = tarball.Content("", "", "", [], conf, "/", "", False, "", [], False, False)
+        pkg = build.Build()
+        pkg.short_circuit = None
+        fm = files.FileManager(conf, pkg, "", None)
+
+        prep = 'Executing(%prep): /bin/sh -e /var/tmp/rpm-tmp.{}\n' \
+               'checking for Apache test module support\n'
+        build_ok = 'Executing(%build): /bin/sh -e /var/tmp/rpm-tmp.{}\n' \
+                   'make all\n'
+        build_fail = 'Executing(%build): /bin/sh -e /var/tmp/rpm-tmp.{}\n' \
+                     'make all\n' \
+                     "No package 'testpkg' found\n"
+
+        with tempfile.TemporaryDirectory() as tmpd:
+            log = os.path.join(tmpd, 'build.log')
+            rounds = [prep.format('aaa') + build_ok.format('bbb'),
+                      prep.format('ccc') + build_ok.format('ddd'),
+                      prep.format('eee') + build_fail.format('fff')]
+            results = []
+            for content in rounds:
+                with open(log, 'w') as logf:
+                    logf.write(content)
+                reqs = buildreq.Requirements("")
+                pkg.parse_build_results(log, 1, fm, conf, reqs, tcontent)
+                results.append((pkg.lines_scanned, pkg.lines_total, pkg.must_restart, reqs.buildreqs_cache))
+
+        self.assertEqual(results[0][:3], (4, 4, 1))
+        self.assertEqual(results[0][3], set(['httpd-dev']))
+        # nothing changed, only the recorded match is replayed
+        self.assertEqual(results[1][:3], (0, 4, 1))
+        self.assertEqual(results[1][3], set(['httpd-dev']))
+        # only the %build section is scanned again
+        self.assertEqual(results[2][:3], (3, 5, 2))
+        self.assertEqual(results[2][3], set(['httpd-dev', 'pkgconfig(testpkg)']))
+
+    def test_run_mock_build_follow(self):
+        """
+        Test run_mock_build stops mock once build.log shows a missing
+        requirement, instead of waiting for the build to finish
+        """
+        conf = config.Config('')
+        conf.setup_patterns()
+        reqs = buildreq.Requirements("")
+        pkg = build.Build()
+        pkg.follow_log = True
+        pkg.short_circuit = None
+        script = ("import os, time\n"
+                  "os.makedirs('results', exist_ok=True)\n"
+                  "with open('results/build.log', 'w') as log:\n"
+                  "    log.write('Executing(%build): /bin/sh -e /var/tmp/rpm-tmp.aaa\\n')\n"
+                  "    log.write(\"No package 'testpkg' found\\n\")\n"
+                  "    log.flush()\n"
+                  "    time.sleep(60)\n")
+        with tempfile.TemporaryDirectory() as tmpd:
+            conf.download_path = tmpd
+            with open(os.path.join(tmpd, 'mock.py'), 'w') as mockf:
+                mockf.write(script)
+            with patch('build.FOLLOW_INTERVAL', 0.05), patch('build.FOLLOW_LINGER', 0):
+                ret = pkg.run_mock_build('python3 mock.py', os.path.join(tmpd, 'mock_build.log'), conf, reqs)
+
+        self.assertNotEqual(ret, 0)
+        self.assertTrue(pkg.stopped_early)
+        self.assertEqual(pkg.must_restart, 1)
+        self.assertIn('pkgconfig(testpkg)', reqs.buildreqs_cache)
+
+    def test_run_mock_build_no_follow(self):
+        """
+        Test run_mock_build just runs mock when not following build.log
+        """
+        pkg = build.Build()
+        conf = config.Config('')
+        with patch('build.util.call', return_value=3) as mock_call:
+            ret = pkg.run_mock_build('mock --rebuild', 'mock_build.log', conf, None)
+        self.assertEqual(ret, 3)
+        self.assertFalse(pkg.stopped_early)
+        mock_call.assert_called_once_with('mock --rebuild', logfile='mock_build.log', check=False, cwd=conf.download_path)
+
+    def test_srpm_inputs_digest(self):
+        """
+        Test srpm_inputs_digest changes with the spec, the content of its
+        sources and the mock options, but not with other files
+        """
+        pkg = build.Build()
+        conf = config.Config('')
+        content = MagicMock()
+        content.name = 'testpkg'
+        content.version = '1.0'
+        content.release = '1'
+        with tempfile.TemporaryDirectory() as tmpd:
+            conf.download_path = tmpd
+
+            def write(name, text):
+                with open(os.path.join(tmpd, name), 'w') as outf:
+                    outf.write(text)
+
+            write('testpkg.spec', 'Name: testpkg\n'
+                                  'Source0  : https://example.com/%{name}-%{version}.tar.gz\n'
+                                  'Patch1: 0001-fix.patch\n')
+            write('testpkg-1.0.tar.gz', 'tarball')
+            write('0001-fix.patch', 'patch')
+            first = pkg.srpm_inputs_digest(conf, content, ['clear', ''])
+            write('unrelated', 'file')
+            self.assertEqual(pkg.srpm_inputs_digest(conf, content, ['clear', '']), first)
+            self.assertNotEqual(pkg.srpm_inputs_digest(conf, content, ['clear', '-v']), first)
+            write('0001-fix.patch', 'patch v2')
+            second = pkg.srpm_inputs_digest(conf, content, ['clear', ''])
+            self.assertNotEqual(second, first)
+            os.unlink(os.path.join(tmpd, 'testpkg-1.0.tar.gz'))
+            self.assertNotEqual(pkg.srpm_inputs_digest(conf, content, ['clear', '']), second)
+
+    def test_package_reuses_srpm(self):
+        """
+        Test package only runs mock --buildsrpm again once the spec changed
+        """
+        pkg = build.Build()
+        conf = config.Config('')
+        content = MagicMock()
+        content.name = 'testpkg'
+        content.version = '1.0'
+        content.release = '1'
+        filemanager = MagicMock()
+        filemanager.has_banned = False
+        with tempfile.TemporaryDirectory() as tmpd:
+            conf.download_path = tmpd
+
+            def write(name, text):
+                with open(os.path.join(tmpd, name), 'w') as outf:
+                    outf.write(text)
+
+            def fake_call(cmd, **kwargs):
+                # mock writes the SRPM and build.log into results/
+                if '--buildsrpm' in cmd:
+                    write('results/testpkg-1.0-1.src.rpm', 'srpm')
+                write('results/build.log', '')
+                return 0
+
+            write('testpkg.spec', 'Name: testpkg\n')
+            srpm_builds = []
+            with patch('build.get_mock_cmd', return_value='mock'), \
+                    patch('build.util.call', side_effect=fake_call) as mock_call, \
+                    patch.object(pkg, 'run_mock_build', side_effect=lambda *args: fake_call('')), \
+                    patch.object(pkg, 'parse_buildroot_log', return_value=False):
+                for spec in ('Name: testpkg\n', 'Name: testpkg\n', 'Name: testpkg\n%files\n'):
+                    write('testpkg.spec', spec)
+                    pkg.package(filemanager, 'clear', '', conf, None, content, tmpd, None)
+                    srpm_builds.append(sum('--buildsrpm' in c.args[0] for c in mock_call.call_args_list))
+
+        self.assertEqual(srpm_builds, [1, 1, 2])
+        self.assertFalse(pkg.srpm_reused)
+
+    def test_package_reused_srpm_save_mock_logs(self):
+        """
+        Test save_mock_logs after rounds reusing the SRPM, which write no
+        srpm logs
+        """
+        pkg = build.Build()
+        conf = config.Config('')
+        content = MagicMock()
+        content.name = 'testpkg'
+        content.version = '1.0'
+        content.release = '1'
+        filemanager = MagicMock()
+        filemanager.has_banned = False
+        with tempfile.TemporaryDirectory() as tmpd:
+            conf.download_path = tmpd
+            results = os.path.join(tmpd, 'results')
+
+            def touch(name):
+                with open(os.path.join(results, name), 'w'):
+                    pass
+
+            def fake_call(cmd, logfile=None, **kwargs):
+                # mock writes its logs and the SRPM into results/
+                if cmd.startswith('mv '):
+                    os.rename(*[os.path.join(tmpd, arg) for arg in cmd.split()[1:]])
+                    return 0
+                if logfile:
+                    touch(os.path.basename(logfile))
+                if '--buildsrpm' in cmd:
+                    touch('testpkg-1.0-1.src.rpm')
+                touch('build.log')
+                touch('root.log')
+                return 0
+
+            with open(os.path.join(tmpd, 'testpkg.spec'), 'w') as specf:
+                specf.write('Name: testpkg\n')
+            reused = []
+            with patch('build.get_mock_cmd', return_value='mock'), \
+                    patch('build.util.call', side_effect=fake_call), \
+                    patch.object(pkg, 'run_mock_build', side_effect=lambda cmd, logfile, *args: fake_call(cmd, logfile)), \
+                    patch.object(pkg, 'parse_buildroot_log', return_value=False):
+                for _ in range(3):
+                    pkg.package(filemanager, 'clear', '', conf, None, content, tmpd, None)
+                    reused.append(pkg.srpm_reused)
+                    build.save_mock_logs(tmpd, pkg.round)
+            logs = sorted(name for name in os.listdir(results) if name.endswith('.log'))
+
+        self.assertEqual(reused, [False, True, True])
+        self.assertEqual(logs, ['round1-build.log', 'round1-mock_build.log', 'round1-mock_srpm.log',
+                                'round1-root.log', 'round1-srpm-build.log', 'round1-srpm-root.log',
+                                'round2-build.log', 'round2-mock_build.log', 'round2-root.log',
+                                'round3-build.log', 'round3-mock_build.log', 'round3-root.log'])
+
     def test_get_mock_cmd_without_consolehelper(self):
         """
         Test get_mock_cmd when /usr/bin/mock doesn't point to consolehelper
@@ -216,11 +216,12 @@ class TestBuildreq(unittest.TestCase):
         content = 'does not matter, let us mock'
         m_open = mock_open(read_data=content)
         conf = config.Config("")
-        with patch(open_name, m_open, create=True):
-            self.reqs.parse_cargo_toml('filename', conf)
-
-        buildreq.os.path.exists = exists_backup
-        buildreq.toml.loads = loads_backup
+        try:
+            with patch(open_name, m_open, create=True):
+                self.reqs.parse_cargo_toml('filename', conf)
+        finally:
+            buildreq.os.path.exists = exists_backup
+            buildreq.toml.loads = loads_backup
 
         self.assertEqual(self.reqs.buildreqs,
                          set(['rustc', 'dep1', 'dep2', 'dep3']))
@@ -555,6 +556,26 @@ class TestBuildreq(unittest.TestCase):
         self.assertEqual(self.reqs.buildreqs,
                          set(['pkgconfig(gio-unix-2.0)', 'pkgconfig(glib-2.0)']))
 
+    def test_parse_meson_build(self):
+        """
+        Test parse_meson_build adds the required pkgconfig dependencies only
+        """
+        content = ("glib = dependency('glib-2.0', version : '>= 2.56')\n"
+                   "gio = dependency(\n"
+                   "  'gio-2.0',\n"
+                   "  required : true)\n"
+                   "foo = dependency('foo', required : false)\n"
+                   "bar = dependency('bar', required : get_option('bar'))\n"
+                   "threads = dependency('threads')\n"
+                   "lib_dep = declare_dependency(link_with : lib)\n")
+        with tempfile.TemporaryDirectory() as tmpd:
+            with open(os.path.join(tmpd, 'meson.build'), 'w') as f:
+                f.write(content)
+            self.reqs.parse_meson_build(os.path.join(tmpd, 'meson.build'), False)
+
+        self.assertEqual(self.reqs.buildreqs,
+                         set(['pkgconfig(glib-2.0)', 'pkgconfig(gio-2.0)']))
+
     def test_parse_cmake_pkg_check_modules_in_a_comment(self):
         """
         Test parse_cmake to ensure it ignores pkg_check_modules in comments.
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import mock_open, patch
 import count
@@ -81,10 +83,10 @@ pats = [
      '495: AC_FUNC_STRNLEN                                 ok\n'
      '344: Erlang                                          skipped (erlang.at:30)\n'
      '26: autoupdating macros recursively                 expected failure (tools.at:945)',
-    [503, 493, 0, 0, 10, 3, 1, 0, 1, 1]),
+     [503, 493, 0, 0, 10, 3, 1, 0, 1, 1]),
     # bison
     ('470 tests were successful',
-    [470, 470, 0, 0, 0, 0, 0, 0, 0, 0]),
+     [470, 470, 0, 0, 0, 0, 0, 0, 0, 0]),
     # binutils
     ('# of expected passes\t1144\n'
      '# of expected failures\t57\n'
@@ -360,7 +362,7 @@ pats = [
      [1, 0, 0, 0, 1, 0, 0, 0, 0, 0]),
     # xdg-utils
     ('TOTAL: 4 tests failed, 90 of 116 tests passed. (140 attempted)',
-    [140, 90, 4, 0, 46, 0, 0, 0, 0, 0]),
+     [140, 90, 4, 0, 46, 0, 0, 0, 0, 0]),
     # slang
     ('Testing argv processing ...Ok',
      [1, 1, 0, 0, 0, 0, 0, 0, 0, 0]),
@@ -477,6 +479,7 @@ pats = [
 
 backup_zero_test_data = count.zero_test_data
 
+
 def mock_zero_test_data():
     pass
 
@@ -507,7 +510,7 @@ def test_generator(line, expected):
         """
         content = '+ make check\n' + line
         m_open = mock_open(read_data=content)
-        with patch('count.util.open_auto', m_open, create=True):
+        with patch('logreader.util.open_auto', m_open):
             count.zero_test_data = mock_zero_test_data
             count.parse_log('log')
             count.zero_test_data = backup_zero_test_data
@@ -539,5 +542,156 @@ def test_setup():
 test_setup()
 
 
+class TestDetect(unittest.TestCase):
+
+    def setUp(self):
+        self.counter = count.TestCounter(detect=True)
+        self.counter.feed_line('+ make check\n')
+
+    def test_detect_format(self):
+        """
+        Test a section only tries its format's rules once detected
+        """
+        for i in range(count.DETECT_MATCHES):
+            self.counter.feed_line('ok {} - test\n'.format(i))
+        self.assertEqual(self.counter._detected, 'tap')
+        self.counter.feed_line('test_default_serialization ... ok\n')
+        self.counter.feed_line('not ok 9 - test\n')
+        self.assertEqual(self.counter.counted_pass, count.DETECT_MATCHES)
+        self.assertEqual(self.counter.counted_fail, 1)
+
+    def test_detect_mixed(self):
+        """
+        Test a section mixing formats keeps trying every rule
+        """
+        for i in range(count.DETECT_MATCHES):
+            self.counter.feed_line('ok {} - test\n'.format(i))
+            self.counter.feed_line('test_{} ... ok\n'.format(i))
+        self.assertIsNone(self.counter._detected)
+        self.assertEqual(self.counter.counted_pass, 2 * count.DETECT_MATCHES)
+
+    def test_detect_reset(self):
+        """
+        Test a new package section forgets the detected format
+        """
+        for i in range(count.DETECT_MATCHES):
+            self.counter.feed_line('ok {} - test\n'.format(i))
+        self.counter.feed_line('CLR-XTEST: Package: foo\n')
+        self.assertIsNone(self.counter._detected)
+        self.counter.feed_line('test_default_serialization ... ok\n')
+        self.assertEqual(self.counter.counted_pass, 1)
+
+    def test_detect_off(self):
+        """
+        Test no format is detected unless detection is asked for
+        """
+        counter = count.TestCounter()
+        counter.feed_line('+ make check\n')
+        for i in range(count.DETECT_MATCHES):
+            counter.feed_line('ok {} - test\n'.format(i))
+        self.assertIsNone(counter._detected)
+
+    def test_detect_pytest_failed(self):
+        """
+        Test the pytest summary is counted after many FAILED lines, which
+        only count as go failures as well without detection
+        """
+        lines = ['tests/test_x.py::test_{} FAILED'.format(i) for i in range(count.DETECT_MATCHES)]
+        lines += ['tests/test_x.py::test_ok PASSED',
+                  '=================== 8 failed, 100 passed in 1.52 seconds ===================']
+        for detect, expected in ((False, ',116,100,16,0,0'), (True, ',108,100,8,0,0')):
+            counter = count.TestCounter(detect=detect)
+            for line in ['+ make check'] + lines:
+                counter.feed_line(line)
+            self.assertEqual(counter.finish_log(), expected)
+
+
+TESTDIR = os.path.join(os.getcwd(), "tests/testfiles/count")
+
+
+class TestBaselineLogs(unittest.TestCase):
+
+    def test_count_logs_as_parse_log(self):
+        """
+        Test logs counted without detection give what parse_log gave before
+        the rule table, recorded next to each log in testfiles/count
+        """
+        for name in sorted(os.listdir(TESTDIR)):
+            if not name.endswith(".log"):
+                continue
+            log = os.path.join(TESTDIR, name)
+            with open(log[:-len(".log")] + ".csv") as expected:
+                self.assertEqual(count.count_log(log), expected.read().strip(), name)
+
+
+LOG = ('+ make check\n'
+       'ok 1 - first\n'
+       'not ok 2 - second\n'
+       'ok 3 - third \u2713\n'
+       'CLR-XTEST: Package: foo\n'
+       '================= 6 passed, 2 skipped in 1.40 seconds ==================\n')
+
+
+class TestCounter(unittest.TestCase):
+
+    def test_counters_independent(self):
+        """
+        Test counters fed in turn do not share counts
+        """
+        first = count.TestCounter()
+        second = count.TestCounter('second')
+        second.feed_line('+ make check\n')
+        for line in LOG.splitlines(True):
+            first.feed_line(line)
+            second.feed_line('ok 1 - x\n')
+        self.assertEqual(first.finish_log(), 'foo,11,8,1,2,0')
+        self.assertEqual(second.finish_log(), 'second,6,6,0,0,0')
+
+    def test_feed_chunks(self):
+        """
+        Test byte chunks split anywhere count as the whole log does
+        """
+        whole = count.TestCounter()
+        whole.feed(LOG)
+        expected = whole.finish_log()
+        data = LOG.encode('utf-8')
+        for size in (1, 3, 7):
+            counter = count.TestCounter()
+            for i in range(0, len(data), size):
+                counter.feed(data[i:i + size])
+            self.assertEqual(counter.finish_log(), expected)
+
+    def test_feed_unterminated(self):
+        """
+        Test the last line of a log counts without a trailing newline
+        """
+        counter = count.TestCounter()
+        counter.feed('+ make check\nok 1 - first')
+        self.assertEqual(counter.finish_log(), ',1,1,0,0,0')
+
+    def test_snapshot(self):
+        """
+        Test a snapshot finishes with the counts so far, leaving the counter be
+        """
+        counter = count.TestCounter()
+        counter.feed('+ make check\nok 1 - first\n')
+        self.assertEqual(counter.snapshot().finish_log(), ',1,1,0,0,0')
+        counter.feed('ok 2 - second\n')
+        self.assertEqual(counter.finish_log(), ',2,2,0,0,0')
+
+    def test_count_logs(self):
+        """
+        Test logs counted over a process pool keep their order
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            logs = []
+            for i in range(5):
+                logs.append(os.path.join(tmpd, '{}.log'.format(i)))
+                with open(logs[-1], 'w') as logf:
+                    logf.write('+ make check\n' + 'ok 1 - x\n' * i)
+            results = list(count.count_logs(logs, jobs=2))
+        self.assertEqual(results, [(log, ',{0},{0},0,0,0'.format(i)) for i, log in enumerate(logs)])
+
+
 if __name__ == "__main__":
     unittest.main(buffer=True)
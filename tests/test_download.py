@@ -1,6 +1,15 @@
+from contextlib import redirect_stdout
 from enum import Enum, auto
+from functools import partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+import hashlib
+import os
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import patch, mock_open, call
+from unittest.mock import MagicMock, patch, mock_open, call
 
 import pycurl
 
@@ -102,17 +111,23 @@ class TestDownload(unittest.TestCase):
         data = download.do_curl("foo", is_fatal=True)
         test_exit.assert_called_once_with(1)
 
+    @patch('download.os.replace')
     @patch('download.open', new_callable=mock_open)
     @patch('download.pycurl.Curl')
-    def test_download_get_success_dest(self, test_curl, test_open):
+    def test_download_get_success_dest(self, test_curl, test_open, test_replace):
         """
-        Test successful GET request when dest is set.
+        Test successful GET request when dest is set, the response is
+        streamed to a partial file that is renamed to dest.
         """
         instance = init_curl_instance(test_curl)
         instance.setopt.side_effect = test_opts
-        data = download.do_curl("foo", "testdest")
-        test_open.assert_called_once_with('testdest', 'wb')
+        digests = {"sha1": None}
+        data = download.do_curl("foo", "testdest", digests=digests)
+        self.assertEqual(data, "testdest")
+        test_open.assert_called_once_with('testdest.part', 'wb')
         test_open().write.assert_called_once_with(b'foobar')
+        test_replace.assert_called_once_with('testdest.part', 'testdest')
+        self.assertEqual(digests["sha1"], hashlib.sha1(b'foobar').hexdigest())
 
     @patch('download.os.path.exists')
     @patch('download.open', new_callable=mock_open)
@@ -156,8 +171,230 @@ class TestDownload(unittest.TestCase):
         test_open.side_effect = IOError
         test_path.return_value = True
         data = download.do_curl("foo", "testdest")
-        test_path.assert_called_once_with("testdest")
-        test_unlink.assert_called_once_with("testdest")
+        test_path.assert_called_once_with("testdest.part")
+        test_unlink.assert_called_once_with("testdest.part")
+
+    def test_download_resume(self):
+        """
+        Test a partial download is resumed and hashed as a whole, and a stale
+        one larger than the file is started over.
+        """
+        content = os.urandom(100000)
+        with tempfile.TemporaryDirectory() as tmpd:
+            src = os.path.join(tmpd, "src.tar")
+            dest = os.path.join(tmpd, "dest.tar")
+            with open(src, "wb") as srcf:
+                srcf.write(content)
+            for part in [content[:40000], b"x" * 200000]:
+                with open(dest + ".part", "wb") as partf:
+                    partf.write(part)
+                digests = {"sha1": None, "sha256": None}
+                self.assertEqual(download.do_curl("file://" + src, dest, digests=digests), dest)
+                with open(dest, "rb") as destf:
+                    self.assertEqual(destf.read(), content)
+                self.assertEqual(digests["sha1"], hashlib.sha1(content).hexdigest())
+                self.assertEqual(digests["sha256"], hashlib.sha256(content).hexdigest())
+                self.assertNotIn("dest.tar.part", os.listdir(tmpd))
+
+    def test_download_failure_no_partial(self):
+        """
+        Test a failed download leaves neither dest nor an empty partial file
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            dest = os.path.join(tmpd, "dest.tar")
+            self.assertIsNone(download.do_curl("file://" + os.path.join(tmpd, "missing"), dest))
+            self.assertEqual(os.listdir(tmpd), [])
+
+
+class SlowHandler(SimpleHTTPRequestHandler):
+    """Serve files slowly and quietly."""
+
+    def do_GET(self):
+        time.sleep(0.05)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestFetchAll(unittest.TestCase):
+    """Tests for download.fetch_all against a local HTTP server."""
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.served = os.path.join(self.tmpd.name, "served")
+        os.mkdir(self.served)
+        self.contents = {}
+        for idx in range(8):
+            name = "archive{}.tar".format(idx)
+            self.contents[name] = os.urandom(50000 + idx)
+            with open(os.path.join(self.served, name), "wb") as archive:
+                archive.write(self.contents[name])
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), partial(SlowHandler, directory=self.served))
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.base = "http://127.0.0.1:{}/".format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.tmpd.cleanup()
+
+    def test_fetch_all(self):
+        """
+        Test fetch_all downloads and hashes everything, with at most per_host
+        transfers to the server at a time
+        """
+        names = sorted(self.contents)
+        downloads = [(self.base + name, os.path.join(self.tmpd.name, name)) for name in names]
+        lock = threading.Lock()
+        active = [0, 0]
+        do_curl = download.do_curl
+
+        def counting_curl(*args, **kwargs):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            try:
+                return do_curl(*args, **kwargs)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+        with patch('download.do_curl', counting_curl):
+            results = list(download.fetch_all(downloads, digests=("sha1",), jobs=6, per_host=3))
+        self.assertEqual(sorted(idx for idx, _, _ in results), list(range(len(names))))
+        for idx, dest, digests in results:
+            self.assertEqual(dest, downloads[idx][1])
+            with open(dest, "rb") as destf:
+                self.assertEqual(destf.read(), self.contents[names[idx]])
+            self.assertEqual(digests["sha1"], hashlib.sha1(self.contents[names[idx]]).hexdigest())
+        self.assertLessEqual(active[1], 3)
+        self.assertGreater(active[1], 1)
+
+    def test_fetch_all_fatal(self):
+        """
+        Test a failed download in fetch_all exits with the do_curl message
+        """
+        downloads = [(self.base + "archive0.tar", os.path.join(self.tmpd.name, "a0")),
+                     (self.base + "missing.tar", os.path.join(self.tmpd.name, "missing.tar"))]
+        out = StringIO()
+        with redirect_stdout(out):
+            with self.assertRaises(SystemExit):
+                list(download.fetch_all(downloads, is_fatal=True))
+        self.assertIn("Unable to fetch {}missing.tar".format(self.base), out.getvalue())
+        self.assertNotIn("missing.tar", os.listdir(self.tmpd.name))
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serve server.files with Range and If-Range, cut off after server.cut_at bytes."""
+
+    def do_GET(self):
+        etag, content = self.server.files[self.path]
+        self.server.requests.append((self.headers.get("Range"), self.headers.get("If-Range")))
+        start = 0
+        if self.headers.get("Range") and self.headers.get("If-Range", etag) == etag:
+            start = int(self.headers["Range"][len("bytes="):].split("-")[0])
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, len(content) - 1, len(content)))
+        else:
+            self.send_response(200)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(content) - start))
+        self.end_headers()
+        body = content[start:]
+        if self.server.cut_at:
+            body = body[:self.server.cut_at]
+            self.server.cut_at = None
+            self.close_connection = True
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestResume(unittest.TestCase):
+    """Tests for resuming interrupted downloads over HTTP."""
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmpd.name, "dest.tar")
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        self.server.files = {}
+        self.server.requests = []
+        self.server.cut_at = None
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = "http://127.0.0.1:{}/src.tar".format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.tmpd.cleanup()
+
+    def interrupted(self, etag, content):
+        """Serve content, and fail to download all of it."""
+        self.server.files["/src.tar"] = (etag, content)
+        self.server.cut_at = 30000
+        self.assertIsNone(download.do_curl(self.url, self.dest))
+        self.server.requests = []
+
+    def test_resume_unchanged(self):
+        """
+        Test an interrupted download is resumed while the file is unchanged
+        """
+        content = os.urandom(100000)
+        self.interrupted('"v1"', content)
+        self.assertEqual(os.path.getsize(self.dest + ".part"), 30000)
+        digests = {"sha256": None}
+        self.assertEqual(download.do_curl(self.url, self.dest, digests=digests), self.dest)
+        self.assertEqual(self.server.requests, [("bytes=30000-", '"v1"')])
+        with open(self.dest, "rb") as destf:
+            self.assertEqual(destf.read(), content)
+        self.assertEqual(digests["sha256"], hashlib.sha256(content).hexdigest())
+        self.assertEqual(os.listdir(self.tmpd.name), ["dest.tar"])
+
+    def test_resume_changed(self):
+        """
+        Test a file changed since the download was interrupted is fetched
+        whole, not joined to the old part
+        """
+        self.interrupted('"v1"', os.urandom(100000))
+        content = os.urandom(100000)
+        self.server.files["/src.tar"] = ('"v2"', content)
+        digests = {"sha256": None}
+        self.assertEqual(download.do_curl(self.url, self.dest, digests=digests), self.dest)
+        self.assertEqual(self.server.requests, [("bytes=30000-", '"v1"'), (None, None)])
+        with open(self.dest, "rb") as destf:
+            self.assertEqual(destf.read(), content)
+        self.assertEqual(digests["sha256"], hashlib.sha256(content).hexdigest())
+        self.assertEqual(os.listdir(self.tmpd.name), ["dest.tar"])
+
+    def test_no_validator(self):
+        """
+        Test an interrupted download is not kept when the server gives no
+        way to tell the file has not changed
+        """
+        self.interrupted(None, os.urandom(100000))
+        self.assertEqual(os.listdir(self.tmpd.name), [])
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def test_worker_pool(self):
+        """
+        Test worker_pool threads each reuse one curl handle, all closed on exit
+        """
+        with patch('download.pycurl.Curl', side_effect=lambda: MagicMock()) as curl:
+            with download.worker_pool(2) as pool:
+                used = list(pool.map(lambda _: download._local.curl, range(8)))
+        # one handle per thread, however many transfers it ran
+        self.assertLessEqual(curl.call_count, 2)
+        for handle in used:
+            handle.close.assert_called_once_with()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,130 @@
+import os
+import struct
+import tempfile
+import unittest
+import elfreader
+
+
+def build_elf(elf_type=elfreader.ET_DYN, soname="libtest.so.1", needed=("libc.so.6",), flags_1=0):
+    """
+    Build a minimal little endian ELF64 image with .dynstr, .dynamic,
+    .dynsym, .text, .data and .shstrtab sections
+    """
+    strtab = b"\0"
+    offsets = {}
+    for name in (soname,) + tuple(needed) + ("exported", "weak_one", "data_one", "abs_one", "undef_one", "ifunc_one"):
+        if name:
+            offsets[name] = len(strtab)
+            strtab += name.encode() + b"\0"
+
+    dyn = b""
+    for lib in needed:
+        dyn += struct.pack("<qQ", elfreader.DT_NEEDED, offsets[lib])
+    if soname:
+        dyn += struct.pack("<qQ", elfreader.DT_SONAME, offsets[soname])
+    if flags_1:
+        dyn += struct.pack("<qQ", elfreader.DT_FLAGS_1, flags_1)
+    dyn += struct.pack("<qQ", elfreader.DT_NULL, 0)
+
+    def sym(name, bind, typ, shndx):
+        return struct.pack("<IBBHQQ", offsets[name] if name else 0, bind << 4 | typ, 0, shndx, 0, 0)
+
+    # section indexes: 1 .dynstr, 2 .dynamic, 3 .dynsym, 4 .text, 5 .data
+    symtab = sym(None, 0, 0, 0)
+    symtab += sym("exported", 1, 2, 4)
+    symtab += sym("weak_one", 2, 2, 4)
+    symtab += sym("data_one", 1, 1, 5)
+    symtab += sym("abs_one", 1, 1, elfreader.SHN_ABS)
+    symtab += sym("undef_one", 1, 2, 0)
+    symtab += sym("ifunc_one", 1, elfreader.STT_GNU_IFUNC, 4)
+
+    names = [".dynstr", ".dynamic", ".dynsym", ".text", ".data", ".shstrtab"]
+    shstrtab = b"\0" + b"\0".join(name.encode() for name in names) + b"\0"
+    name_offsets = [shstrtab.index(name.encode() + b"\0") for name in names]
+
+    bodies = [strtab, dyn, symtab, b"\xc3", b"\0", shstrtab]
+    data = b""
+    placed = []
+    offset = 64
+    for body in bodies:
+        placed.append((offset, len(body)))
+        data += body
+        offset += len(body)
+    shoff = offset
+    sections = struct.pack("<IIQQQQIIQQ", *([0] * 10))
+    # name, type, flags, addr, offset, size, link, info, align, entsize
+    layout = [(3, 0, 0, 0, 1), (6, 0, 1, 0, 16), (11, 0, 1, 1, 24), (1, 0x6, 0, 0, 0), (1, 0x3, 0, 0, 0), (3, 0, 0, 0, 1)]
+    for name, (sh_type, flags, link, info, entsize), (off, size) in zip(name_offsets, layout, placed):
+        sections += struct.pack("<IIQQQQIIQQ", name, sh_type, flags, 0, off, size, link, info, 8, entsize)
+    header = b"\x7fELF" + bytes([2, 1, 1]) + b"\0" * 9
+    header += struct.pack("<HHIQQQIHHHHHH", elf_type, 62, 1, 0, 0, shoff, 0, 64, 56, 0, 64, 7, 6)
+    return header + data + sections
+
+
+class TestElfreader(unittest.TestCase):
+
+    def read(self, image):
+        with tempfile.NamedTemporaryFile() as tmp:
+            tmp.write(image)
+            tmp.flush()
+            return elfreader.read_elf(tmp.name)
+
+    def test_read_elf_shared_object(self):
+        """
+        Test read_elf returns soname, needed and the A/T exported symbols
+        """
+        elf = self.read(build_elf(needed=("libc.so.6", "libm.so.6")))
+        self.assertEqual(elf.bits, 64)
+        self.assertTrue(elf.is_shared_object)
+        self.assertTrue(elf.is_dynamic_binary)
+        self.assertEqual(elf.soname, "libtest.so.1")
+        self.assertEqual(elf.needed, ["libc.so.6", "libm.so.6"])
+        self.assertEqual(elf.symbols, set(["exported", "abs_one"]))
+
+    def test_read_elf_pie(self):
+        """
+        Test a PIE executable is a dynamic binary but not a shared object
+        """
+        elf = self.read(build_elf(soname=None, flags_1=elfreader.DF_1_PIE))
+        self.assertFalse(elf.is_shared_object)
+        self.assertTrue(elf.is_dynamic_binary)
+        self.assertIsNone(elf.soname)
+
+    def test_read_elf_executable(self):
+        """
+        Test an ET_EXEC file is a dynamic binary but not a shared object
+        """
+        elf = self.read(build_elf(elf_type=elfreader.ET_EXEC, soname=None))
+        self.assertFalse(elf.is_shared_object)
+        self.assertTrue(elf.is_dynamic_binary)
+
+    def test_read_elf_not_elf(self):
+        """
+        Test read_elf returns None for non ELF, short, truncated and missing files
+        """
+        self.assertIsNone(self.read(b"#!/bin/sh\n" * 10))
+        self.assertIsNone(self.read(b""))
+        self.assertIsNone(self.read(build_elf()[:100]))
+        self.assertIsNone(elfreader.read_elf(os.path.join(tempfile.gettempdir(), "no-such-elf-file")))
+
+    def test_elf_key(self):
+        """
+        Test elf_key falls back to sha256 without a build-id and is None for non ELF
+        """
+        with tempfile.NamedTemporaryFile() as tmp:
+            tmp.write(build_elf())
+            tmp.flush()
+            key = elfreader.elf_key(tmp.name)
+        self.assertTrue(key.startswith("sha256:"))
+        with tempfile.NamedTemporaryFile() as tmp:
+            tmp.write(build_elf(soname="libother.so.1"))
+            tmp.flush()
+            self.assertNotEqual(elfreader.elf_key(tmp.name), key)
+            tmp.seek(0)
+            tmp.write(b"#!/bin/sh\n" * 10)
+            tmp.flush()
+            self.assertIsNone(elfreader.elf_key(tmp.name))
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
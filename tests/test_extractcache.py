@@ -0,0 +1,79 @@
+import os
+import stat
+import tempfile
+import unittest
+import extractcache
+
+
+class TestExtractCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.cache = extractcache.ExtractCache(os.path.join(self.tmpd.name, "cache"), "/packages/pkg")
+        os.mkdir(os.path.join(self.cache.tree, "pkg-1.0"))
+        with open(os.path.join(self.cache.tree, "pkg-1.0", "main.c"), "w") as srcf:
+            srcf.write("int main;")
+        self.key = extractcache.cache_key("make", [("http://x/pkg-1.0.tar.gz", "", "aa")])
+
+    def tearDown(self):
+        self.cache.reset()
+        self.tmpd.cleanup()
+
+    def test_cache_key(self):
+        """
+        Test the key changes with the pattern, an archive hash or destination
+        """
+        sources = [("http://x/pkg-1.0.tar.gz", "", "aa"), ("http://x/extra.tar.gz", "sub", "bb")]
+        key = extractcache.cache_key("make", sources)
+        self.assertEqual(key, extractcache.cache_key("make", list(sources)))
+        self.assertNotEqual(key, extractcache.cache_key("cmake", sources))
+        self.assertNotEqual(key, extractcache.cache_key("make", sources[:1] + [("http://x/extra.tar.gz", "sub", "cc")]))
+        self.assertNotEqual(key, extractcache.cache_key("make", sources[:1] + [("http://x/extra.tar.gz", "other", "bb")]))
+
+    def test_lookup_hit(self):
+        """
+        Test the recorded details are returned for an unchanged tree, also
+        through a new ExtractCache for the same package
+        """
+        self.assertIsNone(self.cache.lookup(self.key))
+        self.cache.record(self.key, [{"prefix": "pkg-1.0"}])
+        self.assertEqual(self.cache.lookup(self.key), [{"prefix": "pkg-1.0"}])
+        again = extractcache.ExtractCache(os.path.join(self.tmpd.name, "cache"), "/packages/pkg")
+        self.assertEqual(again.lookup(self.key), [{"prefix": "pkg-1.0"}])
+        other = extractcache.ExtractCache(os.path.join(self.tmpd.name, "cache"), "/packages/other")
+        self.assertIsNone(other.lookup(self.key))
+
+    def test_lookup_miss(self):
+        """
+        Test a different key, a changed, an added or a removed file is a miss
+        """
+        self.cache.record(self.key, [{"prefix": "pkg-1.0"}])
+        self.assertIsNone(self.cache.lookup(extractcache.cache_key("cmake", [])))
+        main = os.path.join(self.cache.tree, "pkg-1.0", "main.c")
+        with open(main, "a") as srcf:
+            srcf.write("\n")
+        self.assertIsNone(self.cache.lookup(self.key))
+
+        self.cache.record(self.key, [])
+        with open(os.path.join(self.cache.tree, "pkg-1.0", "config.h"), "w") as srcf:
+            srcf.write("")
+        self.assertIsNone(self.cache.lookup(self.key))
+
+        self.cache.record(self.key, [])
+        os.unlink(main)
+        self.assertIsNone(self.cache.lookup(self.key))
+
+    def test_reset(self):
+        """
+        Test reset empties the tree, read-only directories included, and
+        forgets the manifest
+        """
+        self.cache.record(self.key, [])
+        os.chmod(os.path.join(self.cache.tree, "pkg-1.0"), stat.S_IRUSR | stat.S_IXUSR)
+        self.cache.reset()
+        self.assertEqual(os.listdir(self.cache.tree), [])
+        self.assertIsNone(self.cache.lookup(self.key))
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
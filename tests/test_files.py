@@ -3,6 +3,7 @@ import config
 import files
 import tempfile
 import os
+import re
 from unittest.mock import call, MagicMock
 import build
 from files import FileManager
@@ -101,7 +102,7 @@ class TestFiles(unittest.TestCase):
         Test file_pat_match with good match and filename in excludes list.
         """
         self.fm.push_package_file = MagicMock()
-        self.fm.excludes.append('test-fn')
+        self.fm.excludes.add('test-fn')
         self.assertTrue(self.fm.file_pat_match('test-fn', r'test-fn', 'main'))
         self.fm.push_package_file.assert_not_called()
 
@@ -214,7 +215,7 @@ class TestFiles(unittest.TestCase):
         Test remove_file with filename in files list and main package
         """
         self.fm.files.add('test')
-        self.fm.packages['main'] = ['test']
+        self.fm.push_package_file('test')
         self.assertIn('test', self.fm.files)
         self.assertNotIn('test', self.fm.files_blacklist)
         self.assertIn('test', self.fm.packages['main'])
@@ -333,5 +334,95 @@ class TestFiles(unittest.TestCase):
                              set(["%doc /directory", "/file1", "/file2"]))
 
 
+class TestFileManager(unittest.TestCase):
+
+    def setUp(self):
+        conf = config.Config("")
+        pkg = build.Build()
+        self.fm = FileManager(conf, pkg, "", None)
+
+    def test_literal_prefix(self):
+        """
+        Test literal_prefix only returns text every match starts with
+        """
+        self.assertEqual(files.literal_prefix(r"^/usr/bin/"), "/usr/bin/")
+        self.assertEqual(files.literal_prefix(r"^/(usr/|usr.*)share/man/"), "/usr")
+        self.assertEqual(files.literal_prefix(r"^/usr/lib64/lib[a-z]*\.so"), "/usr/lib64/lib")
+        self.assertEqual(files.literal_prefix(r"^/usr/lib64/libfoox?\.so"), "/usr/lib64/libfoo")
+        self.assertEqual(files.literal_prefix(r"^/usr/(lib|libexec)/"), "/usr/lib")
+        self.assertEqual(files.literal_prefix(r"^/usr/\.hidden"), "/usr/.hidden")
+        self.assertEqual(files.literal_prefix(r"/usr/bin/"), "")
+        self.assertEqual(files.literal_prefix(r"^/usr/bin|^/bin"), "")
+
+    def test_classifier_first_match_wins(self):
+        """
+        Test the classifier returns the first matching pattern in list order
+        """
+        patterns = [
+            (r"^/usr/bin/special$", "first"),
+            (r"\.debug$", "second"),
+            (r"^/usr/bin/", "third"),
+            (r"^/usr/", "fourth"),
+        ]
+        classifier = files.FileClassifier(patterns)
+        self.assertEqual(classifier.match("/usr/bin/special"), patterns[0])
+        self.assertEqual(classifier.match("/usr/bin/foo.debug"), patterns[1])
+        self.assertEqual(classifier.match("/usr/bin/foo"), patterns[2])
+        self.assertEqual(classifier.match("/usr/lib/foo"), patterns[3])
+        self.assertIsNone(classifier.match("/opt/foo"))
+
+    def test_classifier_matches_brute_force(self):
+        """
+        Test the classifier agrees with searching every file pattern in turn
+        """
+        names = ["/usr/bin/foo", "/usr/lib64/libfoo.so", "/usr/lib64/libfoo.so.1",
+                 "/usr/lib32/libfoo.a", "/usr/include/foo.h", "/usr/share/man/man3/foo.3",
+                 "/usr/lib64/pkgconfig/foo.pc", "/usr/share/doc/foo/README",
+                 "/usr/lib/python3.9/site-packages/foo.py", "/usr/lib64/gcc/x86_64-generic-linux/11/cc1",
+                 "/usr/share/locale/de/LC_MESSAGES/foo.mo", "/etc/foo.conf", "foo"]
+        for pkg_name in ["", "gcc", "glibc"]:
+            self.fm.package_name = pkg_name
+            patterns = self.fm.file_patterns("foo")
+            classifier = files.FileClassifier(patterns)
+            for name in names:
+                expected = next((p for p in patterns if re.search(p[0], name)), None)
+                self.assertEqual(classifier.match(name), expected, name)
+
+    def test_push_file_classifier_rebuilt(self):
+        """
+        Test push_file picks up package_name changes made after the first file
+        """
+        self.fm.push_package_file = MagicMock()
+        self.fm.push_file("/usr/bin/gcc", "gcc")
+        self.fm.push_package_file.assert_called_once_with("/usr/bin/gcc", "bin", False)
+        self.fm.package_name = "gcc"
+        self.fm.push_package_file = MagicMock()
+        self.fm.push_file("/usr/bin/cpp", "gcc")
+        self.fm.push_package_file.assert_called_once_with("/usr/bin/cpp", "main", False)
+
+    def test_remove_file_subpackage(self):
+        """
+        Test remove_file drops the file from every (sub)package holding it
+        """
+        self.fm.push_package_file('test', 'dev')
+        self.fm.push_package_file('test', 'extras', True)
+        self.fm.push_package_file('other', 'dev')
+        self.fm.remove_file('test')
+        self.assertEqual(self.fm.packages['dev'], set(['other']))
+        self.assertEqual(self.fm.subpackages['extras'], set())
+        self.assertNotIn('test', self.fm.file_owners)
+        self.assertIn('test', self.fm.files_blacklist)
+
+    def test_excludes_ordered_set(self):
+        """
+        Test excludes keep their first insertion order and drop duplicates
+        """
+        self.fm.excludes.update(['/b', '/a'])
+        self.fm.excludes.add('/c')
+        self.fm.excludes.add('/b')
+        self.assertEqual(list(self.fm.excludes), ['/b', '/a', '/c'])
+        self.assertIn('/a', self.fm.excludes)
+
+
 if __name__ == '__main__':
     unittest.main(buffer=True)
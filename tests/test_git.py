@@ -0,0 +1,171 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import config
+import git
+import util
+
+
+def run_git(*args, cwd):
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com"] + list(args),
+                   cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class TestGit(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.upstream = os.path.join(self.tmpd.name, "upstream")
+        self.clone = os.path.join(self.tmpd.name, "clone")
+        os.mkdir(self.upstream)
+        run_git("init", "-q", cwd=self.upstream)
+        run_git("commit", "-q", "--allow-empty", "-m", "initial", cwd=self.upstream)
+        for tag in ["v1.2.0", "v1.10.0", "20200101", "nightly-build"]:
+            run_git("tag", tag, cwd=self.upstream)
+        run_git("clone", "-q", self.upstream, self.clone, cwd=self.tmpd.name)
+        self.conf = config.Config("")
+        git.refs_cache = git.RefsCache(os.path.join(self.tmpd.name, "cache", git.REFS_CACHE_FILE))
+
+    def tearDown(self):
+        git.refs_cache = None
+        git.mirrors_dir = None
+        git.mirror_filter = None
+        self.tmpd.cleanup()
+
+    def test_find_version_git(self):
+        """
+        Test find_version_git picks the highest version tag of the remote,
+        skipping dates and names
+        """
+        with patch("git.print_info"):
+            self.assertEqual(git.find_version_git(self.upstream, self.clone, self.tmpd.name, self.conf), "1.10.0")
+
+    def test_ls_remote_tags_cached(self):
+        """
+        Test the tags of a remote are listed once per interval, also by the
+        next run
+        """
+        listing = git.ls_remote_tags(self.upstream, self.clone)
+        self.assertIn("refs/tags/v1.10.0", listing)
+        run_git("tag", "v2.0.0", cwd=self.upstream)
+        self.assertEqual(git.ls_remote_tags(self.upstream, self.clone), listing)
+        git.refs_cache.save()
+        git.refs_cache = git.RefsCache(git.refs_cache.path)
+        self.assertEqual(git.ls_remote_tags(self.upstream, self.clone), listing)
+
+        git.refs_cache.entries[self.upstream][0] -= git.REFS_CACHE_INTERVAL
+        self.assertIn("refs/tags/v2.0.0", git.ls_remote_tags(self.upstream, self.clone))
+        git.refs_cache = None
+        run_git("tag", "v3.0.0", cwd=self.upstream)
+        self.assertIn("refs/tags/v3.0.0", git.ls_remote_tags(self.upstream, self.clone))
+
+    def test_ls_remote_tags_failure(self):
+        """
+        Test a failed listing is not cached
+        """
+        missing = os.path.join(self.tmpd.name, "missing")
+        git.ls_remote_tags(missing, self.clone)
+        self.assertNotIn(missing, git.refs_cache.entries)
+        self.assertIsNone(git.refs_cache.get(missing))
+
+    def test_git_ls_remote_listing(self):
+        """
+        Test git_ls_remote parses a given listing without running git
+        """
+        listing = "".join("{}\trefs/tags/{}\n".format("0" * 40, tag) for tag in ["v0.9", "release-2.1.3", "20211231"])
+        with patch("git.subprocess.run") as run:
+            self.assertEqual(git.git_ls_remote("", self.clone, self.tmpd.name, self.conf, listing), "2.1.3")
+        run.assert_not_called()
+
+    def test_git_clone_mirror(self):
+        """
+        Test git_clone clones from a mirror that the next clone only
+        updates, leaving upstream as the origin of the clone
+        """
+        git.mirrors_dir = os.path.join(self.tmpd.name, "mirrors")
+        work = os.path.join(self.tmpd.name, "work")
+        os.mkdir(work)
+        with patch("git.print_info"):
+            git.git_clone(self.upstream, work, "", "", True, False, branch="v1.10.0", name="pkg")
+            mirror = git.mirror_path(self.upstream)
+            self.assertEqual(os.listdir(git.mirrors_dir).count(os.path.basename(mirror)), 1)
+            pack_dir = os.path.join(mirror, "objects", "pack")
+            packs = os.listdir(pack_dir)
+            shutil.rmtree(os.path.join(work, "pkg"))
+
+            with open(os.path.join(self.upstream, "NEWS"), "w") as news:
+                news.write("2.0\n")
+            run_git("add", "NEWS", cwd=self.upstream)
+            run_git("commit", "-q", "-m", "release", cwd=self.upstream)
+            run_git("tag", "v2.0.0", cwd=self.upstream)
+            git.git_clone(self.upstream, work, "", "", True, False, branch="v2.0.0", name="pkg")
+
+        clone = os.path.join(work, "pkg")
+        self.assertTrue(os.path.isfile(os.path.join(clone, "NEWS")))
+        self.assertEqual(git.get_git_remote_url("origin", clone), self.upstream)
+        # the first pack is kept, the new objects were fetched on top of it
+        self.assertTrue(set(packs) <= set(os.listdir(pack_dir)))
+
+    def test_git_clone_blobless_mirror(self):
+        """
+        Test a blobless mirror still gives a complete checkout
+        """
+        run_git("config", "uploadpack.allowfilter", "true", cwd=self.upstream)
+        with open(os.path.join(self.upstream, "README"), "w") as readme:
+            readme.write("hello\n")
+        run_git("add", "README", cwd=self.upstream)
+        run_git("commit", "-q", "-m", "readme", cwd=self.upstream)
+        run_git("tag", "v1.11.0", cwd=self.upstream)
+        git.mirrors_dir = os.path.join(self.tmpd.name, "mirrors")
+        git.mirror_filter = "blob:none"
+        url = "file://" + self.upstream
+        with patch("git.print_info"):
+            git.git_clone(url, self.tmpd.name, "", "", True, False, branch="v1.11.0", name="pkg")
+        with open(os.path.join(self.tmpd.name, "pkg", "README")) as readme:
+            self.assertEqual(readme.read(), "hello\n")
+        # the blobs of the checkout were fetched into the mirror, for the next run
+        missing = subprocess.run(["git", "rev-list", "--objects", "--missing=print", "v1.11.0"], cwd=git.mirror_path(url),
+                                 stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+        self.assertNotIn("?", missing)
+
+    def test_mirror_refs(self):
+        """
+        Test mirrors only keep the branches and tags of upstream
+        """
+        run_git("update-ref", "refs/pull/1/head", "HEAD", cwd=self.upstream)
+        git.mirrors_dir = os.path.join(self.tmpd.name, "mirrors")
+        with patch("git.print_info"):
+            mirror = git.update_mirror(self.upstream)
+        refs = subprocess.run(["git", "for-each-ref", "--format=%(refname)"], cwd=mirror,
+                              stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout.split()
+        self.assertIn("refs/tags/v1.10.0", refs)
+        self.assertTrue(any(ref.startswith("refs/heads/") for ref in refs))
+        self.assertNotIn("refs/pull/1/head", refs)
+
+    def test_git_archive_all_reproducible(self):
+        """
+        Test archiving two clones of the same commit gives the same tarball,
+        though git keeps different index and reflog files in each
+        """
+        with open(os.path.join(self.upstream, "README"), "w") as readme:
+            readme.write("hello\n")
+        run_git("add", "README", cwd=self.upstream)
+        run_git("commit", "-q", "-m", "readme", cwd=self.upstream)
+        run_git("tag", "v1.11.0", cwd=self.upstream)
+        sums = []
+        for run in range(2):
+            work = os.path.join(self.tmpd.name, "work{}".format(run))
+            os.mkdir(work)
+            with patch("git.print_info"):
+                url = git.git_archive_all(work + "/", "pkg", "file://" + self.upstream, "v1.11.0", True, False, self.conf)
+            self.assertTrue(url.endswith("pkg-v1.11.0.tar.gz"))
+            sums.append(util.get_sha1sum(url[len("file://"):]))
+        self.assertEqual(sums[0], sums[1])
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
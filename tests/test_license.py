@@ -2,7 +2,9 @@ from contextlib import redirect_stdout
 from io import BytesIO, StringIO
 import os
 import tempfile
+import time
 import unittest
+import urllib.parse
 from unittest.mock import patch, mock_open, MagicMock
 
 import pycurl
@@ -17,6 +19,8 @@ class TestLicense(unittest.TestCase):
 
     def setUp(self):
         license.licenses = []
+        license.license_files = []
+        license.hashes = dict()
 
     def test_add_license(self):
         """
@@ -71,7 +75,7 @@ class TestLicense(unittest.TestCase):
         conf = config.Config("")
         conf.setup_patterns()
         # remove the hash from license_hashes
-        del(conf.license_hashes[license.get_sha1sum('tests/COPYING_TEST')])
+        del(conf.license_hashes[util.get_sha1sum('tests/COPYING_TEST')])
         conf.license_show = "license.show.url"
         license.license_from_copying_hash('tests/COPYING_TEST', '', conf, '')
 
@@ -116,6 +120,7 @@ class TestLicense(unittest.TestCase):
                 pass
 
         # set the mock curl
+        real_curl = download.pycurl.Curl
         download.pycurl.Curl = MockCurl
 
         conf = config.Config("")
@@ -130,7 +135,7 @@ class TestLicense(unittest.TestCase):
         self.assertIn('Unable to fetch license.server.url: Test Exception', out.getvalue())
 
         # unset the manual mock
-        download.pycurl.Curl = pycurl.Curl
+        download.pycurl.Curl = real_curl
 
     def test_license_from_copying_hash_license_server(self):
         """
@@ -170,6 +175,7 @@ class TestLicense(unittest.TestCase):
                 return 200
 
         # set the mock curl
+        real_curl = download.pycurl.Curl
         download.pycurl.Curl = MockCurl
 
         conf = config.Config("")
@@ -187,7 +193,7 @@ class TestLicense(unittest.TestCase):
         download.BytesIO = BytesIO
 
         # unset the manual mock
-        download.pycurl.Curl = pycurl.Curl
+        download.pycurl.Curl = real_curl
 
     def test_scan_for_licenses(self):
         """
@@ -210,6 +216,25 @@ class TestLicense(unittest.TestCase):
 
         self.assertIn('GPL-3.0', license.licenses)
 
+    def test_scan_for_licenses_worker_curl(self):
+        """
+        Test scan_for_licenses examines files in threads with a curl handle,
+        so license server queries reuse connections
+        """
+        conf = config.Config("")
+        with tempfile.TemporaryDirectory() as tmpd:
+            for name in ['COPYING', 'LICENSE']:
+                with open(os.path.join(tmpd, name), 'w') as newcopyingf:
+                    newcopyingf.write('license')
+            handles = []
+            with patch('download.pycurl.Curl', side_effect=lambda: MagicMock()), \
+                    patch('license.examine_copying', side_effect=lambda *args: handles.append(download._local.curl)):
+                with self.assertRaises(SystemExit), redirect_stdout(StringIO()):
+                    license.scan_for_licenses(tmpd, conf, '', jobs=2)
+        self.assertEqual(len(handles), 2)
+        for handle in handles:
+            handle.close.assert_called_once_with()
+
     def test_scan_for_licenses_none(self):
         """
         Test scan_for_licenses in temporary directory with no matching files.
@@ -233,6 +258,71 @@ class TestLicense(unittest.TestCase):
         self.assertIn("Cannot find any license", out.getvalue())
         self.assertEqual(license.licenses, [])
 
+    def test_scan_for_licenses_merge_order(self):
+        """
+        Test scan_for_licenses merges the concurrently examined files in walk
+        order, hashing each from the content that was read
+        """
+        conf = config.Config("")
+        conf.license_fetch = 'license.server.url'
+        names = {}
+
+        def mock_curl(url, post=None, is_fatal=False):
+            text = dict(urllib.parse.parse_qsl(post.decode('utf-8')))['text']
+            if text.startswith('first'):
+                # finish last so an unordered merge would show
+                time.sleep(0.2)
+            return BytesIO(names[text].encode('utf-8'))
+
+        with tempfile.TemporaryDirectory() as tmpd:
+            for idx, lic in enumerate(['MIT', 'BSD-3-Clause', 'Apache-2.0']):
+                os.mkdir(os.path.join(tmpd, 'd{}'.format(idx)))
+                with open(os.path.join(tmpd, 'd{}'.format(idx), 'LICENSE'), 'w') as licf:
+                    licf.write('{} {}\n'.format(['first', 'second', 'third'][idx], lic))
+            expected = []
+            hashes = {}
+            for dirpath, _, files in os.walk(tmpd):
+                for name in files:
+                    with open(os.path.join(dirpath, name)) as licf:
+                        text = licf.read()
+                    names[text] = text.split()[1]
+                    expected.append(text.split()[1])
+                    hashes[os.path.join(os.path.basename(dirpath), name)] = util.get_sha1sum(os.path.join(dirpath, name))
+            with patch('download.do_curl', side_effect=mock_curl):
+                with redirect_stdout(StringIO()):
+                    license.scan_for_licenses(tmpd, conf, '', jobs=3)
+
+        self.assertEqual(license.licenses, expected)
+        self.assertEqual(license.hashes, hashes)
+        self.assertEqual(sorted(license.license_files), sorted(hashes))
+
+    def test_scan_for_licenses_dedup(self):
+        """
+        Test scan_for_licenses asks the license server once per distinct
+        license, however many vendored copies of it there are
+        """
+        conf = config.Config("")
+        conf.license_fetch = 'license.server.url'
+        posted = []
+
+        def mock_curl(url, post=None, is_fatal=False):
+            posted.append(dict(urllib.parse.parse_qsl(post.decode('utf-8')))['hash'])
+            time.sleep(0.05)
+            return BytesIO(b'MIT')
+
+        with tempfile.TemporaryDirectory() as tmpd:
+            for idx in range(20):
+                os.mkdir(os.path.join(tmpd, 'vendor{}'.format(idx)))
+                with open(os.path.join(tmpd, 'vendor{}'.format(idx), 'LICENSE'), 'w') as licf:
+                    licf.write('Permission is hereby granted, free of charge\n')
+            with patch('download.do_curl', side_effect=mock_curl):
+                with redirect_stdout(StringIO()):
+                    license.scan_for_licenses(tmpd, conf, '', jobs=8)
+
+        self.assertEqual(len(posted), 1)
+        self.assertEqual(license.licenses, ['MIT'])
+        self.assertEqual(len(license.license_files), 20)
+
     def test_load_specfile(self):
         """
         Test load_specfile with populated license list. This method is not
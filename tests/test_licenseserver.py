@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import urllib.parse
+
+import licenseserver
+
+
+class LicenseHandler(BaseHTTPRequestHandler):
+    """Answer license queries slowly, counting them on the server."""
+
+    def do_POST(self):
+        fields = dict(urllib.parse.parse_qsl(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")))
+        with self.server.lock:
+            self.server.queries.append(fields["hash"])
+        time.sleep(0.1)
+        answer = self.server.answers.get(fields["hash"], "").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(answer)))
+        self.end_headers()
+        self.wfile.write(answer)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestLicenseServer(unittest.TestCase):
+    """Tests for licenseserver.LicenseServer against a local HTTP server."""
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmpd.name, "cache", licenseserver.CACHE_FILE)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), LicenseHandler)
+        self.server.lock = threading.Lock()
+        self.server.queries = []
+        self.server.answers = {"aa": "MIT", "bb": "GPL-2.0 GPL-3.0"}
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = "http://127.0.0.1:{}/".format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.tmpd.cleanup()
+
+    def test_query_dedup(self):
+        """
+        Test concurrent queries for the same hash send a single request
+        """
+        client = licenseserver.LicenseServer(self.url)
+        hashes = ["aa", "bb", "cc"] * 4
+        with ThreadPoolExecutor(max_workers=len(hashes)) as pool:
+            pages = list(pool.map(lambda h: client.query(h, "text of " + h, "pkg"), hashes))
+        self.assertEqual(pages, ["MIT", "GPL-2.0 GPL-3.0", ""] * 4)
+        self.assertEqual(sorted(self.server.queries), ["aa", "bb", "cc"])
+        self.assertEqual((client.fetched, client.hits), (3, 9))
+
+    def test_cache(self):
+        """
+        Test saved answers are reused by the next client until they expire,
+        and empty answers are asked again
+        """
+        client = licenseserver.LicenseServer(self.url, self.cache_path)
+        client.query("aa", "text", "pkg")
+        client.query("cc", "text", "pkg")
+        client.save()
+
+        client = licenseserver.LicenseServer(self.url, self.cache_path)
+        self.assertEqual(client.query("aa", "text", "other"), "MIT")
+        self.assertEqual(client.query("cc", "text", "other"), "")
+        self.assertEqual(self.server.queries, ["aa", "cc", "cc"])
+        # answers of another server are not used
+        other = licenseserver.LicenseServer(self.url + "other", self.cache_path)
+        self.assertEqual(other.answers, {})
+
+        with open(self.cache_path) as cache_file:
+            data = json.load(cache_file)
+        data["servers"][self.url]["aa"][1] -= licenseserver.DEFAULT_TTL
+        with open(self.cache_path, "w") as cache_file:
+            json.dump(data, cache_file)
+        client = licenseserver.LicenseServer(self.url, self.cache_path)
+        self.assertEqual(client.query("aa", "text", "pkg"), "MIT")
+        self.assertEqual(self.server.queries, ["aa", "cc", "cc", "aa"])
+
+    def test_query_failure(self):
+        """
+        Test a failed query exits for every thread waiting on it
+        """
+        # nothing listens on a port that was just released
+        closed = ThreadingHTTPServer(("127.0.0.1", 0), LicenseHandler)
+        url = "http://127.0.0.1:{}/".format(closed.server_address[1])
+        closed.server_close()
+        client = licenseserver.LicenseServer(url)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(client.query, "aa", "text", "pkg") for _ in range(2)]
+            for future in futures:
+                with self.assertRaises(SystemExit):
+                    future.result()
+        self.assertEqual(client.pending, {})
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
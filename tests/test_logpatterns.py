@@ -0,0 +1,57 @@
+import re
+import unittest
+import config
+import logpatterns
+
+
+class TestLogpatterns(unittest.TestCase):
+
+    def test_required_literal(self):
+        """
+        Test required_literal picks the longest unconditional literal
+        """
+        self.assertEqual(logpatterns.required_literal(r"checking for (.*?)\.\.\. no"), "checking for ")
+        self.assertEqual(logpatterns.required_literal(r"\/bin\/ld: cannot find (-l[a-zA-Z0-9\_]+)"), "/bin/ld: cannot find ")
+        self.assertEqual(logpatterns.required_literal(r"[Dd]ependency (.*) found: NO"), "ependency ")
+        self.assertEqual(logpatterns.required_literal(r"abx?cdef"), "cdef")
+        self.assertEqual(logpatterns.required_literal(r"ab{2}cdef"), "cdef")
+        self.assertEqual(logpatterns.required_literal(r"abc+def"), "abc")
+
+    def test_required_literal_none(self):
+        """
+        Test required_literal returns None when no literal is guaranteed
+        """
+        self.assertIsNone(logpatterns.required_literal(r"foo|bar"))
+        self.assertIsNone(logpatterns.required_literal(r"(foo)"))
+        self.assertIsNone(logpatterns.required_literal(r"a.b"))
+
+    def test_candidates_order(self):
+        """
+        Test candidates keeps group order and the order within a group
+        """
+        matcher = logpatterns.PatternMatcher([
+            ("one", [(r"zzz", 1), (r"abc", 2), (r"abc( )", 3)]),
+            ("two", [(r"abc", 4)]),
+        ])
+        found = [(group, args) for group, _, args in matcher.candidates("xx abc xx")]
+        self.assertEqual(found, [("one", (2,)), ("one", (3,)), ("two", (4,))])
+        self.assertEqual(list(matcher.candidates("nothing here")), [])
+
+    def test_config_patterns_match_brute_force(self):
+        """
+        Test the prefiltered matcher finds exactly the patterns a plain loop
+        over every configured pattern finds
+        """
+        conf = config.Config("")
+        all_pats = conf.pkgconfig_pats + conf.simple_pats + conf.failed_pats + conf.failed_exit_pats
+        with open("tests/builderrors", "r") as f:
+            lines = [line.split("|")[0] for line in f if not line.startswith("#")]
+        lines += ["line 1", "checking for UDEV... no", "make[2]: Leaving directory"]
+        for line in lines:
+            expected = [p[0] for p in all_pats if re.search(p[0], line)]
+            found = [match.re.pattern for _, match, _ in conf.log_patterns.search(line)]
+            self.assertEqual(found, expected, line)
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
@@ -0,0 +1,80 @@
+import gzip
+import os
+import tempfile
+import unittest
+import logreader
+
+
+class TestLogreader(unittest.TestCase):
+
+    def test_read_lines(self):
+        """
+        Test read_lines yields every line of a plain log
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            log = os.path.join(tmpd, "build.log")
+            with open(log, "w") as logf:
+                logf.write("line 1\nline 2\n")
+            self.assertEqual(list(logreader.read_lines(log)), ["line 1\n", "line 2\n"])
+
+    def test_read_lines_gzip(self):
+        """
+        Test read_lines decompresses .gz logs transparently
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            log = os.path.join(tmpd, "build.log.gz")
+            with gzip.open(log, "wt") as logf:
+                logf.write("line 1\nline 2\n")
+            self.assertEqual(list(logreader.read_lines(log)), ["line 1\n", "line 2\n"])
+
+    def test_log_reader_fan_out(self):
+        """
+        Test LogReader hands each line to every consumer in a single pass
+        """
+        first = []
+        second = []
+        finished = []
+        with tempfile.TemporaryDirectory() as tmpd:
+            log = os.path.join(tmpd, "build.log")
+            with open(log, "w") as logf:
+                logf.write("a\nb\nc\n")
+            reader = logreader.LogReader(log)
+            reader.register(first.append)
+            reader.register(second.append, lambda: finished.append(True))
+            self.assertEqual(reader.run(), 3)
+        self.assertEqual(first, ["a\n", "b\n", "c\n"])
+        self.assertEqual(second, first)
+        self.assertEqual(finished, [True])
+
+    def test_follow_lines(self):
+        """
+        Test follow_lines yields lines as they are appended, whole lines only
+        """
+        writes = ["", "line 1\nline", " 2\n", "line 3"]
+        with tempfile.TemporaryDirectory() as tmpd:
+            log = os.path.join(tmpd, "build.log")
+
+            def running():
+                # append the next write on every poll, the log appears on the second
+                if not writes:
+                    return False
+                data = writes.pop(0)
+                if data:
+                    with open(log, "a") as logf:
+                        logf.write(data)
+                return True
+
+            lines = list(logreader.follow_lines(log, running, 0))
+        self.assertEqual(lines, ["line 1\n", "line 2\n", "line 3"])
+
+    def test_follow_lines_missing(self):
+        """
+        Test follow_lines yields nothing if the log never appears
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            log = os.path.join(tmpd, "build.log")
+            self.assertEqual(list(logreader.follow_lines(log, lambda: False, 0)), [])
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
@@ -0,0 +1,89 @@
+import os
+import pickle
+import tempfile
+import unittest
+import patternindex
+
+
+class TestPatternIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmpd.name, "cache", "patterns.pickle")
+        self.conf = os.path.join(self.tmpd.name, "failed_commands")
+        with open(self.conf, "w") as conf:
+            conf.write("# comment\nfoo, bar\na, b, c\n")
+
+    def tearDown(self):
+        self.tmpd.cleanup()
+
+    def test_parse_pattern_file(self):
+        """
+        Test pattern files parse to dicts, splitting on the last ", "
+        """
+        self.assertEqual(patternindex.parse_pattern_file(self.conf), {"foo": "bar", "a, b": "c"})
+        self.assertEqual(patternindex.parse_pattern_file(self.conf, list_format=True),
+                         {"foo, bar": True, "a, b, c": True})
+
+    def test_parse_translations(self):
+        """
+        Test the first translation of a name wins and lines without '=' are skipped
+        """
+        dic = os.path.join(self.tmpd.name, "translate.dic")
+        with open(dic, "w") as dicfile:
+            dicfile.write("a=b\nnothing\na=c\nd=e=f\n")
+        self.assertEqual(patternindex.parse_translations(dic), {"a": "b", "d": "e"})
+
+    def test_index_reused(self):
+        """
+        Test a saved index serves the tables without parsing them again
+        """
+        index = patternindex.PatternIndex(self.index_path)
+        table = index.patterns(self.conf)
+        index.save()
+        self.assertTrue(os.path.isfile(self.index_path))
+
+        index = patternindex.PatternIndex(self.index_path)
+        self.assertEqual(index.patterns(self.conf), table)
+        self.assertEqual((index.hits, index.misses), (1, 0))
+        self.assertFalse(index.dirty)
+        # the list format is a different table of the same file
+        index.patterns(self.conf, list_format=True)
+        self.assertEqual(index.misses, 1)
+
+    def test_index_stale(self):
+        """
+        Test a changed file is parsed again and a corrupt index is ignored
+        """
+        index = patternindex.PatternIndex(self.index_path)
+        index.patterns(self.conf)
+        index.save()
+        with open(self.conf, "a") as conf:
+            conf.write("baz, qux\n")
+        index = patternindex.PatternIndex(self.index_path)
+        self.assertEqual(index.patterns(self.conf)["baz"], "qux")
+        self.assertEqual(index.misses, 1)
+
+        with open(self.index_path, "wb") as index_file:
+            index_file.write(b"garbage")
+        self.assertEqual(patternindex.PatternIndex(self.index_path).tables, {})
+        with open(self.index_path, "wb") as index_file:
+            pickle.dump({"version": patternindex.INDEX_VERSION + 1, "tables": {"x": 1}}, index_file)
+        self.assertEqual(patternindex.PatternIndex(self.index_path).tables, {})
+
+    def test_save_unwritable(self):
+        """
+        Test failing to write the index is not an error
+        """
+        blocker = os.path.join(self.tmpd.name, "blocker")
+        with open(blocker, "w") as blockf:
+            blockf.write("")
+        index = patternindex.PatternIndex(os.path.join(blocker, "patterns.pickle"))
+        index.patterns(self.conf)
+        index.save()
+        self.assertTrue(index.dirty)
+        self.assertEqual(os.listdir(self.tmpd.name).count("blocker"), 1)
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
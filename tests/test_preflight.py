@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+import buildreq
+import config
+import preflight
+
+
+CONFIGURE_AC = '''AC_INIT([foo], [1.0])
+PKG_CHECK_MODULES([GLIB], [glib-2.0 >= 2.56 gio-2.0])
+PKG_CHECK_MODULES([XML], [libxml-2.0])
+'''
+
+CMAKELISTS = '''find_package(ZLIB REQUIRED)
+find_package(Unknown)
+pkg_check_modules(SSL REQUIRED openssl)
+'''
+
+MESON_BUILD = '''dependency('libffi')
+dependency('optional', required : false)
+'''
+
+
+class TestPreflight(unittest.TestCase):
+
+    def setUp(self):
+        self.conf = config.Config('')
+        self.conf.cmake_modules = {'ZLIB': 'zlib-dev'}
+        self.tmpd = tempfile.TemporaryDirectory()
+        files = {'configure.ac': CONFIGURE_AC,
+                 'src/CMakeLists.txt': CMAKELISTS,
+                 'sub/meson.build': MESON_BUILD}
+        for name, content in files.items():
+            path = os.path.join(self.tmpd.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(content)
+
+    def tearDown(self):
+        self.tmpd.cleanup()
+
+    def test_declared_buildreqs(self):
+        """
+        Test declared_buildreqs collects the requirements of every build system
+        """
+        self.assertEqual(preflight.declared_buildreqs(self.tmpd.name, self.conf),
+                         set(['pkgconfig(glib-2.0)', 'pkgconfig(gio-2.0)', 'pkgconfig(libxml-2.0)',
+                              'zlib-dev', 'pkgconfig(openssl)', 'pkgconfig(libffi)']))
+
+    def test_add_declared_buildreqs(self):
+        """
+        Test add_declared_buildreqs adds the missing requirements only,
+        skipping banned ones and packages the OS does not have
+        """
+        self.conf.os_packages = set(['bash'])
+        reqs = buildreq.Requirements('')
+        reqs.add_buildreq('pkgconfig(glib-2.0)')
+        reqs.banned_buildreqs.add('pkgconfig(openssl)')
+        added = preflight.add_declared_buildreqs(reqs, self.conf, self.tmpd.name)
+        self.assertEqual(added, ['pkgconfig(gio-2.0)', 'pkgconfig(libffi)', 'pkgconfig(libxml-2.0)'])
+        self.assertNotIn('zlib-dev', reqs.buildreqs)
+        self.assertNotIn('pkgconfig(openssl)', reqs.buildreqs)
+        self.assertEqual(reqs.buildreqs_cache, set())
+
+    def test_is_available(self):
+        """
+        Test is_available only checks plain package names against the list
+        """
+        self.assertTrue(preflight.is_available('pkgconfig(foo)', set(['bar'])))
+        self.assertTrue(preflight.is_available('bar', set(['bar'])))
+        self.assertTrue(preflight.is_available('foo', set()))
+        self.assertFalse(preflight.is_available('foo', set(['bar'])))
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
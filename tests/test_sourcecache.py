@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+import sourcecache
+
+
+class TestSourcecache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpd = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmpd.name, "cache")
+
+    def tearDown(self):
+        self.tmpd.cleanup()
+
+    def archive(self, name, content):
+        path = os.path.join(self.tmpd.name, name)
+        with open(path, "wb") as archive:
+            archive.write(content)
+        return path, sourcecache.file_digests(path)
+
+    def test_store_fetch(self):
+        """
+        Test a stored archive is materialized by URL as a copy in a new
+        SourceCache instance, and unknown URLs miss
+        """
+        path, digests = self.archive("pkg-1.0.tar.gz", b"archive content")
+        sourcecache.SourceCache(self.cache_dir).store("https://example/pkg-1.0.tar.gz", path, digests)
+
+        cache = sourcecache.SourceCache(self.cache_dir)
+        self.assertIn("https://example/pkg-1.0.tar.gz", cache)
+        dest = os.path.join(self.tmpd.name, "dest.tar.gz")
+        self.assertEqual(cache.fetch("https://example/pkg-1.0.tar.gz", dest), digests["sha1"])
+        with open(dest, "rb") as destf:
+            self.assertEqual(destf.read(), b"archive content")
+        self.assertNotEqual(os.stat(dest).st_ino, os.stat(cache.object_path(digests["sha256"])).st_ino)
+        self.assertIsNone(cache.fetch("https://example/other.tar.gz", dest))
+        self.assertEqual(cache.summary(), "Source cache: 1 hits, 0 stored, 0 evicted")
+
+    def test_same_content_stored_once(self):
+        """
+        Test two URLs serving the same archive share one object
+        """
+        path, digests = self.archive("a.tar", b"same")
+        cache = sourcecache.SourceCache(self.cache_dir)
+        cache.store("https://one/a.tar", path, digests)
+        cache.store("https://two/a.tar", path, digests)
+        self.assertEqual(cache.stored, 1)
+        self.assertEqual(list(cache.objects), [digests["sha256"]])
+        self.assertEqual(len(cache.urls), 2)
+
+    def test_lru_eviction(self):
+        """
+        Test the least recently used archives are evicted over max_bytes,
+        fetching counts as a use
+        """
+        cache = sourcecache.SourceCache(self.cache_dir, max_bytes=250)
+        stored = []
+        for name in ["a", "b", "c"]:
+            path, digests = self.archive(name, name.encode() * 100)
+            stored.append(digests["sha256"])
+            cache.store("https://example/" + name, path, digests)
+            if name == "b":
+                # use a again, b is now the oldest
+                cache.fetch("https://example/a", os.path.join(self.tmpd.name, "a.out"))
+        self.assertEqual(cache.evicted, 1)
+        self.assertNotIn("https://example/b", cache)
+        self.assertIn("https://example/a", cache)
+        self.assertIn("https://example/c", cache)
+        self.assertFalse(os.path.exists(cache.object_path(stored[1])))
+
+    def test_missing_object(self):
+        """
+        Test an object removed from the cache directory is a miss and is
+        dropped from the index
+        """
+        path, digests = self.archive("a.tar", b"content")
+        cache = sourcecache.SourceCache(self.cache_dir)
+        cache.store("https://example/a.tar", path, digests)
+        os.unlink(cache.object_path(digests["sha256"]))
+        self.assertIsNone(cache.fetch("https://example/a.tar", os.path.join(self.tmpd.name, "out")))
+        self.assertNotIn("https://example/a.tar", cache)
+
+    def test_rewritten_copy(self):
+        """
+        Test rewriting a fetched archive in place leaves the cached one intact
+        """
+        path, digests = self.archive("a.tar", b"content")
+        cache = sourcecache.SourceCache(self.cache_dir)
+        cache.store("https://example/a.tar", path, digests)
+        with open(path, "wb") as archive:
+            archive.write(b"patched")
+        dest = os.path.join(self.tmpd.name, "out")
+        self.assertEqual(cache.fetch("https://example/a.tar", dest), digests["sha1"])
+        with open(dest, "wb") as archive:
+            archive.write(b"patched")
+        self.assertEqual(cache.fetch("https://example/a.tar", dest), digests["sha1"])
+        with open(dest, "rb") as archive:
+            self.assertEqual(archive.read(), b"content")
+
+    def test_corrupt_object(self):
+        """
+        Test an object that no longer matches its sha256 is a miss and is
+        dropped from the index
+        """
+        path, digests = self.archive("a.tar", b"content")
+        cache = sourcecache.SourceCache(self.cache_dir)
+        cache.store("https://example/a.tar", path, digests)
+        with open(cache.object_path(digests["sha256"]), "wb") as obj:
+            obj.write(b"corrupt")
+        self.assertIsNone(cache.fetch("https://example/a.tar", os.path.join(self.tmpd.name, "out")))
+        self.assertNotIn("https://example/a.tar", cache)
+        self.assertFalse(os.path.exists(cache.object_path(digests["sha256"])))
+
+    def test_share_file_copy(self):
+        """
+        Test share_file replaces an existing destination
+        """
+        path, _ = self.archive("src", b"new")
+        dest, _ = self.archive("dest", b"old content")
+        sourcecache.share_file(path, dest)
+        with open(dest, "rb") as destf:
+            self.assertEqual(destf.read(), b"new")
+        self.assertEqual(sorted(os.listdir(self.tmpd.name)), ["dest", "src"])
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=True)
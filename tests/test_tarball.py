@@ -1,11 +1,21 @@
 import copy
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
 import unittest
 from unittest.mock import MagicMock, Mock, patch
 import build
 import config
+import extractcache
 import files
+import sourcecache
 import tarball
+import util
 
 
 # Stores all test cases for dynamic tests.
@@ -103,6 +113,9 @@ class MockSrcFile():
     def getnames(self):
         return self.content
 
+    def __iter__(self):
+        return iter(tarfile.TarInfo(name) for name in self.content)
+
     def namelist(self):
         return self.content
 
@@ -271,6 +284,232 @@ class TestTarball(unittest.TestCase):
         self.assertEqual(tarball.Source.extract.call_count, 3)
 
 
+class TestTarStream(unittest.TestCase):
+    """Tests for the single pass tar extraction."""
+
+    def setUp(self):
+        self.tmpd = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpd, "src")
+        for sub in ["", "pkg-1.0", "pkg-1.0/lib", "pkg-1.0/ro"]:
+            os.mkdir(os.path.join(self.src, sub))
+        for name in ["pkg-1.0/README", "pkg-1.0/lib/a.c", "pkg-1.0/ro/b.c"]:
+            with open(os.path.join(self.src, name), "w") as srcf:
+                srcf.write(name)
+        os.symlink("lib/a.c", os.path.join(self.src, "pkg-1.0/link.c"))
+        os.chmod(os.path.join(self.src, "pkg-1.0/ro"), 0o555)
+
+    def tearDown(self):
+        os.chmod(os.path.join(self.src, "pkg-1.0/ro"), 0o755)
+        for dirpath, dirnames, _ in os.walk(self.tmpd):
+            for dirname in dirnames:
+                os.chmod(os.path.join(dirpath, dirname), 0o755)
+        shutil.rmtree(self.tmpd)
+
+    def make_tar(self, name, mode="w"):
+        path = os.path.join(self.tmpd, name)
+        with tarfile.open(path, mode) as tar:
+            tar.add(os.path.join(self.src, "pkg-1.0"), "pkg-1.0")
+        return path
+
+    def check_extracted(self, path):
+        self.assertEqual(sorted(os.listdir(path)), ["README", "lib", "link.c", "ro"])
+        with open(os.path.join(path, "link.c")) as linkf:
+            self.assertEqual(linkf.read(), "pkg-1.0/lib/a.c")
+        self.assertEqual(os.stat(os.path.join(path, "ro")).st_mode & 0o777, 0o555)
+
+    def test_stream_tar_prefix(self):
+        """
+        Test stream_tar finds the prefix without extracting, skipping
+        package.xml for phpize only
+        """
+        path = os.path.join(self.tmpd, "php.tar")
+        with tarfile.open(path, "w") as tar:
+            tar.add(os.path.join(self.src, "pkg-1.0"), "pkg-1.0")
+            tar.add(os.path.join(self.src, "pkg-1.0/README"), "package.xml")
+        self.assertEqual(tarball.stream_tar(path, "phpize"), (8, "pkg-1.0"))
+        self.assertEqual(tarball.stream_tar(path), (8, ""))
+        self.assertEqual(tarball.stream_tar(self.make_tar("one.tar.gz", "w:gz"))[1], "pkg-1.0")
+
+    def test_source_staged_extract(self):
+        """
+        Test Source extracts xz, gzip and bzip2 tarballs into base_path from
+        the pass that found the prefix
+        """
+        for name, mode in [("pkg.tar.xz", "w:xz"), ("pkg.tar.gz", "w:gz"), ("pkg.tar.bz2", "w:bz2")]:
+            base = os.path.join(self.tmpd, name + "-build")
+            src = tarball.Source("https://example/" + name, "", self.make_tar(name, mode), base_path=base)
+            self.assertEqual(src.prefix, "pkg-1.0")
+            self.assertTrue(src.staged.startswith(base))
+            src.extract(base)
+            self.assertEqual(os.listdir(base), ["pkg-1.0"])
+            self.check_extracted(os.path.join(base, "pkg-1.0"))
+
+    @unittest.skipUnless(shutil.which("zstd"), "zstd is not installed")
+    def test_source_zstd(self):
+        """
+        Test a zstd compressed tarball goes through the external decompressor
+        """
+        plain = self.make_tar("pkg.tar")
+        path = plain + ".zst"
+        subprocess.check_call(["zstd", "-q", plain, "-o", path])
+        self.assertEqual(tarball.decompress_command(path)[0], "zstd")
+        base = os.path.join(self.tmpd, "build")
+        os.mkdir(base)
+        src = tarball.Source("https://example/pkg.tar.zst", "", path)
+        self.assertEqual(src.prefix, "pkg-1.0")
+        src.extract(base)
+        self.check_extracted(os.path.join(base, "pkg-1.0"))
+
+    def test_stream_tar_traversal(self):
+        """
+        Test stream_tar refuses members outside of the extraction path
+        """
+        path = os.path.join(self.tmpd, "evil.tar")
+        with tarfile.open(path, "w") as tar:
+            tar.add(os.path.join(self.src, "pkg-1.0/README"), "../evil")
+            tar.add(os.path.join(self.src, "pkg-1.0/README"), "good")
+        with self.assertRaises(Exception):
+            tarball.stream_tar(path, None, os.path.join(self.tmpd, "out"))
+        self.assertNotIn("evil", os.listdir(self.tmpd))
+
+    def test_source_invalid_tar(self):
+        """
+        Test Source exits for something that is not a tar file
+        """
+        path = os.path.join(self.tmpd, "bad.tar.gz")
+        with open(path, "wb") as badf:
+            badf.write(b"\x1f\x8b not really gzip")
+        with self.assertRaises(SystemExit):
+            tarball.Source("https://example/bad.tar.gz", "", path, base_path=os.path.join(self.tmpd, "build"))
+        self.assertEqual(os.listdir(os.path.join(self.tmpd, "build")), [])
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Serve files without logging."""
+
+    def log_message(self, *args):
+        pass
+
+
+class TestProcessArchives(unittest.TestCase):
+    """Tests for fetching archives from a local HTTP server."""
+
+    def test_process_archives(self):
+        """
+        Test process_archives downloads the archives concurrently and still
+        records and extracts them in archive order
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            served = os.path.join(tmpd, "served")
+            download_path = os.path.join(tmpd, "download")
+            base_path = os.path.join(tmpd, "build")
+            for path in (served, download_path, base_path):
+                os.mkdir(path)
+            for name in ["one", "two", "three"]:
+                with open(os.path.join(tmpd, name + ".c"), "w") as srcf:
+                    srcf.write(name)
+                with tarfile.open(os.path.join(served, name + "-1.0.tar.gz"), "w:gz") as tar:
+                    tar.add(served, name + "-1.0", recursive=False)
+                    tar.add(os.path.join(tmpd, name + ".c"), name + "-1.0/" + name + ".c")
+                    tar.add(os.path.join(tmpd, name + ".c"), name + "-1.0/README")
+            # one archive is already present locally
+            shutil.copy(os.path.join(served, "two-1.0.tar.gz"), download_path)
+
+            server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=served))
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                base = "http://127.0.0.1:{}/".format(server.server_address[1])
+                archives = [base + "one-1.0.tar.gz", "", base + "two-1.0.tar.gz", "", base + "three-1.0.tar.gz", ""]
+                conf = config.Config(download_path)
+                content = tarball.Content(base + "pkg-1.0.tar.gz", "pkg", "1.0", archives, conf, base_path,
+                                          "", False, "", [], False, False)
+                sources = content.process_archives(Mock(url=base + "pkg-1.0.tar.gz"))
+            finally:
+                server.shutdown()
+                server.server_close()
+                thread.join()
+
+            self.assertEqual([src.url for src in sources], archives[::2])
+            self.assertEqual([src.prefix for src in sources], ["one-1.0", "two-1.0", "three-1.0"])
+            with open(os.path.join(download_path, "upstream")) as upstream:
+                self.assertEqual(upstream.read().splitlines(),
+                                 [os.path.join(util.get_sha1sum(os.path.join(served, name)), name)
+                                  for name in ["one-1.0.tar.gz", "two-1.0.tar.gz", "three-1.0.tar.gz"]])
+            content.extract_sources(sources[0], sources[1:])
+            self.assertEqual(sorted(os.listdir(base_path)), ["one-1.0", "three-1.0", "two-1.0"])
+
+    def test_check_or_get_file_source_cache(self):
+        """
+        Test a tarball downloaded for one package is taken from the source
+        cache for another, with the same upstream file content
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            src = os.path.join(tmpd, "pkg-1.0.tar.gz")
+            with open(src, "wb") as srcf:
+                srcf.write(b"not really a tarball")
+            url = "file://" + src
+            cache = sourcecache.SourceCache(os.path.join(tmpd, "cache"))
+            upstreams = []
+            for pkg in ["one", "two"]:
+                download_path = os.path.join(tmpd, pkg)
+                os.mkdir(download_path)
+                conf = config.Config(download_path)
+                content = tarball.Content(url, pkg, "1.0", [], conf, tmpd, "", False, "", [], False, False, cache)
+                self.assertEqual(content.check_or_get_file(url, "pkg-1.0.tar.gz"), download_path + "/pkg-1.0.tar.gz")
+                with open(os.path.join(download_path, "upstream")) as upstream:
+                    upstreams.append(upstream.read())
+                if pkg == "one":
+                    # the second package must not download it
+                    os.unlink(src)
+            self.assertEqual(upstreams[0], upstreams[1])
+            self.assertEqual(cache.hits, 1)
+            with open(os.path.join(tmpd, "one", "pkg-1.0.tar.gz"), "rb") as one, \
+                    open(os.path.join(tmpd, "two", "pkg-1.0.tar.gz"), "rb") as two:
+                self.assertEqual(one.read(), two.read())
+
+    def test_process_cached_sources(self):
+        """
+        Test the second run reuses the extracted tree of the first and a
+        modified tree is extracted again
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            served = os.path.join(tmpd, "served")
+            os.mkdir(served)
+            for name in ["pkg", "extra"]:
+                with open(os.path.join(tmpd, name + ".c"), "w") as srcf:
+                    srcf.write(name)
+                with tarfile.open(os.path.join(served, name + "-1.0.tar.gz"), "w:gz") as tar:
+                    tar.add(served, name + "-1.0", recursive=False)
+                    tar.add(os.path.join(tmpd, name + ".c"), name + "-1.0/" + name + ".c")
+            url = "file://" + os.path.join(served, "pkg-1.0.tar.gz")
+            archives = ["file://" + os.path.join(served, "extra-1.0.tar.gz"), "deps"]
+            cache = extractcache.ExtractCache(os.path.join(tmpd, "cache"), os.path.join(tmpd, "pkg"))
+            main_c = os.path.join(cache.tree, "pkg-1.0", "pkg.c")
+            results = []
+            for run in range(3):
+                download_path = os.path.join(tmpd, "pkg{}".format(run))
+                os.mkdir(download_path)
+                conf = config.Config(download_path)
+                content = tarball.Content(url, "pkg", "1.0", archives, conf, cache.tree,
+                                          "", False, "", [], False, False, None, cache)
+                main_src, archives_src, extract = content.process_cached_sources()
+                if extract:
+                    content.extract_sources(main_src, archives_src)
+                    cache.record(content.extract_key, [src.get_details() for src in [main_src] + archives_src])
+                results.append((extract, main_src.prefix, [src.prefix for src in archives_src], content.prefixes))
+                if run == 1:
+                    with open(main_c, "w") as srcf:
+                        srcf.write("patched")
+
+            self.assertEqual([result[0] for result in results], [True, False, True])
+            for result in results:
+                self.assertEqual(result[1:], ("pkg-1.0", ["extra-1.0"], {archives[0]: "extra-1.0"}))
+            with open(main_c) as srcf:
+                self.assertEqual(srcf.read(), "pkg")
+            self.assertTrue(os.path.exists(os.path.join(cache.tree, "extra-1.0", "extra.c")))
+
+
 # Create dynamic tests based on config file
 create_dynamic_tests()
 
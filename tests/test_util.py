@@ -64,5 +64,55 @@ class TestUtil(unittest.TestCase):
             self.assertTrue(util.binary_in_path('testbin'))
             self.assertEqual(util.os_paths, [tmpd])
 
+    def test_source_tree_walk(self):
+        """
+        Test SourceTree.walk matches os.walk, top-down with pruning and
+        bottom-up, without following symlinked directories
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            for sub in ["a", "a/b", "a/tests", "a/tests/c", "d"]:
+                os.mkdir(os.path.join(tmpd, sub))
+                with open(os.path.join(tmpd, sub, "README"), "w") as readme:
+                    readme.write("readme")
+            os.symlink("a", os.path.join(tmpd, "link"))
+            tree = util.SourceTree(tmpd)
+
+            def pruned(walk):
+                result = []
+                for dirpath, dirnames, files in walk:
+                    dirnames[:] = [d for d in dirnames if d != "tests"]
+                    result.append((dirpath, sorted(dirnames), sorted(files)))
+                return result
+
+            self.assertEqual(list(tree.walk(tmpd)), list(os.walk(tmpd)))
+            self.assertEqual(list(tree.walk(tmpd, topdown=False)), list(os.walk(tmpd, topdown=False)))
+            self.assertEqual(pruned(tree.walk(tmpd)), pruned(os.walk(tmpd)))
+            sub = os.path.join(tmpd, "a")
+            self.assertEqual(list(tree.walk(sub)), list(os.walk(sub)))
+            # a differently spelled top still uses the index
+            expected = [list(os.walk(sub + "/")), list(os.walk(tmpd + "/./a", topdown=False)), list(os.walk(tmpd))]
+            with unittest.mock.patch("util.os.walk") as mock_walk:
+                self.assertEqual(list(tree.walk(sub + "/")), expected[0])
+                self.assertEqual(list(tree.walk(tmpd + "/./a", topdown=False)), expected[1])
+                self.assertEqual(list(util.SourceTree(tmpd + "/").walk(tmpd)), expected[2])
+                mock_walk.assert_not_called()
+            # outside the index falls back to os.walk
+            other = os.path.join(tmpd, "missing")
+            self.assertEqual(list(tree.walk(other)), list(os.walk(other)))
+
+    def test_open_auto_gzip(self):
+        """
+        Test open_auto decompresses .gz files, to text or to bytes by mode
+        """
+        with tempfile.TemporaryDirectory() as tmpd:
+            path = os.path.join(tmpd, "build.log.gz")
+            with util.open_auto(path, "w") as logf:
+                logf.write("caf\u00e9\n")
+            with util.open_auto(path, "r") as logf:
+                self.assertEqual(logf.read(), "caf\u00e9\n")
+            with util.open_auto(path, "rb") as logf:
+                self.assertEqual(logf.read(), "caf\u00e9\n".encode("utf-8"))
+
+
 if __name__ == '__main__':
     unittest.main(buffer=True)